@@ -0,0 +1,152 @@
+# -*- coding: utf-8 -*-
+# @Time    : 2026/10/18 下午11:20
+# @Author  : Zr
+# @Comment : end to end scenarios, headless chrome against a local static site
+#
+# usage:
+#     python bench/bench_e2e.py --start --executable-path /usr/bin/google-chrome
+#     python bench/bench_e2e.py --port 9999 --executable-path /usr/bin/chromium --binary --save e2e.json
+#
+# --start runs pptrc/js/stub.js in a child process, otherwise pptrs must already
+# listen on --host/--port. nothing leaves the machine, pages come from a local
+# http server over generated fixtures.
+
+import argparse
+import functools
+import os
+import shutil
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from http.server import SimpleHTTPRequestHandler, ThreadingHTTPServer
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from pptrc import Browser  # noqa: E402
+from common import add_arguments, finish, measure  # noqa: E402
+
+SCHEMA = {
+    'title': {'selector': 'h1', 'transform': 'trim'},
+    'items': {
+        'selector': '.item',
+        'list': True,
+        'fields': {
+            'name': {'selector': '.name'},
+            'price': {'selector': '.price', 'transform': 'float'},
+            'link': {'selector': 'a', 'attr': 'href'},
+        }
+    },
+}
+
+
+def write_fixtures(root, items=200, height=20000):
+    rows = ''.join('<li class="item"><span class="name">item %d</span> <span class="price">%d.99</span> '
+                   '<a href="/item/%d.html">detail</a></li>\n' % (i, i, i) for i in range(items))
+    with open(os.path.join(root, 'list.html'), 'w', encoding='utf-8') as f:
+        f.write('<!doctype html><html><head><title>list</title></head><body>'
+                '<h1> product list </h1><ul>%s</ul></body></html>' % rows)
+    with open(os.path.join(root, 'long.html'), 'w', encoding='utf-8') as f:
+        f.write('<!doctype html><html><body style="margin:0">'
+                '<div style="height:%dpx;background:linear-gradient(#fff,#08f)"></div>'
+                '<p id="end">end</p></body></html>' % height)
+
+
+class _QuietHandler(SimpleHTTPRequestHandler):
+    def log_message(self, format, *args):
+        pass
+
+
+def serve_static(root):
+    server = ThreadingHTTPServer(('127.0.0.1', 0), functools.partial(_QuietHandler, directory=root))
+    t = threading.Thread(target=server.serve_forever, name='bench-static')
+    t.daemon = True
+    t.start()
+    return server
+
+
+def start_pptrs(port):
+    js = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'pptrc', 'js')
+    p = subprocess.Popen(['node', 'stub.js', '127.0.0.1', str(port), 'ERROR'], cwd=js)
+    for _ in range(200):
+        try:
+            socket.create_connection(('127.0.0.1', port), timeout=1).close()
+            return p
+        except OSError:
+            if p.poll() is not None:
+                raise RuntimeError('stub.js exited with %s' % p.returncode)
+            time.sleep(0.05)
+    p.kill()
+    raise RuntimeError('stub.js did not listen on %d' % port)
+
+
+def scenarios(b, base):
+    p = b.newPage()
+    p.goto(base + '/list.html')
+    s = b.newPage()
+    s.goto(base + '/long.html')
+
+    def scroll():
+        s.scrollToTop()
+        s.scrollToEnd()
+
+    def goto_extract_batch():
+        p.batch().goto(base + '/list.html').extract(SCHEMA).run()
+
+    return [
+        ('goto', lambda: p.goto(base + '/list.html')),
+        ('extract 200 items', lambda: p.extract(SCHEMA)),
+        ('eval', lambda: p.eval('h1')),
+        ('goto+extract batch', goto_extract_batch),
+        ('screenShot viewport png', lambda: p.screenShot()),
+        ('screenShot fullPage jpeg', lambda: p.screenShot(fullPage=True, type='jpeg', quality=80)),
+        ('scrollToTop+scrollToEnd', scroll),
+    ]
+
+
+def main():
+    parser = argparse.ArgumentParser(description='pptrc end to end scenarios with headless chrome')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=9999)
+    parser.add_argument('--start', action='store_true', help='run stub.js on --port for the benchmark')
+    parser.add_argument('--executable-path', default=os.environ.get('CHROME_PATH'), help='chrome binary')
+    parser.add_argument('--binary', action='store_true', help='binary framing')
+    parser.add_argument('--multiplex', action='store_true', help='multiplexed connection')
+    add_arguments(parser)
+    parser.set_defaults(iterations=50)
+    args = parser.parse_args()
+
+    root = tempfile.mkdtemp(prefix='pptrc-bench-')
+    pptrs = None
+    static = None
+    try:
+        write_fixtures(root)
+        static = serve_static(root)
+        base = 'http://127.0.0.1:%d' % static.server_address[1]
+        if args.start:
+            pptrs = start_pptrs(args.port)
+
+        b = Browser(host=args.host, port=args.port, log_level='error', metrics=False,
+                    binary=args.binary, multiplex=args.multiplex)
+        b.launch(headless=True, executable_path=args.executable_path)
+        try:
+            results = []
+            for name, fn in scenarios(b, base):
+                if not args.filter or args.filter in name:
+                    results.append(measure('e2e/%s' % name, fn, iterations=args.iterations, warmup=3))
+        finally:
+            b.quit()
+    finally:
+        if static is not None:
+            static.shutdown()
+        if pptrs is not None:
+            pptrs.kill()
+        shutil.rmtree(root, ignore_errors=True)
+
+    return finish(results, args)
+
+
+if __name__ == '__main__':
+    sys.exit(main())
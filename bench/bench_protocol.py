@@ -0,0 +1,122 @@
+# -*- coding: utf-8 -*-
+# @Time    : 2026/10/18 下午10:45
+# @Author  : Zr
+# @Comment : client side throughput against the stub.js stand-in, no chrome needed
+#
+# usage:
+#     python bench/bench_protocol.py
+#     python bench/bench_protocol.py --size 1048576 --latency 1 --save base.json
+#     python bench/bench_protocol.py --baseline base.json
+
+import argparse
+import asyncio
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from pptrc import Browser, AsyncBrowser, Metrics  # noqa: E402
+from common import add_arguments, finish, measure, summarize  # noqa: E402
+from standin import StandInServer  # noqa: E402
+
+MODES = {
+    'ascii': {},
+    'binary': {'binary': True},
+    'multiplex': {'multiplex': True},
+    'binary+shm': {'binary': True, 'shm_threshold': 64 * 1024},
+}
+
+SCHEMA = {
+    'title': {'selector': 'h1'},
+    'price': {'selector': '.price', 'transform': 'float'},
+    'links': {'selector': 'a', 'attr': 'href', 'list': True},
+}
+
+
+def sync_scenarios(port, mode, opts, args):
+    '''
+    [(name, fn, threads)] of one connection mode.
+    '''
+    b = Browser(port=port, log_level='error', metrics=False, **opts).launch(executable_path='standin')
+    p = b.newPage()
+
+    def batch():
+        p.batch().getUrl().eval('h1').getHtml().extract(SCHEMA).click('a').run()
+
+    def elem():
+        e = p.querySelector('h1')
+        e.getProperty('innerText')
+
+    scenarios = [
+        ('_fire pagesCount', lambda: b._fire(id=b.browser_id, action='pagesCount'), 1),
+        ('wrap_fire pagesCount', lambda: b.wrap_fire(id=b.browser_id, action='pagesCount'), 1),
+        ('Page.getHtml', p.getHtml, 1),
+        ('Page.eval', lambda: p.eval('h1'), 1),
+        ('Page.extract', lambda: p.extract(SCHEMA), 1),
+        ('Page.batch 5 steps', batch, 1),
+        ('Page.querySelector+Elem.getProperty', elem, 1),
+    ]
+
+    if mode == 'ascii':
+        # instrumentation cost: the same call with metrics recorded.
+        mb = Browser(port=port, log_level='error', metrics=Metrics()).launch(executable_path='standin')
+        scenarios.append(('wrap_fire pagesCount +metrics',
+                          lambda: mb.wrap_fire(id=mb.browser_id, action='pagesCount'), 1))
+
+    if opts.get('multiplex'):
+        scenarios.append(('Page.getHtml x%d threads' % args.threads, p.getHtml, args.threads))
+
+    return [('%s/%s' % (mode, name), fn, threads) for name, fn, threads in scenarios]
+
+
+def async_scenario(name, port, args):
+    async def run():
+        async with AsyncBrowser(port=port, log_level='error', metrics=False) as b:
+            await b.launch(executable_path='standin')
+            p = await b.newPage()
+            latencies = []
+
+            async def one():
+                t = time.perf_counter()
+                await p.getHtml()
+                latencies.append((time.perf_counter() - t) * 1000)
+
+            for _ in range(10):
+                await one()
+            latencies.clear()
+
+            start = time.perf_counter()
+            for _ in range(args.iterations):
+                await asyncio.gather(*[one() for _ in range(args.threads)])
+            return latencies, time.perf_counter() - start
+
+    latencies, seconds = asyncio.run(run())
+    return summarize(name, latencies, seconds, args.threads)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='pptrc client throughput against a stub.js stand-in')
+    parser.add_argument('--size', type=int, default=1024, help='payload bytes of html/eval/getProperty')
+    parser.add_argument('--latency', type=float, default=0, help='ms the stand-in waits per action')
+    parser.add_argument('--threads', type=int, default=8, help='concurrent callers in the multiplex scenarios')
+    parser.add_argument('--modes', default=','.join(MODES), help='comma separated: %s' % ','.join(MODES))
+    add_arguments(parser)
+    args = parser.parse_args()
+
+    results = []
+    with StandInServer(size=args.size, latency=args.latency) as server:
+        print('stand-in on port %d, payload %d bytes, latency %s ms' % (server.port, args.size, args.latency))
+        for mode in args.modes.split(','):
+            for name, fn, threads in sync_scenarios(server.port, mode, MODES[mode], args):
+                if not args.filter or args.filter in name:
+                    results.append(measure(name, fn, iterations=args.iterations, threads=threads))
+        name = 'async/Page.getHtml x%d gather' % args.threads
+        if not args.filter or args.filter in name:
+            results.append(async_scenario(name, server.port, args))
+
+    return finish(results, args)
+
+
+if __name__ == '__main__':
+    sys.exit(main())
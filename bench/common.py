@@ -0,0 +1,115 @@
+# -*- coding: utf-8 -*-
+# @Time    : 2026/10/18 下午10:30
+# @Author  : Zr
+# @Comment : timing, report and baseline comparison shared by the benchmarks
+
+import json
+import threading
+import time
+
+
+def _percentile(sorted_ms, q):
+    if not sorted_ms:
+        return None
+    return sorted_ms[min(len(sorted_ms) - 1, int(q * len(sorted_ms)))]
+
+
+def measure(name, fn, iterations=1000, threads=1, warmup=10):
+    '''
+    call fn() iterations times on each of `threads` threads after `warmup` calls,
+    returns {name, ops, threads, seconds, ops_sec, p50, p99, mean} with latencies in ms.
+    '''
+    for _ in range(warmup):
+        fn()
+
+    latencies = []
+    lock = threading.Lock()
+    errors = []
+
+    def worker():
+        local = []
+        try:
+            for _ in range(iterations):
+                t = time.perf_counter()
+                fn()
+                local.append((time.perf_counter() - t) * 1000)
+        except Exception as e:
+            errors.append(e)
+        with lock:
+            latencies.extend(local)
+
+    workers = [threading.Thread(target=worker) for _ in range(threads)]
+    start = time.perf_counter()
+    for w in workers:
+        w.start()
+    for w in workers:
+        w.join()
+    seconds = time.perf_counter() - start
+    if errors:
+        raise errors[0]
+
+    return summarize(name, latencies, seconds, threads)
+
+
+def summarize(name, latencies, seconds, threads=1):
+    latencies = sorted(latencies)
+    return {
+        'name': name,
+        'ops': len(latencies),
+        'threads': threads,
+        'seconds': seconds,
+        'ops_sec': len(latencies) / seconds if seconds > 0 else None,
+        'p50': _percentile(latencies, 0.5),
+        'p99': _percentile(latencies, 0.99),
+        'mean': sum(latencies) / len(latencies) if latencies else None
+    }
+
+
+def report(results, out=None):
+    print('%-44s %8s %12s %10s %10s' % ('scenario', 'ops', 'ops/sec', 'p50 ms', 'p99 ms'), file=out)
+    for r in results:
+        print('%-44s %8d %12.1f %10.3f %10.3f' % (r['name'], r['ops'], r['ops_sec'], r['p50'], r['p99']), file=out)
+
+
+def save(results, path):
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump(results, f, indent=2)
+
+
+def compare(results, baseline_path, tolerance=0.1):
+    '''
+    scenarios whose ops/sec dropped more than `tolerance` below the baseline,
+    as [(name, baseline ops/sec, current ops/sec)].
+    '''
+    with open(baseline_path, encoding='utf-8') as f:
+        baseline = {r['name']: r for r in json.load(f)}
+
+    regressions = []
+    for r in results:
+        b = baseline.get(r['name'])
+        if b and b.get('ops_sec') and r['ops_sec'] < b['ops_sec'] * (1 - tolerance):
+            regressions.append((r['name'], b['ops_sec'], r['ops_sec']))
+    return regressions
+
+
+def add_arguments(parser):
+    parser.add_argument('--iterations', type=int, default=1000, help='calls per thread and scenario')
+    parser.add_argument('--filter', default=None, help='run scenarios whose name contains this')
+    parser.add_argument('--save', default=None, help='write the results as json')
+    parser.add_argument('--baseline', default=None, help='json of an earlier --save to compare against')
+    parser.add_argument('--tolerance', type=float, default=0.1, help='allowed ops/sec drop against the baseline')
+
+
+def finish(results, args):
+    '''
+    print, save and compare as asked on the command line, the exit code is 1 on a regression.
+    '''
+    report(results)
+    if args.save:
+        save(results, args.save)
+    if args.baseline:
+        regressions = compare(results, args.baseline, args.tolerance)
+        for name, before, now in regressions:
+            print('REGRESSION %s: %.1f -> %.1f ops/sec' % (name, before, now))
+        return 1 if regressions else 0
+    return 0
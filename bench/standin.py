@@ -0,0 +1,238 @@
+# -*- coding: utf-8 -*-
+# @Time    : 2026/10/18 下午10:05
+# @Author  : Zr
+# @Comment : stand-in for stub.js, same framing, canned responses, no chrome
+
+import asyncio
+import itertools
+import os
+import sys
+import tempfile
+import threading
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from pptrc.protocol import HEAD_LEN, pack, unpack, body_size  # noqa: E402
+
+_SHM_DIR = '/dev/shm' if os.path.isdir('/dev/shm') else tempfile.gettempdir()
+
+
+class StandInServer():
+    '''
+    speaks the stub.js protocol: ascii and binary framing, hello negotiation, `seq`
+    frames answered concurrently, large responses through shared memory files.
+    every action is answered after `latency` ms, payload actions (html, $eval,
+    getProperty, screenShot, ...) carry `size` bytes. requests past their `deadline`
+    or cancelled by a `cancel` frame are answered with retCode -3 like stub.js does.
+
+    usage:
+        with StandInServer(size=1024, latency=0) as s:
+            b = Browser(port=s.port).launch()
+    '''
+
+    def __init__(self, host='127.0.0.1', port=0, size=1024, latency=0):
+        self.host = host
+        self.port = port
+        self.size = size
+        self.latency = latency
+        self._payload = b'x' * size
+        self._text = 'x' * size
+        self._keys = itertools.count(1)
+        # ids of the open tabs, in pageIndex order.
+        self._pages = [0]
+        self._page_ids = itertools.count(1)
+        self._browsers = []
+        self._browser_ids = itertools.count(1)
+        self._files = itertools.count(1)
+        self._loop = None
+        self._server = None
+        self._thread = None
+        self._ready = threading.Event()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.stop()
+
+    def start(self):
+        self._thread = threading.Thread(target=self._run, name='pptrc-standin')
+        self._thread.daemon = True
+        self._thread.start()
+        self._ready.wait()
+        return self
+
+    def stop(self):
+        if self._loop is not None:
+            self._loop.call_soon_threadsafe(self._loop.stop)
+            self._thread.join()
+            self._loop = None
+
+    def _run(self):
+        self._loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(self._loop)
+        self._server = self._loop.run_until_complete(asyncio.start_server(self._serve, self.host, self.port))
+        self.port = self._server.sockets[0].getsockname()[1]
+        self._ready.set()
+        try:
+            self._loop.run_forever()
+        finally:
+            self._server.close()
+            tasks = asyncio.all_tasks(self._loop)
+            for task in tasks:
+                task.cancel()
+            self._loop.run_until_complete(asyncio.gather(*tasks, return_exceptions=True))
+            self._loop.close()
+
+    def _key(self):
+        n = next(self._keys)
+        return '[PAGE_0][ELEM_%d]#%d' % (n, n)
+
+    def _data(self, action, ctx):
+        if action == 'launch':
+            self._browsers.append('ws://standin/%d/%d' % (self.port, next(self._browser_ids)))
+            return {'wsEndpoint': self._browsers[-1]}
+        if action == 'load':
+            return {'browsers': list(self._browsers), 'pages': len(self._pages)}
+        if action == 'newPage':
+            self._pages.append(next(self._page_ids))
+            return {'pageIndex': len(self._pages) - 1, 'pageId': self._pages[-1]}
+        if action == 'ping':
+            return {'version': 'StandIn/1.0'}
+        if action == 'pagesCount':
+            return {'pages': len(self._pages)}
+        if action == 'closePage' and len(self._pages) > 1:
+            page_id = ctx.get('pageId')
+            self._pages.pop(self._pages.index(page_id) if page_id is not None else ctx.get('pageIndex', 0))
+            return {}
+        if action in ('html', 'e_getProperty', 'f_html'):
+            return {'html': self._payload, 'value': self._payload}
+        if action in ('screenShot', 'e_screenShot', 'pdf'):
+            return {'image': self._payload, 'pdf': self._payload}
+        if action in ('$', 'e_$', 'f_$', 'waitForSelector'):
+            return {'key': self._key()}
+        if action in ('$$', 'e_$$', 'f_$$'):
+            return {'keys': [self._key() for _ in range(10)]}
+        if action in ('extract', 'f_extract'):
+            fields = (ctx.get('schema') or {}).get('fields') or {}
+            return {'result': {k: self._text for k in fields}}
+        if action in ('$eval', 'e_eval', 'f_$eval', 'evaluate'):
+            return {'result': self._text}
+        if action in ('$$eval', 'f_$$eval'):
+            return {'result': [self._text]}
+        if action == 'url':
+            return {'url': 'http://standin/'}
+        if action == 'batch':
+            return {'results': [{'retCode': 1, 'retMsg': 'OK', 'data': self._data(s['action'], s.get('ctx') or {})}
+                                for s in ctx.get('steps') or []]}
+        return {}
+
+    async def _respond(self, conn, jd):
+        if self.latency > 0:
+            await asyncio.sleep(self.latency / 1000)
+
+        action = jd.get('action')
+        ctx = jd.get('ctx') or {}
+        if action == 'hello':
+            upgrade = ctx.get('framing') == 'binary'
+            conn['shm'] = ctx.get('shm') or 0
+            return {'framing': 'binary' if upgrade else 'ascii', 'shm': conn['shm'] > 0}, upgrade
+        return self._data(action, ctx), None
+
+    async def _abortable(self, conn, jd, pending):
+        '''
+        the response, -3 once the deadline passed or a `cancel` frame came,
+        None when a seq request was cancelled: the client stopped waiting for it.
+        '''
+        deadline = jd['deadline']
+        key = 'ordered' if jd.get('seq') is None else jd['seq']
+        cancelled = pending[key] = asyncio.Event()
+        work = asyncio.ensure_future(self._respond(conn, jd))
+        stop = asyncio.ensure_future(cancelled.wait())
+        try:
+            await asyncio.wait([work, stop], timeout=deadline / 1000, return_when=asyncio.FIRST_COMPLETED)
+        finally:
+            stop.cancel()
+            if pending.get(key) is cancelled:
+                del pending[key]
+
+        if work.done():
+            return {'retCode': 1, 'retMsg': 'OK', 'data': work.result()[0]}
+        work.cancel()
+        if cancelled.is_set():
+            return None if jd.get('seq') is not None else {'retCode': -3, 'retMsg': 'cancelled by client', 'data': {}}
+        return {'retCode': -3, 'retMsg': 'deadline exceeded: %dms' % deadline, 'data': {}}
+
+    async def _answer(self, writer, conn, jd, pending):
+        start = time.perf_counter()
+        upgrade = None
+        if jd.get('deadline'):
+            resp = await self._abortable(conn, jd, pending)
+            if resp is None:
+                return
+        else:
+            data, upgrade = await self._respond(conn, jd)
+            resp = {'retCode': 1, 'retMsg': 'OK', 'data': data}
+        resp['elapsed'] = (time.perf_counter() - start) * 1000
+        if jd.get('seq') is not None:
+            resp['seq'] = jd['seq']
+
+        frame = pack(resp, conn['binary'])
+        if conn['shm'] and len(frame) > conn['shm']:
+            path = os.path.join(_SHM_DIR, 'pptrs-standin-%d-%d' % (os.getpid(), next(self._files)))
+            with open(path, 'wb') as f:
+                f.write(frame)
+            frame = pack({'retCode': 1, 'retMsg': 'OK', 'file': path, 'seq': resp.get('seq')}, conn['binary'])
+
+        writer.write(frame)
+        await writer.drain()
+        if upgrade is not None:
+            conn['binary'] = upgrade
+
+    async def _serve(self, reader, writer):
+        conn = {'binary': False, 'shm': 0}
+        tasks = set()
+        pending = {}
+        try:
+            while True:
+                head = await reader.readexactly(HEAD_LEN)
+                jd = unpack(head, await reader.readexactly(body_size(head, conn['binary'])), conn['binary'])
+                if jd.get('action') == 'cancel':
+                    seq = (jd.get('ctx') or {}).get('seq')
+                    cancelled = pending.get('ordered' if seq is None else seq)
+                    if cancelled is not None:
+                        cancelled.set()
+                    continue
+
+                if jd.get('seq') is None:
+                    # answered in order, a cancel for it is only read afterwards,
+                    # its deadline answers it in time anyway.
+                    await self._answer(writer, conn, jd, pending)
+                else:
+                    task = asyncio.ensure_future(self._answer(writer, conn, jd, pending))
+                    tasks.add(task)
+                    task.add_done_callback(tasks.discard)
+        except (asyncio.IncompleteReadError, ConnectionError, asyncio.CancelledError):
+            pass
+        finally:
+            for task in tasks:
+                task.cancel()
+            writer.close()
+
+if __name__ == '__main__':
+    import argparse
+
+    parser = argparse.ArgumentParser(description='stub.js stand-in with canned responses')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=9999)
+    parser.add_argument('--size', type=int, default=1024, help='payload bytes')
+    parser.add_argument('--latency', type=float, default=0, help='ms per action')
+    args = parser.parse_args()
+
+    s = StandInServer(host=args.host, port=args.port, size=args.size, latency=args.latency).start()
+    print('stand-in listening on %s:%d' % (s.host, s.port))
+    try:
+        s._thread.join()
+    except KeyboardInterrupt:
+        s.stop()
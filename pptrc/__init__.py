@@ -1,2 +1,7 @@
-from .client import (Browser)
+from .client import (Browser, deadline)
+from .async_client import (AsyncBrowser)
+from .cluster import (WorkerRouter)
 from .local_server import LocalPPTRSMgr
+from .pool import (ConnectionPool, BrowserPool, PagePool)
+from .metrics import (Metrics, prometheus_text, start_exporter)
+from .tracing import (Tracer, ChromeTraceWriter)
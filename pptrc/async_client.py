@@ -0,0 +1,1172 @@
+# -*- coding: utf-8 -*-
+# @Time    : 2026/10/18 上午10:20
+# @Author  : Zr
+# @Comment : asyncio counterpart of client.py, same stub.js protocol
+
+import asyncio
+import itertools
+import logging
+import os
+import time
+import traceback
+import uuid
+import weakref
+from .client import (_LAUNCH_OPTIONS, Batch, _encode_script, _decode_payload, _artifact,
+                     _extract_spec, _extract_wire, _extract_post, _url_pattern, _match_frame,
+                     _FRAME_NAVIGATIONS, _intercept_rule, _backoff, _retryable,
+                     _remaining)
+from .log import getLogger, getFileLogger, sampled, RpcMessage
+from .metrics import default_metrics
+from .tracing import Call
+from .protocol import HEAD_LEN, pack, unpack, body_size, hello, load_file, is_local
+
+
+class AsyncBrowserProxy():
+
+    def __init__(self, host, port, log_level, log_file, multiplex=True, binary=False, shm_threshold=None,
+                 metrics=None, tracer=None, retries=2, backoff=0.1, deadline=None):
+        self._host = host
+        self._port = port
+        self._head_len = HEAD_LEN
+        self._log_level = log_level
+
+        if log_file:
+            self._logger = getFileLogger(file=log_file, level=log_level)
+        else:
+            self._logger = getLogger(level=log_level)
+
+        if not self._port:
+            raise Exception('port is None')
+
+        self._multiplex = multiplex
+        self._want_binary = binary
+        self._shm_threshold = shm_threshold if is_local(host) else None
+        self._binary = False
+        self._reader = None
+        self._writer = None
+        self._lock = None
+        self._connect_lock = None
+        self._read_task = None
+        self._seq = itertools.count(1)
+        self._waiters = {}
+        self._listeners = {}
+        self._released = []
+        self._metrics = None if metrics is False else (metrics or default_metrics())
+        self._tracer = tracer
+        self._retries = retries
+        self._backoff = backoff
+        self._deadline = deadline
+
+    async def __aenter__(self):
+        await self.connect()
+        return self
+
+    async def __aexit__(self, exc_type, exc_val, exc_tb):
+        await self.close()
+
+    async def connect(self, timeout=None):
+        '''
+        timeout: seconds for connecting and the hello exchange, TimeoutError past them.
+        '''
+        if self._writer is not None:
+            return self
+
+        if self._connect_lock is None:
+            self._connect_lock = asyncio.Lock()
+
+        async with self._connect_lock:
+            if self._writer is None:
+                try:
+                    reader, writer = await asyncio.wait_for(self._open(), timeout)
+                except asyncio.TimeoutError:
+                    raise TimeoutError('pptrs on %s:%s did not accept in %.3fs'
+                                       % (self._host, self._port, timeout)) from None
+                self._lock = asyncio.Lock()
+                self._reader, self._writer = reader, writer
+                if self._multiplex:
+                    self._read_task = asyncio.ensure_future(self._read_loop(reader))
+
+        return self
+
+    async def _open(self):
+        reader, writer = await asyncio.open_connection(self._host, self._port)
+        self._binary = False
+        try:
+            if self._want_binary or self._shm_threshold:
+                await self._negotiate(reader, writer)
+        except BaseException:
+            writer.close()
+            raise
+        return reader, writer
+
+    async def close(self):
+        try:
+            if self._read_task:
+                self._read_task.cancel()
+            if self._writer:
+                self._writer.close()
+        except Exception:
+            self._logger.warn("error happened when closing browser proxy connection:\n" + traceback.format_exc())
+        finally:
+            self._reader = None
+            self._writer = None
+            self._read_task = None
+
+    async def _negotiate(self, reader, writer):
+        writer.write(pack(hello(binary=self._want_binary, shm_threshold=self._shm_threshold)))
+        await writer.drain()
+        r, _ = await self._read_frame(reader)
+        if not r or r.get('retCode', -1) < 0:
+            self._logger.warning('pptrs does not support hello, use ascii framing.')
+            return
+
+        self._binary = (r.get('data') or {}).get('framing') == 'binary'
+
+    async def _read_frame(self, reader):
+        head = await reader.readexactly(self._head_len)
+        data = await reader.readexactly(body_size(head, self._binary))
+        jd = unpack(head, data, self._binary)
+        size = self._head_len + len(data)
+        if jd and jd.get('file'):
+            size += os.path.getsize(jd['file'])
+            jd = load_file(jd['file'], self._binary)
+        return jd, size
+
+    async def _read_loop(self, reader):
+        error = None
+        try:
+            while True:
+                jd, size = await self._read_frame(reader)
+                if jd.get('sub') is not None:
+                    handler = self._listeners.get(jd['sub'])
+                    if handler:
+                        handler(jd.get('events') or [])
+                    continue
+
+                fut = self._waiters.get(jd.get('seq'))
+                if fut and not fut.done():
+                    fut.set_result((jd, size))
+                else:
+                    self._logger.warning('drop frame without waiter: seq=%s', jd.get('seq'))
+        except asyncio.CancelledError:
+            error = ConnectionError('pptrs connection is closed')
+        except Exception as e:
+            error = ConnectionError('pptrs connection lost: %s' % e)
+            self._logger.warning('pptrc reader stopped:\n' + traceback.format_exc())
+        finally:
+            if self._reader is reader:
+                self._reader = None
+                self._writer = None
+            for fut in list(self._waiters.values()):
+                if not fut.done():
+                    fut.set_exception(error)
+            for handler in list(self._listeners.values()):
+                handler(None)
+            self._listeners.clear()
+
+    async def _request(self, send, sizes=None, timeout=None):
+        await self.connect()
+
+        if not self._multiplex:
+            # one frame in flight per connection, stub.js answers in order.
+            async with self._lock:
+                if self._writer is None:
+                    raise ConnectionError('pptrs connection is closed')
+                try:
+                    frame = pack(send, self._binary)
+                    self._writer.write(frame)
+                    await self._writer.drain()
+                    jd, size = await asyncio.wait_for(self._read_frame(self._reader), timeout)
+                except Exception as e:
+                    # a half written or half read frame leaves the stream out of sync,
+                    # closing it also makes stub.js abort a request past its deadline.
+                    await self.close()
+                    if isinstance(e, asyncio.IncompleteReadError):
+                        raise ConnectionError('pptrs closed the connection') from e
+                    if isinstance(e, asyncio.TimeoutError):
+                        raise TimeoutError('pptrs did not answer in %.3fs' % timeout) from None
+                    raise
+                if sizes is not None:
+                    sizes['sent'], sizes['recv'] = len(frame), size
+                return jd
+
+        seq = next(self._seq)
+        send['seq'] = seq
+        fut = asyncio.get_event_loop().create_future()
+        self._waiters[seq] = fut
+        try:
+            if self._read_task is None or self._read_task.done():
+                raise ConnectionError('pptrs connection is closed')
+            frame = pack(send, self._binary)
+            async with self._lock:
+                self._writer.write(frame)
+                await self._writer.drain()
+            try:
+                jd, size = await asyncio.wait_for(fut, timeout)
+            except asyncio.TimeoutError:
+                await self._cancel(seq)
+                raise TimeoutError('pptrs did not answer in %.3fs' % timeout) from None
+            if sizes is not None:
+                sizes['sent'], sizes['recv'] = len(frame), size
+            return jd
+        finally:
+            self._waiters.pop(seq, None)
+
+    async def _cancel(self, seq):
+        # stub.js aborts the action and does not answer it.
+        try:
+            async with self._lock:
+                if self._writer is not None:
+                    self._writer.write(pack({"id": None, "action": "cancel", "ctx": {"seq": seq}}, self._binary))
+                    await self._writer.drain()
+        except OSError:
+            pass
+
+    def _release_handle(self, key):
+        # AsyncElem finalizer, the key goes out with the next request.
+        self._released.append(key)
+
+    async def _fire(self, id, action, _retries=None, **kwargs):
+        if not action:
+            raise Exception('ERROR: _fire function argument action is None.')
+
+        send = {
+            "id": id,
+            "action": action,
+            "ctx": kwargs
+        }
+        if self._released and id:
+            send['dispose'], self._released = self._released, []
+
+        logged = self._logger.isEnabledFor(logging.DEBUG) and sampled()
+        if logged:
+            self._logger.debug('%s', RpcMessage('send', send))
+
+        retries = self._retries if _retries is None else _retries
+        attempt = 0
+        while True:
+            sent = False
+            try:
+                timeout = _remaining(self._deadline)
+                if timeout is not None:
+                    if timeout <= 0:
+                        raise TimeoutError('deadline exceeded before %s was sent' % action)
+                    send['deadline'] = int(timeout * 1000)
+                await self.connect(timeout)
+                sent = True
+                if self._metrics is None and self._tracer is None:
+                    _jd = await self._request(send, timeout=timeout)
+                else:
+                    _jd = await self._timed_request(send, timeout)
+                break
+            except BaseException as e:
+                # BaseException: keys must go back on CancelledError and KeyboardInterrupt too.
+                if attempt >= retries or not _retryable(e, action, sent):
+                    if send.get('dispose'):
+                        # sent again with the next request, disposing a key twice is harmless.
+                        self._released[:0] = send['dispose']
+                    raise
+                self._logger.warning('%s failed: %s, retry %d/%d', action, e, attempt + 1, retries)
+                await asyncio.sleep(_backoff(self._backoff, attempt))
+                attempt += 1
+
+        if _jd:
+            if logged:
+                self._logger.debug('%s', RpcMessage('recv', _jd))
+
+            return _jd
+
+        return None
+
+    def _hook(self, name, *args):
+        try:
+            getattr(self._tracer, name)(*args)
+        except Exception:
+            self._logger.warning('tracer %s failed:\n%s' % (name, traceback.format_exc()))
+
+    async def _timed_request(self, send, timeout=None):
+        call = Call(send)
+        if self._tracer is not None:
+            self._hook('before_send', call)
+
+        sizes = {}
+        start = time.perf_counter()
+        try:
+            _jd = await self._request(send, sizes, timeout)
+        except Exception as e:
+            call.client_ms = (time.perf_counter() - start) * 1000
+            self._record(call, e)
+            raise
+
+        call.client_ms = (time.perf_counter() - start) * 1000
+        call.sent, call.recv = sizes.get('sent', 0), sizes.get('recv', 0)
+        error = None
+        if not _jd:
+            error = Exception('pptrs return None')
+        else:
+            call.server_ms = _jd.get('elapsed')
+            call.ret_code, call.ret_msg = _jd.get('retCode'), _jd.get('retMsg')
+            if call.ret_code is None or call.ret_code < 0:
+                error = Exception('pptrs return %s, retMsg=%s' % (call.ret_code, call.ret_msg))
+        self._record(call, error)
+        return _jd
+
+    def _record(self, call, error):
+        if self._metrics is not None:
+            self._metrics.record(call.action, call.client_ms, server_ms=call.server_ms, sent=call.sent,
+                                 recv=call.recv, error=error is not None)
+        if self._tracer is not None:
+            if error is None:
+                self._hook('after_recv', call)
+            else:
+                self._hook('on_error', call, error)
+
+    async def wrap_fire(self, id, action, **kwargs):
+        r = await self._fire(id, action, **kwargs)
+        if not r:
+            raise Exception('ERROR: _fire(*args, **kwargs): pptrs return None')
+
+        if r.get("retCode") == -3:
+            raise TimeoutError('ERROR: %s: %s' % (action, r.get("retMsg")))
+
+        if r.get("retCode") < 0:
+            raise Exception('ERROR: _fire(*args, **kwargs): pptrs return -2, retMsg=%s' % r.get("retMsg"))
+
+        return r.get("retCode"), r.get("retMsg"), r.get("data")
+
+
+class AsyncBrowser(AsyncBrowserProxy):
+    '''
+    usage:
+        async with AsyncBrowser() as b:
+            await b.launch()
+            p = await b.newPage()
+            await p.goto('http://www.douban.com')
+    '''
+
+    def __init__(self, browser_id=None, host='127.0.0.1', port=9999, log_level=None, log_file=None,
+                 multiplex=True, binary=False, shm_threshold=None, metrics=None, tracer=None, retries=2,
+                 backoff=0.1, deadline=None):
+        '''
+        deadline: seconds, default time limit of every request, pptrc.deadline(seconds) works in tasks too.
+        log_level: level of the 'pptrc' logger, None leaves it to the application, see Browser.
+        '''
+        super(AsyncBrowser, self).__init__(host=host, port=port, log_level=log_level, log_file=log_file,
+                                           multiplex=multiplex, binary=binary, shm_threshold=shm_threshold,
+                                           metrics=metrics, tracer=tracer, retries=retries, backoff=backoff,
+                                           deadline=deadline)
+        self.browser_id = browser_id
+
+    async def launch(self,
+                     product='chrome',
+                     ignore_https_errors=False,
+                     headless=True,
+                     executable_path=None,
+                     slow_mo=None,
+                     lang=None,
+                     timeout=None,
+                     userdatadir=None,
+                     devtools=False,
+                     window_size=None,
+                     window_position='0,0',
+                     maximize_window=False,
+                     args=None,
+                     ignore_default_args=None,
+                     disable_extensions=True,
+                     extensions=None):
+        options = _LAUNCH_OPTIONS(product=product,
+                                  ignore_https_errors=ignore_https_errors,
+                                  headless=headless,
+                                  executable_path=executable_path,
+                                  slow_mo=slow_mo,
+                                  lang=lang,
+                                  timeout=timeout,
+                                  userdatadir=userdatadir,
+                                  devtools=devtools,
+                                  window_size=window_size,
+                                  window_position=window_position,
+                                  maximize_window=maximize_window,
+                                  args=args,
+                                  ignore_default_args=ignore_default_args,
+                                  disable_extensions=disable_extensions,
+                                  extensions=extensions)
+
+        ret_code, ret_msg, data = await self.wrap_fire(id=self.browser_id, action='launch', options=options)
+        self.browser_id = data.get('wsEndpoint')
+
+        self._logger.debug('launch succeed, wsEndpoint: %s' % self.browser_id)
+
+        return self
+
+    async def newPage(self):
+        ret_code, ret_msg, data = await self.wrap_fire(id=self.browser_id, action='newPage')
+        page_index = data.get('pageIndex')
+        page = AsyncPage(browser=self, page_index=page_index, page_id=data.get('pageId'))
+
+        return page
+
+    def wsEndpoint(self):
+        return self.browser_id
+
+    async def pagesCount(self):
+        ret_code, ret_msg, data = await self.wrap_fire(id=self.browser_id, action='pagesCount')
+        return data.get('pages')
+
+    async def ping(self):
+        '''
+        chrome version, asked from chrome itself, raises when the browser crashed or disconnected.
+        '''
+        ret_code, ret_msg, data = await self.wrap_fire(id=self.browser_id, action='ping')
+        return data.get('version')
+
+    async def health(self):
+        ret_code, ret_msg, data = await self.wrap_fire(id=None, action='health')
+        return data
+
+    async def waitReady(self, timeout=30):
+        deadline = time.time() + timeout
+        attempt = 0
+        while True:
+            try:
+                ret_code, ret_msg, data = await self.wrap_fire(id=None, action='health', _retries=0)
+                return data
+            except OSError as e:
+                delay = _backoff(self._backoff, attempt)
+                if time.time() + delay > deadline:
+                    raise TimeoutError('pptrs on %s:%s not ready in %ss: %s' % (self._host, self._port, timeout, e))
+                await asyncio.sleep(delay)
+                attempt += 1
+
+    async def responseCacheStats(self):
+        ret_code, ret_msg, data = await self.wrap_fire(id=None, action='cacheStats')
+        return data
+
+    def metrics(self):
+        return self._metrics.snapshot() if self._metrics is not None else {}
+
+    async def serverMetrics(self):
+        ret_code, ret_msg, data = await self.wrap_fire(id=None, action='metrics')
+        return data
+
+    async def getPage(self, page_index=0):
+        pc = await self.pagesCount()
+        if page_index < 0 or page_index > pc:
+            raise Exception('error page_index, pages count is %d' % pc)
+        return AsyncPage(browser=self, page_index=page_index)
+
+    async def quit(self):
+        await self.wrap_fire(id=self.browser_id, action='quit')
+
+
+class AsyncPage():
+    def __init__(self, browser, page_index, page_id=None):
+        self.browser = browser
+        self.page_index = page_index
+        # set for tabs opened by newPage, pptrs finds the tab by it even after
+        # closing an earlier tab moved its index.
+        self.page_id = page_id
+        self._frame_index = None
+
+    async def wrap_fire(self, action, **kwargs):
+        if action in _FRAME_NAVIGATIONS:
+            self._frame_index = None
+        if self.page_id is not None:
+            kwargs['pageId'] = self.page_id
+        return await self.browser.wrap_fire(id=self.browser.browser_id, action=action, pageIndex=self.page_index,
+                                            **kwargs)
+
+    async def frames(self, silent=True):
+        _frames = None
+        try:
+            ret_code, ret_msg, data = await self.wrap_fire(action='frames')
+            _frames = [AsyncFrame(key=info.get('key'), browser=self.browser, info=info)
+                       for info in data.get('frames')]
+            self._frame_index = _frames
+        except:
+            if not silent:
+                raise
+
+        return _frames
+
+    async def findFrame(self, url=None, name=None, refresh=False):
+        if refresh or self._frame_index is None:
+            await self.frames()
+            refresh = True
+
+        f = _match_frame(self._frame_index, url=url, name=name)
+        if f is None and not refresh:
+            await self.frames()
+            f = _match_frame(self._frame_index, url=url, name=name)
+        return f
+
+    async def waitForFrame(self, url, timeout=15000, retry=None, silent=True):
+        if retry:
+            timeout = timeout * retry
+        try:
+            ret_code, ret_msg, data = await self.wrap_fire(action='waitForFrame', url=_url_pattern(url),
+                                                            timeout=timeout)
+            return AsyncFrame(key=data.get('key'), browser=self.browser, info=data)
+        except:
+            if not silent:
+                raise
+            else:
+                return None
+
+    async def waitForFunction(self, script, polling='raf', timeout=30000, silent=True):
+        try:
+            ret_code, ret_msg, data = await self.wrap_fire(action='waitForFunction', script=_encode_script(script),
+                                                            polling=polling, timeout=timeout)
+            return data.get('result')
+        except:
+            if not silent:
+                raise
+            else:
+                return None
+
+    async def waitForResponse(self, url, timeout=30000, silent=True):
+        try:
+            ret_code, ret_msg, data = await self.wrap_fire(action='waitForResponse', url=_url_pattern(url),
+                                                            timeout=timeout)
+            return data
+        except:
+            if not silent:
+                raise
+            else:
+                return None
+
+    async def waitForNetworkIdle(self, idle_time=500, timeout=30000, silent=True):
+        try:
+            await self.wrap_fire(action='waitForNetworkIdle', idleTime=idle_time, timeout=timeout)
+            return True
+        except:
+            if not silent:
+                raise
+            else:
+                return False
+
+    async def querySelector(self, selector, silent=True):
+        try:
+            ret_code, ret_msg, data = await self.wrap_fire(action='$', selector=selector)
+            key = data.get('key')
+            return AsyncElem(key=key, browser=self.browser)
+        except:
+            if not silent:
+                raise
+            else:
+                return None
+
+    async def querySelectorAll(self, selector, silent=True):
+        try:
+            ret_code, ret_msg, data = await self.wrap_fire(action='$$', selector=selector)
+            keys = data.get('keys')
+            return [AsyncElem(key=key, browser=self.browser) for key in keys]
+        except:
+            if not silent:
+                raise
+            else:
+                return None
+
+    async def waitForSelector(self, selector, hidden=False, timeout=30000, visible=False, silent=True):
+        options = {
+            "hidden": hidden,
+            'timeout': timeout,
+            'visible': visible
+        }
+        try:
+            ret_code, ret_msg, data = await self.wrap_fire(action='waitForSelector', selector=selector,
+                                                           options=options)
+            key = data.get('key')
+            return AsyncElem(key=key, browser=self.browser)
+        except:
+            if not silent:
+                raise
+            else:
+                return None
+
+    async def bringToFront(self):
+        await self.wrap_fire(action='bringToFront')
+
+    async def setDefaultNavigationTimeout(self, timeout):
+        '''
+        timeout: milliseconds
+        '''
+        await self.wrap_fire(action='setDefaultNavigationTimeout', timeout=timeout)
+
+    async def setUserAgent(self, userAgent):
+        await self.wrap_fire(action='setUserAgent', userAgent=userAgent)
+
+    async def evaluateOnNewDocument(self, script):
+        script = _encode_script(script)
+
+        ret_code, ret_msg, data = await self.wrap_fire(action='evaluateOnNewDocument', script=script)
+        return data.get('result')
+
+    async def evaluate(self, script):
+        script = _encode_script(script)
+
+        ret_code, ret_msg, data = await self.wrap_fire(action='evaluate', script=script)
+        return data.get('result')
+
+    async def getHtml(self):
+        ret_code, ret_msg, data = await self.wrap_fire(action='html')
+        return _decode_payload(data.get('html'))
+
+    async def getUrl(self):
+        ret_code, ret_msg, data = await self.wrap_fire(action='url')
+        return data.get('url')
+
+    async def setCookies(self, cookies):
+        if type(cookies) is dict:
+            cookies = [cookies]
+
+        await self.wrap_fire(action='setCookies', cookies=cookies)
+
+    async def getCookies(self):
+        ret_code, ret_msg, data = await self.wrap_fire(action='getCookies')
+        return data.get('cookies')
+
+    async def intercept(self, rules):
+        ret_code, ret_msg, data = await self.wrap_fire(action='setInterception',
+                                                        rules=[_intercept_rule(r) for r in rules or []])
+        return data
+
+    async def blockResources(self, types=('image', 'media', 'font'), url_patterns=None):
+        rules = []
+        if types:
+            rules.append({'action': 'abort', 'types': types})
+        for url in url_patterns or []:
+            rules.append({'action': 'abort', 'url': url})
+        return await self.intercept(rules)
+
+    async def useResponseCache(self, enabled=True, types=('script', 'stylesheet', 'image', 'font')):
+        ret_code, ret_msg, data = await self.wrap_fire(action='setResponseCache', enabled=enabled,
+                                                        types=list(types or []))
+        return data.get('enabled')
+
+    async def interceptionStats(self):
+        ret_code, ret_msg, data = await self.wrap_fire(action='interceptionStats')
+        return data
+
+    async def subscribe(self, events=None, callback=None, url=None, types=None, levels=None, body=False,
+                        max_body=1024 * 1024, dialog='dismiss', max_batch=100, flush_interval=50, maxsize=10000):
+        '''
+        same as Page.subscribe, callback may also be a coroutine function:
+            async with await page.subscribe(['console']) as sub:
+                async for ev in sub.events(timeout=3):
+                    print(ev['text'])
+        '''
+        if not self.browser._multiplex:
+            raise Exception('ERROR: pushed events need a multiplexed connection, use multiplex=True')
+
+        ctx = {
+            'sub': uuid.uuid4().hex,
+            'url': _url_pattern(url) if url else None,
+            'types': list(types) if types else None,
+            'levels': list(levels) if levels else None,
+            'body': body,
+            'maxBody': max_body,
+            'dialog': dialog,
+            'maxBatch': max_batch,
+            'flushInterval': flush_interval
+        }
+        if events:
+            ctx['events'] = [events] if isinstance(events, str) else list(events)
+
+        sub = AsyncSubscription(self, ctx['sub'], callback=callback, maxsize=maxsize)
+        self.browser._listeners[sub.id] = sub._push
+        try:
+            await self.wrap_fire(action='subscribe', **ctx)
+        except Exception:
+            self.browser._listeners.pop(sub.id, None)
+            raise
+        return sub
+
+    async def goto(self, url, waitUntil='load', timeout=30000, referer=''):
+        options = {
+            "waitUntil": waitUntil,
+            'timeout': timeout,
+            'referer': referer
+        }
+
+        ret_code, ret_msg, data = await self.wrap_fire(action='goto', url=url, options=options)
+        return data.get('status')
+
+    async def goBack(self, waitUntil='load', timeout=30000, referer=''):
+        options = {
+            "waitUntil": waitUntil,
+            'timeout': timeout,
+            'referer': referer
+        }
+
+        await self.wrap_fire(action='goBack', options=options)
+
+    async def goForward(self, waitUntil='load', timeout=30000, referer=''):
+        options = {
+            "waitUntil": waitUntil,
+            'timeout': timeout,
+            'referer': referer
+        }
+
+        await self.wrap_fire(action='goForward', options=options)
+
+    async def waitForNavigation(self, waitUntil='load', timeout=30000, silent=True):
+        try:
+            await self.wrap_fire(action='waitForNavigation', options={
+                'waitUntil': waitUntil,
+                'timeout': timeout
+            })
+        except:
+            if silent:
+                return None
+            else:
+                raise
+
+    async def click(self, selector, button='left', clickCount=1, delay=0, offset=None):
+        if not offset:
+            offset = {'x': 0, 'y': 0}
+
+        options = {
+            'button': button,
+            'clickCount': clickCount,
+            'delay': delay,
+            'offset': offset
+        }
+        if offset['x'] == 0 and offset['y'] == 0:
+            options.pop('offset')
+        await self.wrap_fire(action='click', selector=selector, options=options)
+
+    async def tap(self, selector):
+        await self.wrap_fire(action='tap', selector=selector)
+
+    async def type(self, selector, text, delay=0):
+        await self.wrap_fire(action='type', selector=selector, text=text, options={'delay': delay})
+
+    async def sendCharacter(self, text):
+        await self.wrap_fire(action='sendCharacter', text=text)
+
+    async def press(self, key):
+        await self.wrap_fire(action='press', key=key)
+
+    async def pdf(self, path=None,
+                  scale=1,
+                  displayHeaderFooter=False,
+                  headerTemplate=None,
+                  footerTemplate=None,
+                  printBackground=False,
+                  landscape=False,
+                  pageRanges='',
+                  format='Letter',
+                  width=None,
+                  height=None,
+                  margin=None,
+                  preferCSSPageSize=False,
+                  omitBackground=False,
+                  timeout=30000,
+                  fp=None
+                  ):
+        '''
+        path: write the pdf on the pptrs host and return None.
+        no path: return the pdf bytes, or write them to fp in chunks and return the size.
+        '''
+        options = {
+            "path": path,
+            "scale": scale,
+            "displayHeaderFooter": displayHeaderFooter,
+            "headerTemplate": headerTemplate,
+            "footerTemplate": footerTemplate,
+            "printBackground": printBackground,
+            "landscape": landscape,
+            "pageRanges": pageRanges,
+            "format": format,
+            'width': width,
+            'height': height,
+            "margin": margin,
+            "preferCSSPageSize": preferCSSPageSize,
+            "omitBackground": omitBackground,
+            "timeout": timeout
+        }
+
+        options = {k: v for k, v in options.items() if v is not None}
+        ret_code, ret_msg, data = await self.wrap_fire(action='pdf', options=options)
+        return _artifact(data.get('pdf'), fp)
+
+    async def reset(self, url='about:blank', clear_all_cookies=False):
+        '''
+        make a used tab look new, much cheaper than close + newPage:
+        clear cookies and storage, navigate to url, drop cached elem/frame handles.
+        clear_all_cookies: clear cookies of the whole browser, not only this page's.
+        '''
+        await self.wrap_fire(action='resetPage', url=url, clearAllCookies=clear_all_cookies)
+
+    async def close(self):
+        '''
+        close active tab, if only one tab, quit chrome.
+        '''
+        await self.wrap_fire(action='closePage')
+
+    async def scroll(self, x=None, y=None):
+        ret_code, ret_msg, data = await self.wrap_fire(action='scroll', x=x, y=y)
+        return data.get('scrollOffset')
+
+    async def scrollToEnd(self, x=None, y=None, delay=0):
+        while True:
+            r1 = await self.evaluate(
+                '''window.innerHeight || document.documentElement.clientHeight || document.body.clientHeight''')
+            r2 = await self.evaluate('''document.documentElement.scrollHeight || document.body.scrollHeight''')
+            r3 = await self.scroll(x=x, y=y)
+
+            if r2 - r3 - r1 < 1:
+                break
+
+            if delay > 0:
+                await asyncio.sleep(delay)
+
+    async def scrollToTop(self, x=None, y=None, delay=0):
+        if not y:
+            y = -1 * await self.evaluate('''window.innerHeight''')
+        while True:
+            r3 = await self.scroll(x=x, y=y)
+            if r3 < 1:
+                break
+
+            if delay > 0:
+                await asyncio.sleep(delay)
+
+    async def scrollToView(self, selector, timeout=30000):
+        await self.wrap_fire(action='scrollToView', selector=selector, timeout=timeout)
+
+    async def eval(self, selector, attr='innerText', silent=True):
+        try:
+            ret_code, ret_msg, data = await self.wrap_fire(action='$eval', selector=selector, attr=attr)
+            return data.get('result')
+        except:
+            if silent:
+                return None
+            else:
+                raise
+
+    async def evalAll(self, selector, attr='innerText', silent=True):
+        try:
+            ret_code, ret_msg, data = await self.wrap_fire(action='$$eval', selector=selector, attr=attr)
+            return data.get('result')
+        except:
+            if silent:
+                return []
+            else:
+                raise
+
+    async def extract(self, schema):
+        norm = _extract_spec({'fields': schema})
+        ret_code, ret_msg, data = await self.wrap_fire(action='extract', schema=_extract_wire(norm))
+        return _extract_post(norm, data.get('result'))
+
+    async def screenShot(self, path=None, omitBackground=False, fullPage=False, type=None, quality=None, fp=None):
+        '''
+        path: write the image on the pptrs host and return None.
+        no path: return the image bytes, or write them to fp in chunks and return the size.
+        type: png|jpeg|webp
+        '''
+        ret_code, ret_msg, data = await self.wrap_fire(action='screenShot', path=path,
+                                                       omitBackground=omitBackground, fullPage=fullPage, type=type,
+                                                       quality=quality)
+        return _artifact(data.get('image'), fp)
+
+    def batch(self, stop_on_error=True):
+        '''
+        queue actions and run them in one round trip:
+            results = await page.batch().goto(url).click('#login').getUrl().run()
+        '''
+        return AsyncBatch(page=self, stop_on_error=stop_on_error)
+
+
+class AsyncBatch(Batch):
+
+    async def run(self):
+        if not self._steps:
+            return []
+
+        ret_code, ret_msg, data = await self.page.wrap_fire(action='batch', steps=self._steps,
+                                                            stopOnError=self.stop_on_error)
+        return self._collect(data)
+
+    def waitForSelector(self, selector, hidden=False, timeout=30000, visible=False):
+        options = {
+            "hidden": hidden,
+            'timeout': timeout,
+            'visible': visible
+        }
+        browser = self.page.browser
+        return self._add('waitForSelector', lambda d: AsyncElem(key=d.get('key'), browser=browser),
+                         selector=selector, options=options)
+
+
+class AsyncSubscription():
+    _CLOSED = object()
+
+    def __init__(self, page, sub_id, callback=None, maxsize=10000):
+        self.page = page
+        self.id = sub_id
+        self.callback = callback
+        self.dropped = 0
+        self.closed = False
+        self._queue = asyncio.Queue(maxsize)
+
+    def __repr__(self):
+        return '<class.AsyncSubscription id=%s>' % self.id
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, exc_type, exc_val, exc_tb):
+        await self.close()
+
+    def __aiter__(self):
+        return self.events()
+
+    def _put(self, item):
+        try:
+            self._queue.put_nowait(item)
+        except asyncio.QueueFull:
+            if item is self._CLOSED:
+                self._queue.get_nowait()
+                self._queue.put_nowait(item)
+            self.dropped += 1
+
+    def _push(self, events):
+        if events is None:
+            self.closed = True
+            self._put(self._CLOSED)
+            return
+
+        for ev in events:
+            if ev.get('body') is not None:
+                ev['body'] = _artifact(ev['body'])
+            if self.callback:
+                r = self.callback(ev)
+                if asyncio.iscoroutine(r):
+                    asyncio.ensure_future(r)
+            else:
+                self._put(ev)
+
+    async def get(self, timeout=None):
+        '''
+        next queued event, None once closed, raises asyncio.TimeoutError after timeout seconds.
+        '''
+        item = await asyncio.wait_for(self._queue.get(), timeout)
+        if item is self._CLOSED:
+            self._put(item)
+            return None
+        return item
+
+    async def events(self, timeout=None):
+        while True:
+            try:
+                ev = await self.get(timeout=timeout)
+            except asyncio.TimeoutError:
+                return
+            if ev is None:
+                return
+            yield ev
+
+    async def close(self):
+        if self.closed:
+            return
+        self.closed = True
+        try:
+            await self.page.wrap_fire(action='unsubscribe', sub=self.id)
+        finally:
+            self.page.browser._listeners.pop(self.id, None)
+            self._put(self._CLOSED)
+
+
+class AsyncElem():
+    def __init__(self, key, browser):
+        self.browser = browser
+        self.key = key
+        self._finalizer = weakref.finalize(self, browser._release_handle, key)
+        self._finalizer.atexit = False
+
+    def __repr__(self):
+        return '<class.AsyncElem, key=%s>' % self.key
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, exc_type, exc_val, exc_tb):
+        await self.dispose()
+
+    async def dispose(self):
+        if self._finalizer.detach():
+            await self.browser.wrap_fire(id=self.browser.browser_id, action='disposeHandles', keys=[self.key])
+
+    async def wrap_fire(self, action, **kwargs):
+        return await self.browser.wrap_fire(id=self.browser.browser_id, action=action, key=self.key, **kwargs)
+
+    async def querySelector(self, selector, silent=True):
+        try:
+            ret_code, ret_msg, data = await self.wrap_fire(action='e_$', selector=selector)
+            key = data.get('key')
+            return AsyncElem(key=key, browser=self.browser)
+        except:
+            if silent:
+                return None
+            else:
+                raise
+
+    async def querySelectorAll(self, selector, silent=True):
+        try:
+            ret_code, ret_msg, data = await self.wrap_fire(action='e_$$', selector=selector)
+            keys = data.get('keys')
+            return [AsyncElem(key=key, browser=self.browser) for key in keys]
+        except:
+            if silent:
+                return None
+            else:
+                raise
+
+    async def click(self, button='left', clickCount=1, delay=0, offset=None):
+        if not offset:
+            offset = {'x': 0, 'y': 0}
+
+        options = {
+            'button': button,
+            'clickCount': clickCount,
+            'delay': delay,
+            'offset': offset
+        }
+        if offset['x'] == 0 and offset['y'] == 0:
+            options.pop('offset')
+        await self.wrap_fire(action='e_click', options=options)
+
+    async def getProperty(self, attr='value'):
+        ret_code, ret_msg, data = await self.wrap_fire(action='e_getProperty', attr=attr)
+        return _decode_payload(data.get('value'))
+
+    async def screenShot(self, path=None, omitBackground=False, type=None, quality=None, fp=None):
+        '''
+        same as Page.screenShot, clipped to this element.
+        '''
+        ret_code, ret_msg, data = await self.wrap_fire(action='e_screenShot', path=path,
+                                                       omitBackground=omitBackground, type=type, quality=quality)
+        return _artifact(data.get('image'), fp)
+
+    async def isIntersectingViewport(self):
+        ret_code, ret_msg, data = await self.wrap_fire(action='e_isIntersectingViewport')
+        return data.get('result')
+
+    async def scrollIntoView(self):
+        ret_code, ret_msg, data = await self.wrap_fire(action='e_scrollIntoView')
+        return data.get('result')
+
+
+class AsyncFrame():
+    def __init__(self, key, browser, info=None):
+        self.browser = browser
+        self.key = key
+        self.info = info or {'key': key}
+
+    def __repr__(self):
+        return '<class.AsyncFrame key=%s>' % self.key
+
+    async def wrap_fire(self, action, **kwargs):
+        return await self.browser.wrap_fire(id=self.browser.browser_id, action=action, frameKey=self.key, **kwargs)
+
+    async def url(self):
+        ret_code, ret_msg, data = await self.wrap_fire(action='f_url')
+        url = data.get('url')
+        self.info['url'] = url
+        return url
+
+    def name(self):
+        return self.info.get('name')
+
+    async def querySelector(self, selector, silent=True):
+        try:
+            ret_code, ret_msg, data = await self.wrap_fire(action='f_$', selector=selector)
+            key = data.get('key')
+            return AsyncElem(key=key, browser=self.browser)
+        except:
+            if not silent:
+                raise
+            else:
+                return None
+
+    async def querySelectorAll(self, selector, silent=True):
+        try:
+            ret_code, ret_msg, data = await self.wrap_fire(action='f_$$', selector=selector)
+            keys = data.get('keys')
+            return [AsyncElem(key=key, browser=self.browser) for key in keys]
+        except:
+            if not silent:
+                raise
+            else:
+                return None
+
+    async def waitForNavigation(self, waitUntil='load', timeout=30000, silent=True):
+        try:
+            await self.wrap_fire(action='f_waitForNavigation', options={
+                'waitUntil': waitUntil,
+                'timeout': timeout
+            })
+        except:
+            if silent:
+                return None
+            else:
+                raise
+
+    async def waitForSelector(self, selector, hidden=False, timeout=30000, visible=False, silent=True):
+        options = {
+            "hidden": hidden,
+            'timeout': timeout,
+            'visible': visible
+        }
+        try:
+            ret_code, ret_msg, data = await self.wrap_fire(action='f_waitForSelector', selector=selector,
+                                                           options=options)
+            key = data.get('key')
+            return AsyncElem(key=key, browser=self.browser)
+        except:
+            if not silent:
+                raise
+            else:
+                return None
+
+    async def click(self, selector, button='left', clickCount=1, delay=0, offset=None):
+        if not offset:
+            offset = {'x': 0, 'y': 0}
+
+        options = {
+            'button': button,
+            'clickCount': clickCount,
+            'delay': delay,
+            'offset': offset
+        }
+        if offset['x'] == 0 and offset['y'] == 0:
+            options.pop('offset')
+        await self.wrap_fire(action='f_click', selector=selector, options=options)
+
+    async def evaluate(self, script):
+        script = _encode_script(script)
+
+        ret_code, ret_msg, data = await self.wrap_fire(action='f_evaluate', script=script)
+        return data.get('result')
+
+    async def eval(self, selector, attr='innerText'):
+        ret_code, ret_msg, data = await self.wrap_fire(action='f_$eval', selector=selector, attr=attr)
+        return data.get('result')
+
+    async def extract(self, schema):
+        norm = _extract_spec({'fields': schema})
+        ret_code, ret_msg, data = await self.wrap_fire(action='f_extract', schema=_extract_wire(norm))
+        return _extract_post(norm, data.get('result'))
+
+    async def waitForFunction(self, script, polling='raf', timeout=30000, silent=True):
+        try:
+            ret_code, ret_msg, data = await self.wrap_fire(action='f_waitForFunction', script=_encode_script(script),
+                                                            polling=polling, timeout=timeout)
+            return data.get('result')
+        except:
+            if not silent:
+                raise
+            else:
+                return None
@@ -4,41 +4,81 @@
 # @Comment :
 
 import base64
-import json
+import contextvars
 import logging
 import os
-import sys
+import queue
+import random
+import re
+import shutil
 import socket
+import sys
+import threading
 import time
 import traceback
-import copy
-import chardet
-from .log import getLogger, getFileLogger
-
-
-def _bytes_to_str(b):
-    if not b:
-        return b
-    cd = chardet.detect(b)
-    return str(b, encoding=cd['encoding'])
+import uuid
+import weakref
+from contextlib import contextmanager
+from .log import getLogger, getFileLogger, sampled, RpcMessage
+from .connection import Connection
+from .metrics import default_metrics
+from .tracing import Call
+from .pool import default_pool
+from .protocol import HEAD_LEN
+
+
+def _encode_script(script):
+    '''
+    scripts travel as payload bytes: raw in binary framing, base64 in ascii framing.
+    '''
+    if not script:
+        return script
+    return bytes(script, encoding='utf-8')
+
+
+def _decode_payload(v):
+    '''
+    payload from pptrs: bytes in binary framing, base64 str in ascii framing.
+    '''
+    if not v:
+        return v
+    if type(v) is str:
+        v = base64.b64decode(v)
+    if type(v) is bytes:
+        return v.decode()
+    return v
+
+
+_POSIX_CHROME_NAMES = ('google-chrome', 'google-chrome-stable', 'chromium', 'chromium-browser',
+                       'microsoft-edge', 'microsoft-edge-stable')
+_DARWIN_CHROME_PATHS = ('/Applications/Google Chrome.app/Contents/MacOS/Google Chrome',
+                        '/Applications/Chromium.app/Contents/MacOS/Chromium',
+                        '/Applications/Microsoft Edge.app/Contents/MacOS/Microsoft Edge')
 
 
 def _default_executable_path(product):
-    if product == 'chrome':
-        if sys.platform == 'win32':
-            chrome_deault_path = "C:/Program Files (x86)/Google/Chrome/Application/chrome.exe"
-            edge_default_path = "C:/Program Files (x86)/Microsoft/Edge/Application/msedge.exe"
-            if os.path.exists(chrome_deault_path):
-                return chrome_deault_path
-            elif os.path.exists(edge_default_path):
-                return edge_default_path
-            raise Exception('no chrome or edge found')
-        elif sys.platform == 'linux':
-            raise
-        elif sys.platform == 'darwin':
-            raise
-    else:
-        raise
+    if product != 'chrome':
+        raise Exception(f'no default executable for {product}, pass executable_path')
+
+    if sys.platform == 'win32':
+        chrome_deault_path = "C:/Program Files (x86)/Google/Chrome/Application/chrome.exe"
+        edge_default_path = "C:/Program Files (x86)/Microsoft/Edge/Application/msedge.exe"
+        if os.path.exists(chrome_deault_path):
+            return chrome_deault_path
+        elif os.path.exists(edge_default_path):
+            return edge_default_path
+        raise Exception('no chrome or edge found')
+
+    # looked up where this process runs, as on windows: the server is expected on the same host.
+    if sys.platform == 'darwin':
+        for path in _DARWIN_CHROME_PATHS:
+            if os.path.exists(path):
+                return path
+    for name in _POSIX_CHROME_NAMES:
+        path = shutil.which(name)
+        if path is not None:
+            return path
+    raise Exception('no chrome, chromium or edge found, pass executable_path')
 
 
 def VIEWPORT(width, height, device_scale_factor=1, is_mobile=False, has_touch=False, is_landscape=False):
@@ -136,14 +176,234 @@ def _LAUNCH_OPTIONS(product='chrome',
     return _opts
 
 
+def _artifact(v, fp=None, chunk=65536):
+    '''
+    screenshot/pdf payload: None when saved on the pptrs host, bytes otherwise.
+    with fp, bytes are written in chunks and the size is returned.
+    '''
+    if v is None:
+        return None
+    if type(v) is str:
+        v = base64.b64decode(v)
+    if fp is None:
+        return v
+
+    view = memoryview(v)
+    for i in range(0, len(view), chunk):
+        fp.write(view[i:i + chunk])
+    return len(view)
+
+
+_EXTRACT_TRANSFORMS = ('trim', 'lower', 'upper', 'int', 'float', 'number')
+_EXTRACT_ATTR = re.compile(r'^[\w:-]+$')
+
+
+def _extract_spec(spec):
+    '''
+    normalize one schema field, see Page.extract.
+    '''
+    if isinstance(spec, list):
+        if len(spec) != 1:
+            raise Exception('ERROR: a list marker holds exactly one spec: %r' % spec)
+        return dict(_extract_spec(spec[0]), all=True)
+
+    if isinstance(spec, str):
+        selector, at, attr = spec.rpartition('@')
+        if not at or not _EXTRACT_ATTR.match(attr):
+            selector, attr = spec, None
+        spec = {'selector': selector, 'attr': attr}
+
+    if not isinstance(spec, dict):
+        raise Exception('ERROR: bad extract spec: %r' % (spec,))
+
+    norm = {
+        'selector': (spec.get('selector') or '').strip() or None,
+        'all': bool(spec.get('list'))
+    }
+    if spec.get('fields') is not None:
+        norm['fields'] = {k: _extract_spec(v) for k, v in spec['fields'].items()}
+    elif spec.get('attr'):
+        norm['attr'] = spec['attr']
+    else:
+        norm['property'] = spec.get('property') or 'innerText'
+
+    transform = spec.get('transform')
+    if isinstance(transform, str) and transform not in _EXTRACT_TRANSFORMS:
+        raise Exception('ERROR: unknown transform %s, use one of %s or a callable' % (transform,
+                                                                                       _EXTRACT_TRANSFORMS))
+    if transform:
+        norm['transform'] = transform
+    if 'default' in spec:
+        norm['default'] = spec['default']
+    return norm
+
+
+def _extract_wire(norm):
+    '''
+    normalized spec as sent to pptrs, callable transforms stay on the client.
+    '''
+    wire = {k: v for k, v in norm.items() if k != 'fields' and not callable(v)}
+    if 'fields' in norm:
+        wire['fields'] = {k: _extract_wire(v) for k, v in norm['fields'].items()}
+    return wire
+
+
+def _extract_post(norm, value):
+    '''
+    apply callable transforms to the result evaluated by pptrs.
+    '''
+    if norm['all'] and isinstance(value, list):
+        one = dict(norm, all=False)
+        return [_extract_post(one, v) for v in value]
+    if value is None:
+        return value
+    if 'fields' in norm:
+        return {k: _extract_post(v, value.get(k)) for k, v in norm['fields'].items()}
+    if callable(norm.get('transform')):
+        return norm['transform'](value)
+    return value
+
+
+def _url_pattern(url):
+    '''
+    str matches as a substring, a compiled re.Pattern as a regular expression
+    evaluated by pptrs (keep it to syntax shared by python and javascript).
+    '''
+    if isinstance(url, re.Pattern):
+        return {'pattern': url.pattern, 'regex': True, 'flags': 'i' if url.flags & re.IGNORECASE else ''}
+    return {'pattern': url, 'regex': False}
+
+
+_INTERCEPT_ACTIONS = ('abort', 'continue', 'fulfill')
+
+
+def _intercept_rule(rule):
+    '''
+    normalize one interception rule, see Page.intercept.
+    '''
+    if rule.get('action') not in _INTERCEPT_ACTIONS:
+        raise Exception('ERROR: interception action must be one of %s: %r' % (_INTERCEPT_ACTIONS, rule))
+
+    wire = {'action': rule['action']}
+    if rule.get('types'):
+        wire['types'] = [rule['types']] if isinstance(rule['types'], str) else list(rule['types'])
+    if rule.get('url'):
+        wire['url'] = _url_pattern(rule['url'])
+    if rule.get('error'):
+        wire['error'] = rule['error']
+    if rule.get('headers'):
+        wire['headers'] = rule['headers']
+    if rule['action'] == 'fulfill':
+        body = rule.get('body') or b''
+        wire['body'] = body.encode('utf-8') if isinstance(body, str) else bytes(body)
+        wire['status'] = rule.get('status', 200)
+        if rule.get('content_type'):
+            wire['contentType'] = rule['content_type']
+    return wire
+
+
+# actions after which the frame index of a page may be stale.
+_FRAME_NAVIGATIONS = ('goto', 'goBack', 'goForward', 'waitForNavigation', 'resetPage', 'closePage', 'batch',
+                      'waitForFrame')
+
+
+def _match_frame(frames, url=None, name=None):
+    for f in frames or []:
+        if f.info.get('detached'):
+            continue
+        if name is not None and f.info.get('name') != name:
+            continue
+        if url is not None:
+            u = f.info.get('url') or ''
+            if isinstance(url, re.Pattern):
+                if not url.search(u):
+                    continue
+            elif u.find(url, 0) < 0:
+                continue
+        return f
+
+
+# answered the same however often they are sent, retried after a broken connection.
+_IDEMPOTENT = frozenset(('url', 'html', '$eval', 'pagesCount', 'ping', 'getCookies', 'frames',
+                         'interceptionStats', 'health', 'load', 'cacheStats', 'metrics'))
+_MAX_BACKOFF = 2.0
+
+
+def _backoff(base, attempt):
+    '''
+    seconds before retry attempt + 1: doubling from base, capped, with jitter.
+    '''
+    return min(base * (2 ** attempt), _MAX_BACKOFF) * random.uniform(0.5, 1)
+
+
+def _retryable(error, action, sent):
+    '''
+    a request that could not connect is safe to send again, one that was already
+    sent only if its action is idempotent. a request past its deadline is not,
+    socket.timeout is only a TimeoutError from python 3.10 on.
+    '''
+    return (isinstance(error, OSError) and not isinstance(error, (TimeoutError, socket.timeout))
+            and (not sent or action in _IDEMPOTENT))
+
+
+# time.monotonic() by which requests made in a `with deadline(...)` block must be answered.
+_deadline = contextvars.ContextVar('pptrc_deadline', default=None)
+
+
+@contextmanager
+def deadline(seconds):
+    '''
+    every Browser/Page/Elem/Frame call in the block, on this thread or task, must be
+    answered within seconds of entering it, or raises TimeoutError and stub.js aborts
+    the action still running. nested blocks keep the earlier deadline:
+        with pptrc.deadline(5):
+            page.goto(url)
+            page.waitForSelector('#done')
+    '''
+    at = time.monotonic() + seconds
+    current = _deadline.get()
+    token = _deadline.set(at if current is None else min(at, current))
+    try:
+        yield
+    finally:
+        _deadline.reset(token)
+
+
+def _remaining(default):
+    '''
+    seconds left for a request: the enclosing deadline block, else default, None for no limit.
+    '''
+    at = _deadline.get()
+    if at is None:
+        return default
+    left = at - time.monotonic()
+    return left if default is None else min(left, default)
+
+
 class BrowserProxy():
 
-    def __init__(self, host, port, log_level, log_file):
+    def __init__(self, host, port, log_level, log_file, multiplex=False, binary=False, shm_threshold=None,
+                 pool=None, metrics=None, tracer=None, retries=2, backoff=0.1, connect=True, deadline=None):
+        '''
+        deadline: seconds, default time limit of every request, see pptrc.deadline.
+        retries: times a request is sent again after the connection broke, see _retryable.
+        backoff: seconds before the first retry, doubled per retry up to _MAX_BACKOFF.
+        connect: False to open the connection on first use, e.g. while pptrs is starting.
+        '''
         self._host = host
         self._port = port
-        self._head_len = 8
+        self._head_len = HEAD_LEN
         self._chunk = 4096
         self._log_level = log_level
+        self._connection = None
+        self._released = []
+        self._released_lock = threading.Lock()
+        self._metrics = None if metrics is False else (metrics or default_metrics())
+        self._tracer = tracer
+        self._retries = retries
+        self._backoff = backoff
+        self._deadline = deadline
+        self._connect_lock = threading.Lock()
 
         if log_file:
             self._logger = getFileLogger(file=log_file, level=log_level)
@@ -153,23 +413,19 @@ class BrowserProxy():
         if not self._port:
             raise Exception('port is None')
 
-        self._connection = socket.socket(family=socket.AF_INET, type=socket.SOCK_STREAM)
-        self._connection.connect((self._host, self._port))
+        self._conn_opts = {
+            'multiplex': multiplex,
+            'binary': binary,
+            'shm_threshold': shm_threshold
+        }
+        self._pool = default_pool() if pool is True else pool
+        if self._pool is None and connect:
+            self._connection = Connection(self._host, self._port, logger=self._logger, timeout=_remaining(deadline),
+                                          **self._conn_opts)
 
     def __del__(self):
         self._close()
 
-    def _print_message(self, obj, tag='message'):
-        self._logger.debug('==================%s==================:', tag)
-        if type(obj) is dict:
-            self._logger.debug(json.dumps(obj, indent=2, ensure_ascii=False))
-        elif type(obj) is list:
-            for o in obj:
-                self._print_message(o)
-        else:
-            self._logger.debug(obj)
-        self._logger.debug('================end %s================:', tag)
-
     def _close(self):
         try:
             if self._connection:
@@ -177,7 +433,49 @@ class BrowserProxy():
         except Exception:
             self._logger.warn("error happened when closing browser proxy connection:\n" + traceback.format_exc())
 
-    def _fire(self, id, action, **kwargs):
+    def _get_connection(self, timeout=None):
+        '''
+        timeout: seconds to connect in when a new connection is needed.
+        '''
+        if self._pool is None:
+            conn = self._connection
+            if conn is not None and conn.alive():
+                return conn
+            # never opened, or broken by a pptrs restart or a half read frame.
+            with self._connect_lock:
+                if self._connection is conn:
+                    if conn is not None:
+                        conn.close()
+                        self._connection = None
+                        self._logger.warning('pptrs connection to %s:%s lost, reconnecting.', self._host, self._port)
+                    self._connection = Connection(self._host, self._port, logger=self._logger, timeout=timeout,
+                                                  **self._conn_opts)
+                return self._connection
+        return self._pool.get(self._host, self._port, logger=self._logger, timeout=timeout, **self._conn_opts)
+
+    def _release_handle(self, key):
+        '''
+        called by Elem finalizers, possibly from the garbage collector, so only queue
+        the key, it is sent along with the next request.
+        '''
+        with self._released_lock:
+            self._released.append(key)
+
+    def _take_released(self):
+        with self._released_lock:
+            keys, self._released = self._released, []
+        return keys
+
+    def _return_released(self, keys):
+        # the request carrying them failed, disposing a key twice is harmless.
+        with self._released_lock:
+            self._released[:0] = keys
+
+    def _fire(self, id, action, _conn=None, _retries=None, **kwargs):
+        '''
+        _conn: send on this connection instead of the browser's own or a pooled one, never retried.
+        _retries: overrides the browser's retries for this request.
+        '''
         if not action:
             raise Exception('ERROR: _fire function argument action is None.')
 
@@ -186,50 +484,101 @@ class BrowserProxy():
             "action": action,
             "ctx": kwargs
         }
+        if self._released and id:
+            send['dispose'] = self._take_released()
 
-        if self._logger.level == logging.DEBUG:
-            self._print_message(send, "send data")
-
-        send = json.dumps(send).encode('utf-8')
-        send_len = str(len(send)).zfill(self._head_len).encode('utf-8')
-        self._connection.send(send_len + send)
-        total_size = int(self._connection.recv(self._head_len))
+        logged = self._logger.isEnabledFor(logging.DEBUG) and sampled()
+        if logged:
+            self._logger.debug('%s', RpcMessage('send', send))
 
-        data = []
-        recv_size = 0
-        while recv_size < total_size:
-            buf = self._connection.recv(self._chunk)
-            data.append(buf)
-            recv_size = recv_size + len(buf)
+        retries = 0 if _conn is not None else self._retries if _retries is None else _retries
+        attempt = 0
+        while True:
+            sent = False
+            try:
+                timeout = _remaining(self._deadline)
+                if timeout is not None:
+                    if timeout <= 0:
+                        raise TimeoutError('deadline exceeded before %s was sent' % action)
+                    # stub.js aborts the action by itself once this many ms passed.
+                    send['deadline'] = int(timeout * 1000)
+                conn = _conn or self._get_connection(timeout)
+                sent = True
+                if self._metrics is None and self._tracer is None:
+                    _jd = conn.request(send, timeout=timeout)
+                else:
+                    _jd = self._timed_request(conn, send, timeout)
+                break
+            except BaseException as e:
+                # BaseException: the keys go back on KeyboardInterrupt too.
+                if attempt >= retries or not _retryable(e, action, sent):
+                    if send.get('dispose'):
+                        self._return_released(send['dispose'])
+                    raise
+                self._logger.warning('%s failed: %s, retry %d/%d', action, e, attempt + 1, retries)
+                time.sleep(_backoff(self._backoff, attempt))
+                attempt += 1
+
+        if _jd:
+            if logged:
+                self._logger.debug('%s', RpcMessage('recv', _jd))
 
-        if data:
-            data = b''.join(data)
-            _jd = json.loads(data)
+            return _jd
 
-            if self._logger.level == logging.DEBUG:
-                _jd2 = copy.copy(_jd)
-                if _jd2.get('html'):
-                    _jd2['html'] = '*'
-                if _jd2.get('img_b64'):
-                    _jd2['img_b64'] = '*'
-                self._print_message(_jd2, "recv")
+        return None
 
-            _file = _jd.get('file')
-            if _file:
-                with open(_file, 'rb') as f:
-                    _jd = json.load(f)
+    def _hook(self, name, *args):
+        try:
+            getattr(self._tracer, name)(*args)
+        except Exception:
+            self._logger.warning('tracer %s failed:\n%s' % (name, traceback.format_exc()))
 
-                os.remove(_file)
+    def _timed_request(self, conn, send, timeout=None):
+        call = Call(send)
+        if self._tracer is not None:
+            self._hook('before_send', call)
 
-            return _jd
+        sizes = {}
+        start = time.perf_counter()
+        try:
+            _jd = conn.request(send, sizes, timeout)
+        except Exception as e:
+            call.client_ms = (time.perf_counter() - start) * 1000
+            self._record(call, e)
+            raise
 
-        return None
+        call.client_ms = (time.perf_counter() - start) * 1000
+        call.sent, call.recv = sizes.get('sent', 0), sizes.get('recv', 0)
+        error = None
+        if not _jd:
+            error = Exception('pptrs return None')
+        else:
+            call.server_ms = _jd.get('elapsed')
+            call.ret_code, call.ret_msg = _jd.get('retCode'), _jd.get('retMsg')
+            if call.ret_code is None or call.ret_code < 0:
+                error = Exception('pptrs return %s, retMsg=%s' % (call.ret_code, call.ret_msg))
+        self._record(call, error)
+        return _jd
+
+    def _record(self, call, error):
+        if self._metrics is not None:
+            self._metrics.record(call.action, call.client_ms, server_ms=call.server_ms, sent=call.sent,
+                                 recv=call.recv, error=error is not None)
+        if self._tracer is not None:
+            if error is None:
+                self._hook('after_recv', call)
+            else:
+                self._hook('on_error', call, error)
 
     def wrap_fire(self, id, action, **kwargs):
         r = self._fire(id, action, **kwargs)
         if not r:
             raise Exception('ERROR: _fire(*args, **kwargs): pptrs return None')
 
+        if r.get("retCode") == -3:
+            # aborted by stub.js at the request's deadline.
+            raise TimeoutError('ERROR: %s: %s' % (action, r.get("retMsg")))
+
         if r.get("retCode") < 0:
             raise Exception('ERROR: _fire(*args, **kwargs): pptrs return -2, retMsg=%s' % r.get("retMsg"))
 
@@ -237,9 +586,45 @@ class BrowserProxy():
 
 
 class Browser(BrowserProxy):
-    def __init__(self, browser_id=None, host='127.0.0.1', port=9999, log_level='debug', log_file=None):
-        super(Browser, self).__init__(host=host, port=port, log_level=log_level, log_file=log_file)
+    def __init__(self, browser_id=None, host='127.0.0.1', port=9999, log_level=None, log_file=None,
+                 multiplex=False, binary=False, shm_threshold=None, pool=None, router=None, metrics=None,
+                 tracer=None, retries=2, backoff=0.1, ready_timeout=None, deadline=None):
+        '''
+        multiplex: tag frames with a `seq` so threads sharing this browser can keep
+                   many requests in flight on one connection.
+        binary: negotiate binary framing, html/property values/scripts skip base64.
+        shm_threshold: bytes, with a local pptrs larger responses skip the socket, e.g. 1 << 20.
+        log_level: level of the 'pptrc' logger, 'debug' logs every request. None leaves it to
+                   the application, logging's default is WARNING.
+        pool: ConnectionPool to borrow connections from per request, True for the process wide pool.
+        router: WorkerRouter, overrides host/port: the worker owning browser_id, or the
+                least loaded worker at launch() for a new browser.
+        metrics: Metrics to record every request into, None for the process wide one,
+                 False to record nothing.
+        tracer: Tracer whose before_send/after_recv/on_error hooks run around every request,
+                e.g. ChromeTraceWriter('trace.json').
+        retries: times a request is sent again after the connection to pptrs broke, with a
+                 backoff starting at `backoff` seconds. requests already sent are retried only
+                 for idempotent actions (url, html, $eval, pagesCount, ...).
+        ready_timeout: seconds to wait for pptrs to answer `health` before returning, for a
+                       server that is still starting. None connects at once and fails if it is down.
+        deadline: seconds, default time limit of every request of this browser and its pages,
+                  elements and frames, TimeoutError past it and stub.js aborts the action.
+                  a `with pptrc.deadline(seconds)` block sets a tighter one for the calls in it.
+        '''
+        self._router = router
+        if router is not None:
+            # without browser_id the worker is picked and reserved by launch().
+            host, port = router.locate(browser_id) if browser_id else router.workers()[0]
+
+        super(Browser, self).__init__(host=host, port=port, log_level=log_level, log_file=log_file,
+                                      multiplex=multiplex, binary=binary, shm_threshold=shm_threshold, pool=pool,
+                                      metrics=metrics, tracer=tracer, retries=retries, backoff=backoff,
+                                      connect=ready_timeout is None and (router is None or bool(browser_id)),
+                                      deadline=deadline)
         self.browser_id = browser_id
+        if ready_timeout is not None:
+            self.waitReady(ready_timeout)
 
     def launch(self,
                product='chrome',
@@ -275,8 +660,21 @@ class Browser(BrowserProxy):
                                   disable_extensions=disable_extensions,
                                   extensions=extensions)
 
-        ret_code, ret_msg, data = self.wrap_fire(id=self.browser_id, action='launch', options=options)
-        self.browser_id = data.get('wsEndpoint')
+        reservation = None
+        if self._router is not None and not self.browser_id:
+            reservation = self._router.least_loaded()
+            if reservation.worker != (self._host, self._port):
+                self._close()
+                self._connection = None
+                self._host, self._port = reservation.worker
+        try:
+            ret_code, ret_msg, data = self.wrap_fire(id=self.browser_id, action='launch', options=options)
+            self.browser_id = data.get('wsEndpoint')
+            if self._router is not None:
+                self._router.register(self.browser_id, (self._host, self._port), reservation)
+        finally:
+            if reservation is not None:
+                self._router.cancel(reservation)
 
         self._logger.debug('launch succeed, wsEndpoint: %s' % self.browser_id)
 
@@ -285,7 +683,7 @@ class Browser(BrowserProxy):
     def newPage(self):
         ret_code, ret_msg, data = self.wrap_fire(id=self.browser_id, action='newPage')
         page_index = data.get('pageIndex')
-        page = Page(browser=self, page_index=page_index)
+        page = Page(browser=self, page_index=page_index, page_id=data.get('pageId'))
 
         return page
 
@@ -296,6 +694,63 @@ class Browser(BrowserProxy):
         ret_code, ret_msg, data = self.wrap_fire(id=self.browser_id, action='pagesCount')
         return data.get('pages')
 
+    def ping(self):
+        '''
+        chrome version, asked from chrome itself, raises when the browser crashed or disconnected.
+        '''
+        ret_code, ret_msg, data = self.wrap_fire(id=self.browser_id, action='ping')
+        return data.get('version')
+
+    def health(self):
+        '''
+        {pid, uptime, connections, browsers, pages, elemHandles, frameHandles, responseCache, rss}
+        of the pptrs process, uptime in seconds.
+        '''
+        ret_code, ret_msg, data = self.wrap_fire(id=None, action='health')
+        return data
+
+    def waitReady(self, timeout=30):
+        '''
+        poll `health` with backoff until pptrs answers, TimeoutError after timeout seconds.
+        '''
+        deadline = time.time() + timeout
+        attempt = 0
+        while True:
+            try:
+                ret_code, ret_msg, data = self.wrap_fire(id=None, action='health', _retries=0)
+                return data
+            except OSError as e:
+                delay = _backoff(self._backoff, attempt)
+                if time.time() + delay > deadline:
+                    raise TimeoutError('pptrs on %s:%s not ready in %ss: %s' % (self._host, self._port, timeout, e))
+                time.sleep(delay)
+                attempt += 1
+
+    def responseCacheStats(self):
+        '''
+        {enabled, dir, entries, bytes, maxBytes, hits, misses, stores, evictions} of the
+        response cache shared by every browser of this pptrs process.
+        '''
+        ret_code, ret_msg, data = self.wrap_fire(id=None, action='cacheStats')
+        return data
+
+    def metrics(self):
+        '''
+        {action: {count, errors, sent_bytes, recv_bytes, client{...}, server{...}}} recorded
+        on this side, latencies in ms with p50/p90/p99 estimated from the buckets.
+        the registry is process wide unless the browser was created with its own.
+        '''
+        return self._metrics.snapshot() if self._metrics is not None else {}
+
+    def serverMetrics(self):
+        '''
+        {since, bounds, actions: {action: {count, errors, recvBytes, sentBytes, sum, buckets}}}
+        of every request this pptrs process has answered, times in ms, buckets[i] counts
+        the requests that took at most bounds[i].
+        '''
+        ret_code, ret_msg, data = self.wrap_fire(id=None, action='metrics')
+        return data
+
     def getPage(self, page_index=0):
         pc = self.pagesCount()
         if page_index < 0 or page_index > pc:
@@ -307,9 +762,13 @@ class Browser(BrowserProxy):
 
 
 class Page():
-    def __init__(self, browser, page_index):
+    def __init__(self, browser, page_index, page_id=None):
         self.browser = browser
         self.page_index = page_index
+        # set for tabs opened by newPage, pptrs finds the tab by it even after
+        # closing an earlier tab moved its index.
+        self.page_id = page_id
+        self._frame_index = None
 
         '''
         self.navigation_options = {
@@ -326,31 +785,103 @@ class Page():
         '''
 
     def wrap_fire(self, action, **kwargs):
+        if action in _FRAME_NAVIGATIONS:
+            self._frame_index = None
+        if self.page_id is not None:
+            kwargs['pageId'] = self.page_id
         return self.browser.wrap_fire(id=self.browser.browser_id, action=action, pageIndex=self.page_index, **kwargs)
 
     def frames(self, silent=True):
+        '''
+        every frame with url, name, parent key and detached state in one round trip,
+        also refreshes the frame index used by findFrame.
+        '''
         _frames = None
         try:
             ret_code, ret_msg, data = self.wrap_fire(action='frames')
-            keys = data.get('keys')
-            _frames = [Frame(key=key, browser=self.browser) for key in keys]
+            _frames = [Frame(key=info.get('key'), browser=self.browser, info=info) for info in data.get('frames')]
+            self._frame_index = _frames
         except:
             if not silent:
                 raise
 
         return _frames
 
-    def findFrame(self, url):
-        for f in self.frames():
-            if f.url().find(url, 0) >= 0:
-                return f
+    def findFrame(self, url=None, name=None, refresh=False):
+        '''
+        look up the frame index of this page, no round trip on a hit. the index is
+        dropped by navigations made through this Page and refreshed once on a miss.
+        url: substring or re.Pattern.
+        name: exact frame name.
+        '''
+        if refresh or self._frame_index is None:
+            self.frames()
+            refresh = True
+
+        f = _match_frame(self._frame_index, url=url, name=name)
+        if f is None and not refresh:
+            self.frames()
+            f = _match_frame(self._frame_index, url=url, name=name)
+        return f
+
+    def waitForFrame(self, url, timeout=15000, retry=None, silent=True):
+        '''
+        wait in pptrs for a frame whose url matches, returns as soon as it is attached.
+        url: substring or re.Pattern.
+        retry: deprecated, the wait used to be `retry` sleeps of `timeout` ms, still honoured as timeout * retry.
+        '''
+        if retry:
+            timeout = timeout * retry
+        try:
+            ret_code, ret_msg, data = self.wrap_fire(action='waitForFrame', url=_url_pattern(url), timeout=timeout)
+            return Frame(key=data.get('key'), browser=self.browser, info=data)
+        except:
+            if not silent:
+                raise
+            else:
+                return None
+
+    def waitForFunction(self, script, polling='raf', timeout=30000, silent=True):
+        '''
+        wait in pptrs until the javascript expression is truthy and return its value.
+        polling: raf|mutation|milliseconds
+        '''
+        try:
+            ret_code, ret_msg, data = self.wrap_fire(action='waitForFunction', script=_encode_script(script),
+                                                      polling=polling, timeout=timeout)
+            return data.get('result')
+        except:
+            if not silent:
+                raise
+            else:
+                return None
+
+    def waitForResponse(self, url, timeout=30000, silent=True):
+        '''
+        url: substring or re.Pattern.
+        return: {url, status, headers} of the first matching response.
+        '''
+        try:
+            ret_code, ret_msg, data = self.wrap_fire(action='waitForResponse', url=_url_pattern(url), timeout=timeout)
+            return data
+        except:
+            if not silent:
+                raise
+            else:
+                return None
 
-    def waitForFrame(self, url, timeout=3000, retry=5):
-        for i in range(retry):
-            f = self.findFrame(url)
-            if f:
-                return f
-            time.sleep(timeout / 1000)
+    def waitForNetworkIdle(self, idle_time=500, timeout=30000, silent=True):
+        '''
+        return: True once no request has been in flight for idle_time ms.
+        '''
+        try:
+            self.wrap_fire(action='waitForNetworkIdle', idleTime=idle_time, timeout=timeout)
+            return True
+        except:
+            if not silent:
+                raise
+            else:
+                return False
 
     def querySelector(self, selector, silent=True):
         try:
@@ -406,23 +937,20 @@ class Page():
         self.wrap_fire(action='setUserAgent', userAgent=userAgent)
 
     def evaluateOnNewDocument(self, script):
-        if script:
-            script = _bytes_to_str(base64.b64encode(bytes(script, encoding='utf-8')))
+        script = _encode_script(script)
 
         ret_code, ret_msg, data = self.wrap_fire(action='evaluateOnNewDocument', script=script)
         return data.get('result')
 
     def evaluate(self, script):
-        if script:
-            script = _bytes_to_str(base64.b64encode(bytes(script, encoding='utf-8')))
+        script = _encode_script(script)
 
         ret_code, ret_msg, data = self.wrap_fire(action='evaluate', script=script)
         return data.get('result')
 
     def getHtml(self):
         ret_code, ret_msg, data = self.wrap_fire(action='html')
-        _html = base64.b64decode(data.get('html')).decode()
-        return _html
+        return _decode_payload(data.get('html'))
 
     def getUrl(self):
         ret_code, ret_msg, data = self.wrap_fire(action='url')
@@ -438,6 +966,109 @@ class Page():
         ret_code, ret_msg, data = self.wrap_fire(action='getCookies')
         return data.get('cookies')
 
+    def intercept(self, rules):
+        '''
+        replace the request interception rules of this page, decided inside pptrs
+        without a round trip per request. the first matching rule wins, other
+        requests continue untouched, no rules turns interception off.
+            page.intercept([
+                {'action': 'abort', 'types': ['image', 'media', 'font']},
+                {'action': 'abort', 'url': re.compile(r'google-analytics|doubleclick')},
+                {'action': 'continue', 'url': '/api/', 'headers': {'x-token': 't', 'cookie': None}},
+                {'action': 'fulfill', 'url': '/config.json', 'body': '{}', 'content_type': 'application/json'},
+            ])
+
+        rule: action: abort|continue|fulfill
+              types: resource types, e.g. document|stylesheet|image|media|font|script|xhr|fetch
+              url: substring or re.Pattern
+              error: abort reason, default blockedbyclient
+              headers: continue: merged into the request headers, None removes one.
+                       fulfill: response headers.
+              status, content_type, body (str or bytes): fulfill
+        return: {enabled, stats{aborted, continued, fulfilled}}
+        '''
+        ret_code, ret_msg, data = self.wrap_fire(action='setInterception',
+                                                  rules=[_intercept_rule(r) for r in rules or []])
+        return data
+
+    def blockResources(self, types=('image', 'media', 'font'), url_patterns=None):
+        '''
+        abort requests of the given resource types or matching any url pattern,
+        replaces the rules set by intercept().
+        '''
+        rules = []
+        if types:
+            rules.append({'action': 'abort', 'types': types})
+        for url in url_patterns or []:
+            rules.append({'action': 'abort', 'url': url})
+        return self.intercept(rules)
+
+    def useResponseCache(self, enabled=True, types=('script', 'stylesheet', 'image', 'font')):
+        '''
+        answer GET requests of these resource types from the on-disk response cache of
+        pptrs (LocalPPTRSMgr(cache_dir=...)), shared by every browser of the process.
+        only responses that allow caching (max-age/Expires, no Set-Cookie) are stored.
+        interception rules are evaluated first, stats['cached'] counts cache answers.
+        '''
+        ret_code, ret_msg, data = self.wrap_fire(action='setResponseCache', enabled=enabled, types=list(types or []))
+        return data.get('enabled')
+
+    def interceptionStats(self):
+        ret_code, ret_msg, data = self.wrap_fire(action='interceptionStats')
+        return data
+
+    def subscribe(self, events=None, callback=None, url=None, types=None, levels=None, body=False,
+                  max_body=1024 * 1024, dialog='dismiss', max_batch=100, flush_interval=50, maxsize=10000):
+        '''
+        have pptrs push page events instead of polling for them, needs Browser(multiplex=True):
+            with page.subscribe(['response'], url='/api/', types=['xhr', 'fetch'], body=True) as sub:
+                page.goto(url)
+                for ev in sub.events(timeout=3):
+                    data = json.loads(ev['body'])
+
+        events: response|requestfailed|console|dialog|framenavigated, None for all of them.
+        callback: callback(event) on the connection reader thread, keep it short.
+                  without it events are queued, read them with get()/events().
+        url: substring or re.Pattern, filters response, requestfailed and framenavigated.
+        types: resource types of response and requestfailed, e.g. ['xhr', 'fetch'].
+        levels: console message types, e.g. ['error', 'warning'].
+        body: attach response bodies as bytes, cut to max_body bytes (event['truncated']).
+        dialog: accept|dismiss|None, how pptrs answers dialogs after pushing them, with None
+                the page stays blocked until something else answers.
+        max_batch, flush_interval: pptrs pushes up to max_batch events per frame, at most
+                                   flush_interval ms after the first of them.
+        maxsize: queued events, later events are dropped and counted in dropped.
+        every event has type and time (ms), plus
+            response: url, status, method, resourceType, headers, body, truncated
+            requestfailed: url, method, resourceType, errorText
+            console: level, text, location
+            dialog: dialogType, message, defaultValue
+            framenavigated: url, main, frameKey
+        '''
+        ctx = {
+            'sub': uuid.uuid4().hex,
+            'url': _url_pattern(url) if url else None,
+            'types': list(types) if types else None,
+            'levels': list(levels) if levels else None,
+            'body': body,
+            'maxBody': max_body,
+            'dialog': dialog,
+            'maxBatch': max_batch,
+            'flushInterval': flush_interval
+        }
+        if events:
+            ctx['events'] = [events] if isinstance(events, str) else list(events)
+
+        conn = self.browser._get_connection()
+        sub = Subscription(self, ctx['sub'], conn, callback=callback, maxsize=maxsize)
+        conn.listen(sub.id, sub._push)
+        try:
+            self.wrap_fire(action='subscribe', _conn=conn, **ctx)
+        except Exception:
+            conn.unlisten(sub.id)
+            raise
+        return sub
+
     def goto(self, url, waitUntil='load', timeout=30000, referer=''):
         options = {
             "waitUntil": waitUntil,
@@ -501,7 +1132,7 @@ class Page():
     def press(self, key):
         self.wrap_fire(action='press', key=key)
 
-    def pdf(self, path,
+    def pdf(self, path=None,
             scale=1,
             displayHeaderFooter=False,
             headerTemplate=None,
@@ -515,8 +1146,13 @@ class Page():
             margin=None,
             preferCSSPageSize=False,
             omitBackground=False,
-            timeout=30000
+            timeout=30000,
+            fp=None
             ):
+        '''
+        path: write the pdf on the pptrs host and return None.
+        no path: return the pdf bytes, or write them to fp in chunks and return the size.
+        '''
         options = {
             "path": path,
             "scale": scale,
@@ -536,7 +1172,16 @@ class Page():
         }
 
         options = {k: v for k, v in options.items() if v is not None}
-        self.wrap_fire(action='pdf', options=options)
+        ret_code, ret_msg, data = self.wrap_fire(action='pdf', options=options)
+        return _artifact(data.get('pdf'), fp)
+
+    def reset(self, url='about:blank', clear_all_cookies=False):
+        '''
+        make a used tab look new, much cheaper than close + newPage:
+        clear cookies and storage, navigate to url, drop cached elem/frame handles.
+        clear_all_cookies: clear cookies of the whole browser, not only this page's.
+        '''
+        self.wrap_fire(action='resetPage', url=url, clearAllCookies=clear_all_cookies)
 
     def close(self):
         '''
@@ -572,10 +1217,8 @@ class Page():
             if delay > 0:
                 time.sleep(delay)
 
-    def scrollToView(self, selector):
-        elem = self.querySelector(selector)
-        while not elem.isIntersectingViewport():
-            self.scroll()
+    def scrollToView(self, selector, timeout=30000):
+        self.wrap_fire(action='scrollToView', selector=selector, timeout=timeout)
 
     def eval(self, selector, attr='innerText', silent=True):
         try:
@@ -597,18 +1240,296 @@ class Page():
             else:
                 raise
 
-    def screenShot(self, path, omitBackground=False):
-        self.wrap_fire(action='screenShot', path=path, omitBackground=omitBackground)
+    def extract(self, schema):
+        '''
+        evaluate a whole schema inside the page in one round trip:
+            page.extract({
+                'title': 'h1',
+                'items': [{'selector': 'li.item', 'fields': {
+                    'name': 'h2',
+                    'link': 'a@href',
+                    'price': {'selector': '.price', 'transform': 'number'},
+                }}],
+            })
+
+        schema: {name: spec}, a spec is
+            'css'        innerText of the first match, None if nothing matches.
+            'css@attr'   attribute of the first match.
+            [spec]       the same spec for every match, a list.
+            {'selector': css, 'attr': name, 'property': name (default innerText),
+             'fields': nested schema scoped to the match, 'list': bool,
+             'transform': trim|lower|upper|int|float|number or a callable run on the client,
+             'default': value when nothing matches}
+        a spec without selector reads from the scope element itself.
+        '''
+        norm = _extract_spec({'fields': schema})
+        ret_code, ret_msg, data = self.wrap_fire(action='extract', schema=_extract_wire(norm))
+        return _extract_post(norm, data.get('result'))
+
+    def screenShot(self, path=None, omitBackground=False, fullPage=False, type=None, quality=None, fp=None):
+        '''
+        path: write the image on the pptrs host and return None.
+        no path: return the image bytes, or write them to fp in chunks and return the size.
+        type: png|jpeg|webp
+        '''
+        ret_code, ret_msg, data = self.wrap_fire(action='screenShot', path=path, omitBackground=omitBackground,
+                                                  fullPage=fullPage, type=type, quality=quality)
+        return _artifact(data.get('image'), fp)
+
+    def batch(self, stop_on_error=True):
+        '''
+        queue actions and run them in one round trip:
+            url, html = page.batch().goto(url).type('#user', 'zr').click('#login').getUrl().getHtml().run()[-2:]
+        '''
+        return Batch(page=self, stop_on_error=stop_on_error)
+
+
+class Batch():
+    '''
+    run() returns one result per queued action, same value the Page method would return.
+    stop_on_error=True: stop at the first failed action and raise.
+    stop_on_error=False: run everything, failed actions leave their Exception in the results.
+    '''
+
+    def __init__(self, page, stop_on_error=True):
+        self.page = page
+        self.stop_on_error = stop_on_error
+        self._steps = []
+        self._parsers = []
+
+    def __len__(self):
+        return len(self._steps)
+
+    def _add(self, action, parser=None, **kwargs):
+        self._steps.append({'action': action, 'ctx': kwargs})
+        self._parsers.append(parser)
+        return self
+
+    def _collect(self, data):
+        results = []
+        for i, r in enumerate(data.get('results')):
+            if r.get('retCode') < 0:
+                e = Exception('ERROR: batch step %d <%s> failed, retMsg=%s' % (
+                    i, self._steps[i]['action'], r.get('retMsg')))
+                if self.stop_on_error:
+                    raise e
+                results.append(e)
+                continue
+
+            parser = self._parsers[i]
+            results.append(parser(r.get('data') or {}) if parser else None)
+
+        return results
+
+    def run(self):
+        if not self._steps:
+            return []
+
+        ret_code, ret_msg, data = self.page.wrap_fire(action='batch', steps=self._steps,
+                                                      stopOnError=self.stop_on_error)
+        return self._collect(data)
+
+    def goto(self, url, waitUntil='load', timeout=30000, referer=''):
+        options = {
+            "waitUntil": waitUntil,
+            'timeout': timeout,
+            'referer': referer
+        }
+        return self._add('goto', lambda d: d.get('status'), url=url, options=options)
+
+    def goBack(self, waitUntil='load', timeout=30000, referer=''):
+        return self._add('goBack', options={'waitUntil': waitUntil, 'timeout': timeout, 'referer': referer})
+
+    def goForward(self, waitUntil='load', timeout=30000, referer=''):
+        return self._add('goForward', options={'waitUntil': waitUntil, 'timeout': timeout, 'referer': referer})
+
+    def waitForNavigation(self, waitUntil='load', timeout=30000):
+        return self._add('waitForNavigation', options={'waitUntil': waitUntil, 'timeout': timeout})
+
+    def waitForSelector(self, selector, hidden=False, timeout=30000, visible=False):
+        options = {
+            "hidden": hidden,
+            'timeout': timeout,
+            'visible': visible
+        }
+        browser = self.page.browser
+        return self._add('waitForSelector', lambda d: Elem(key=d.get('key'), browser=browser), selector=selector,
+                         options=options)
+
+    def setUserAgent(self, userAgent):
+        return self._add('setUserAgent', userAgent=userAgent)
+
+    def bringToFront(self):
+        return self._add('bringToFront')
+
+    def click(self, selector, button='left', clickCount=1, delay=0, offset=None):
+        options = {
+            'button': button,
+            'clickCount': clickCount,
+            'delay': delay
+        }
+        if offset and (offset['x'] != 0 or offset['y'] != 0):
+            options['offset'] = offset
+        return self._add('click', selector=selector, options=options)
+
+    def tap(self, selector):
+        return self._add('tap', selector=selector)
+
+    def type(self, selector, text, delay=0):
+        return self._add('type', selector=selector, text=text, options={'delay': delay})
+
+    def sendCharacter(self, text):
+        return self._add('sendCharacter', text=text)
+
+    def press(self, key):
+        return self._add('press', key=key)
+
+    def scroll(self, x=None, y=None):
+        return self._add('scroll', lambda d: d.get('scrollOffset'), x=x, y=y)
+
+    def evaluate(self, script):
+        script = _encode_script(script)
+        return self._add('evaluate', lambda d: d.get('result'), script=script)
+
+    def eval(self, selector, attr='innerText'):
+        return self._add('$eval', lambda d: d.get('result'), selector=selector, attr=attr)
+
+    def evalAll(self, selector, attr='innerText'):
+        return self._add('$$eval', lambda d: d.get('result'), selector=selector, attr=attr)
+
+    def extract(self, schema):
+        norm = _extract_spec({'fields': schema})
+        return self._add('extract', lambda d: _extract_post(norm, d.get('result')), schema=_extract_wire(norm))
+
+    def getHtml(self):
+        return self._add('html', lambda d: _decode_payload(d.get('html')))
+
+    def getUrl(self):
+        return self._add('url', lambda d: d.get('url'))
+
+    def setCookies(self, cookies):
+        if type(cookies) is dict:
+            cookies = [cookies]
+        return self._add('setCookies', cookies=cookies)
+
+    def getCookies(self):
+        return self._add('getCookies', lambda d: d.get('cookies'))
+
+
+class Subscription():
+    '''
+    page events pushed by pptrs, see Page.subscribe.
+    '''
+    _CLOSED = object()
+
+    def __init__(self, page, sub_id, conn, callback=None, maxsize=10000):
+        self.page = page
+        self.id = sub_id
+        self.callback = callback
+        self.dropped = 0
+        self.closed = False
+        self._conn = conn
+        self._queue = queue.Queue(maxsize)
+
+    def __repr__(self):
+        return '<class.Subscription id=%s>' % self.id
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+    def __iter__(self):
+        return self.events()
+
+    def _put(self, item):
+        try:
+            self._queue.put_nowait(item)
+        except queue.Full:
+            if item is self._CLOSED:
+                self._queue.get_nowait()
+                self._queue.put_nowait(item)
+            self.dropped += 1
+
+    def _push(self, events):
+        if events is None:
+            # connection lost
+            self.closed = True
+            self._put(self._CLOSED)
+            return
+
+        for ev in events:
+            if ev.get('body') is not None:
+                ev['body'] = _artifact(ev['body'])
+            if self.callback:
+                self.callback(ev)
+            else:
+                self._put(ev)
+
+    def get(self, timeout=None):
+        '''
+        next queued event, None once closed, raises queue.Empty after timeout seconds.
+        '''
+        item = self._queue.get(timeout=timeout)
+        if item is self._CLOSED:
+            self._put(item)
+            return None
+        return item
+
+    def events(self, timeout=None):
+        '''
+        iterate queued events until closed, or until none arrives within timeout seconds.
+        '''
+        while True:
+            try:
+                ev = self.get(timeout=timeout)
+            except queue.Empty:
+                return
+            if ev is None:
+                return
+            yield ev
+
+    def close(self):
+        '''
+        unsubscribe, events already pushed stay readable.
+        '''
+        if self.closed:
+            return
+        self.closed = True
+        try:
+            self.page.wrap_fire(action='unsubscribe', sub=self.id, _conn=self._conn)
+        finally:
+            self._conn.unlisten(self.id)
+            self._put(self._CLOSED)
 
 
 class Elem():
+    '''
+    an element handle cached by pptrs. release it with dispose() or a with block,
+    otherwise it is released in a batch with the next request once this object
+    is garbage collected.
+    '''
+
     def __init__(self, key, browser):
         self.browser = browser
         self.key = key
+        self._finalizer = weakref.finalize(self, browser._release_handle, key)
+        self._finalizer.atexit = False
 
     def __repr__(self):
         return '<class.Elem, key=%s>' % self.key
 
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.dispose()
+
+    def dispose(self):
+        if self._finalizer.detach():
+            self.browser.wrap_fire(id=self.browser.browser_id, action='disposeHandles', keys=[self.key])
+
     def wrap_fire(self, action, **kwargs):
         return self.browser.wrap_fire(id=self.browser.browser_id, action=action, key=self.key, **kwargs)
 
@@ -650,10 +1571,15 @@ class Elem():
 
     def getProperty(self, attr='value'):
         ret_code, ret_msg, data = self.wrap_fire(action='e_getProperty', attr=attr)
-        value = data.get('value')
-        if value:
-            value = base64.b64decode(data.get('value')).decode()
-        return value
+        return _decode_payload(data.get('value'))
+
+    def screenShot(self, path=None, omitBackground=False, type=None, quality=None, fp=None):
+        '''
+        same as Page.screenShot, clipped to this element.
+        '''
+        ret_code, ret_msg, data = self.wrap_fire(action='e_screenShot', path=path, omitBackground=omitBackground,
+                                                  type=type, quality=quality)
+        return _artifact(data.get('image'), fp)
 
     def isIntersectingViewport(self):
         ret_code, ret_msg, data = self.wrap_fire(action='e_isIntersectingViewport')
@@ -665,9 +1591,14 @@ class Elem():
 
 
 class Frame():
-    def __init__(self, key, browser):
+    '''
+    info: {key, url, name, parent, detached} as of the frames() call that created this object.
+    '''
+
+    def __init__(self, key, browser, info=None):
         self.browser = browser
         self.key = key
+        self.info = info or {'key': key}
 
     def __repr__(self):
         return '<class.Frame key=%s>' % self.key
@@ -678,8 +1609,12 @@ class Frame():
     def url(self):
         ret_code, ret_msg, data = self.wrap_fire(action='f_url')
         url = data.get('url')
+        self.info['url'] = url
         return url
 
+    def name(self):
+        return self.info.get('name')
+
     def querySelector(self, selector, silent=True):
 
         try:
@@ -746,8 +1681,7 @@ class Frame():
         self.wrap_fire(action='f_click', selector=selector, options=options)
 
     def evaluate(self, script):
-        if script:
-            script = _bytes_to_str(base64.b64encode(bytes(script, encoding='utf-8')))
+        script = _encode_script(script)
 
         ret_code, ret_msg, data = self.wrap_fire(action='f_evaluate', script=script)
         return data.get('result')
@@ -755,3 +1689,22 @@ class Frame():
     def eval(self, selector, attr='innerText'):
         ret_code, ret_msg, data = self.wrap_fire(action='f_$eval', selector=selector, attr=attr)
         return data.get('result')
+
+    def waitForFunction(self, script, polling='raf', timeout=30000, silent=True):
+        try:
+            ret_code, ret_msg, data = self.wrap_fire(action='f_waitForFunction', script=_encode_script(script),
+                                                      polling=polling, timeout=timeout)
+            return data.get('result')
+        except:
+            if not silent:
+                raise
+            else:
+                return None
+
+    def extract(self, schema):
+        '''
+        same as Page.extract, scoped to this frame.
+        '''
+        norm = _extract_spec({'fields': schema})
+        ret_code, ret_msg, data = self.wrap_fire(action='f_extract', schema=_extract_wire(norm))
+        return _extract_post(norm, data.get('result'))
@@ -0,0 +1,130 @@
+# -*- coding: utf-8 -*-
+# @Time    : 2026/10/18 下午4:02
+# @Author  : Zr
+# @Comment : route browsers across several stub.js workers
+
+import threading
+from .connection import Connection
+
+__all__ = [
+    'WorkerRouter'
+]
+
+
+class WorkerRouter():
+    '''
+    a browser lives in the stub.js worker that launched it, so every Browser for
+    a wsEndpoint must talk to that worker, new launches go to the least loaded one:
+        mgr = LocalPPTRSMgr(workers=8)
+        router = WorkerRouter(mgr.workers())
+        b = Browser(router=router).launch()
+        b2 = Browser(b.wsEndpoint(), router=router)
+    '''
+
+    def __init__(self, workers, timeout=5):
+        '''
+        timeout: seconds a worker has to answer `load`, a hung one is left out meanwhile.
+        '''
+        if not workers:
+            raise Exception('no worker to route to')
+
+        self._workers = [tuple(w) for w in workers]
+        self._lock = threading.Lock()
+        self._owner = {}
+        self._pending = {w: 0 for w in self._workers}
+        self._reserved = set()
+        self._conns = {}
+        self._conns_lock = threading.Lock()
+        self.timeout = timeout
+
+    def workers(self):
+        return list(self._workers)
+
+    def _load(self, worker):
+        with self._conns_lock:
+            conn = self._conns.get(worker)
+            if conn is None or not conn.alive():
+                conn = self._conns[worker] = Connection(worker[0], worker[1])
+
+        r = conn.request({"id": None, "action": "load", "ctx": {}}, timeout=self.timeout)
+        if not r or r.get('retCode', -1) < 0:
+            raise Exception('ERROR: load on %s:%d failed' % worker)
+        return r.get('data')
+
+    def loads(self):
+        '''
+        {worker: data of the `load` action}, unreachable workers are left out.
+        '''
+        result = {}
+        for worker in self._workers:
+            try:
+                result[worker] = self._load(worker)
+            except Exception:
+                with self._conns_lock:
+                    self._conns.pop(worker, None)
+        return result
+
+    def _learn(self, loads):
+        # caller holds self._lock
+        for worker, data in loads.items():
+            for ws in data.get('browsers'):
+                self._owner[ws] = worker
+
+    def least_loaded(self):
+        '''
+        reserve the worker for a new launch, returns the reservation, its .worker is
+        the (host, port) to launch on. pass it to register() once launched, or to
+        cancel() when the launch failed.
+        '''
+        # `load` round trips happen outside the lock, a slow worker does not block locate().
+        loads = self.loads()
+        if not loads:
+            raise Exception('no worker reachable in %s' % self._workers)
+
+        with self._lock:
+            self._learn(loads)
+            worker = min(loads, key=lambda w: (len(loads[w].get('browsers')) + self._pending[w],
+                                               loads[w].get('pages')))
+            reservation = _Reservation(worker)
+            self._reserved.add(reservation)
+            self._pending[worker] += 1
+            return reservation
+
+    def register(self, ws_endpoint, worker, reservation=None):
+        with self._lock:
+            self._owner[ws_endpoint] = worker
+            self._release(reservation)
+
+    def cancel(self, reservation):
+        '''
+        give back a reservation of least_loaded(), a released one is ignored.
+        '''
+        with self._lock:
+            self._release(reservation)
+
+    def _release(self, reservation):
+        # caller holds self._lock
+        if reservation in self._reserved:
+            self._reserved.discard(reservation)
+            self._pending[reservation.worker] -= 1
+
+    def locate(self, ws_endpoint):
+        with self._lock:
+            worker = self._owner.get(ws_endpoint)
+        if worker:
+            return worker
+
+        loads = self.loads()
+        with self._lock:
+            self._learn(loads)
+            worker = self._owner.get(ws_endpoint)
+        if not worker:
+            raise Exception('browser %s not found in any worker' % ws_endpoint)
+        return worker
+
+
+class _Reservation():
+    __slots__ = ('worker',)
+
+    def __init__(self, worker):
+        self.worker = worker
@@ -0,0 +1,314 @@
+# -*- coding: utf-8 -*-
+# @Time    : 2026/10/18 上午11:05
+# @Author  : Zr
+# @Comment : socket connection to stub.js, optionally multiplexed
+
+import itertools
+import os
+import select
+import socket
+import threading
+import time
+import traceback
+from .protocol import HEAD_LEN, pack, unpack, body_size, hello, load_file, is_local
+
+# seconds to wait for the answer to a cancelled ordered request.
+_CANCEL_GRACE = 1.0
+
+
+class _Waiter():
+    def __init__(self):
+        self._event = threading.Event()
+        self._result = None
+        self._error = None
+        self.size = 0
+
+    def set_result(self, result, size=0):
+        self._result = result
+        self.size = size
+        self._event.set()
+
+    def set_error(self, error):
+        self._error = error
+        self._event.set()
+
+    def wait(self, timeout=None):
+        if not self._event.wait(timeout):
+            raise TimeoutError('pptrs did not answer in %.3fs' % timeout)
+        if self._error is not None:
+            raise self._error
+        return self._result
+
+
+class Connection():
+    '''
+    multiplex=False: one frame in flight, send-then-recv under a lock.
+    multiplex=True: every frame carries a `seq`, many requests may be outstanding
+                    and stub.js answers them out of order; a reader thread routes
+                    responses back to the waiting callers.
+    binary=True: ask stub.js for binary framing, payloads (html, property values,
+                 scripts) travel as raw bytes instead of base64. falls back to ascii
+                 framing if the server does not agree.
+    shm_threshold: bytes, when stub.js runs on this machine, larger responses come
+                   through a shared memory file instead of the socket.
+    frames pushed by stub.js for a subscription carry `sub` instead of `seq`, the
+    reader thread hands them to the listener registered for it, multiplex only.
+    request(message, sizes={}) fills sizes['sent'] and sizes['recv'] with the bytes of
+    both frames, a shared memory file counts as received.
+    request(message, timeout=seconds) raises TimeoutError once the time is up and sends
+    stub.js a `cancel` frame, which aborts the action still running there.
+    timeout: seconds for connecting and the hello exchange, TimeoutError past them.
+    '''
+
+    def __init__(self, host, port, multiplex=False, binary=False, shm_threshold=None, logger=None, timeout=None):
+        self._host = host
+        self._port = port
+        self._multiplex = multiplex
+        self._binary = False
+        self._logger = logger
+        self._lock = threading.Lock()
+        self._seq = itertools.count(1)
+        self._waiters = {}
+        self._listeners = {}
+        self._closed = False
+        self._count_lock = threading.Lock()
+        self.inflight = 0
+        self.last_used = time.time()
+
+        try:
+            self._sock = socket.create_connection((self._host, self._port), timeout)
+        except socket.timeout:
+            # not a TimeoutError before python 3.10.
+            raise TimeoutError('pptrs on %s:%s did not accept in %.3fs' % (host, port, timeout)) from None
+
+        if not is_local(self._host):
+            shm_threshold = None
+
+        try:
+            if binary or shm_threshold:
+                self._negotiate(binary, shm_threshold)
+        except socket.timeout:
+            self._sock.close()
+            raise TimeoutError('pptrs on %s:%s did not answer hello in %.3fs' % (host, port, timeout)) from None
+        except Exception:
+            self._sock.close()
+            raise
+        self._sock.settimeout(None)
+
+        if self._multiplex:
+            self._reader = threading.Thread(target=self._read_loop, name='pptrc-reader-%s' % self._port)
+            self._reader.daemon = True
+            self._reader.start()
+
+    @property
+    def multiplex(self):
+        return self._multiplex
+
+    @property
+    def binary(self):
+        return self._binary
+
+    def _negotiate(self, binary, shm_threshold):
+        self._sock.sendall(pack(hello(binary=binary, shm_threshold=shm_threshold)))
+        r, _ = self._recv_frame()
+        if not r or r.get('retCode', -1) < 0:
+            if self._logger:
+                self._logger.warning('pptrs does not support hello, use ascii framing.')
+            return
+
+        self._binary = (r.get('data') or {}).get('framing') == 'binary'
+
+    def alive(self):
+        '''
+        cheap health check, no round trip.
+        '''
+        if self._closed:
+            return False
+        if self._multiplex:
+            return self._reader.is_alive()
+        if self.inflight > 0:
+            return True
+
+        # an idle ascii/binary connection must have nothing to read,
+        # readable means eof or a stray frame, either way it is unusable.
+        try:
+            r, _, _ = select.select([self._sock], [], [], 0)
+        except (OSError, ValueError):
+            return False
+        return not r
+
+    def close(self):
+        self._closed = True
+        try:
+            self._sock.shutdown(socket.SHUT_RDWR)
+        except OSError:
+            pass
+        self._sock.close()
+
+    def listen(self, sub, handler):
+        '''
+        handler(events) runs on the reader thread for every pushed batch,
+        handler(None) once the connection is lost.
+        '''
+        if not self._multiplex:
+            raise Exception('ERROR: pushed events need a multiplexed connection, use multiplex=True')
+        self._listeners[sub] = handler
+
+    def unlisten(self, sub):
+        self._listeners.pop(sub, None)
+
+    @property
+    def listening(self):
+        return bool(self._listeners)
+
+    def _recv_exact(self, size):
+        '''
+        one buffer of the announced size, filled in place through a memoryview.
+        '''
+        buf = bytearray(size)
+        view = memoryview(buf)
+        recv_size = 0
+        while recv_size < size:
+            n = self._sock.recv_into(view[recv_size:])
+            if n == 0:
+                raise ConnectionError('pptrs closed the connection')
+            recv_size = recv_size + n
+
+        return buf
+
+    def _recv_frame(self):
+        '''
+        (jd, bytes received)
+        '''
+        head = self._recv_exact(HEAD_LEN)
+        size = body_size(head, self._binary)
+        jd = unpack(head, self._recv_exact(size), self._binary)
+        size += HEAD_LEN
+        if jd and jd.get('file'):
+            size += os.path.getsize(jd['file'])
+            jd = load_file(jd['file'], self._binary)
+        return jd, size
+
+    def request(self, message, sizes=None, timeout=None):
+        with self._count_lock:
+            self.inflight += 1
+        try:
+            return self._request(message, sizes, timeout)
+        finally:
+            with self._count_lock:
+                self.inflight -= 1
+                self.last_used = time.time()
+
+    def _request(self, message, sizes=None, timeout=None):
+        if not self._multiplex:
+            deadline = time.monotonic() + timeout if timeout is not None else None
+            if not self._lock.acquire(timeout=-1 if timeout is None else timeout):
+                raise TimeoutError('pptrs connection busy for %.3fs' % timeout)
+            try:
+                if self._closed:
+                    raise ConnectionError('pptrs connection is closed')
+                try:
+                    frame = pack(message, self._binary)
+                    self._sock.sendall(frame)
+                    answered = deadline is None or self._readable(deadline - time.monotonic())
+                    if answered:
+                        jd, size = self._recv_frame()
+                    else:
+                        self._cancel(None)
+                except Exception:
+                    # a half written or half read frame leaves the stream out of sync.
+                    self.close()
+                    raise
+                if not answered:
+                    raise TimeoutError('pptrs did not answer in %.3fs' % timeout)
+                if sizes is not None:
+                    sizes['sent'], sizes['recv'] = len(frame), size
+                return jd
+            finally:
+                self._lock.release()
+
+        seq = next(self._seq)
+        message['seq'] = seq
+        waiter = _Waiter()
+        self._waiters[seq] = waiter
+        try:
+            if self._closed:
+                raise ConnectionError('pptrs connection is closed')
+            frame = pack(message, self._binary)
+            with self._lock:
+                self._sock.sendall(frame)
+            try:
+                jd = waiter.wait(timeout)
+            except TimeoutError:
+                self._cancel(seq)
+                raise
+            if sizes is not None:
+                sizes['sent'], sizes['recv'] = len(frame), waiter.size
+            return jd
+        finally:
+            self._waiters.pop(seq, None)
+
+    def _readable(self, timeout):
+        r, _, _ = select.select([self._sock], [], [], max(timeout, 0))
+        return bool(r)
+
+    def _cancel(self, seq):
+        '''
+        tell stub.js to abort request seq, None for the ordered one in flight.
+        ordered requests are still answered, the late response is read and dropped
+        so the connection stays usable, raises when it does not come in _CANCEL_GRACE
+        seconds and the caller closes the connection, which cancels it as well.
+        '''
+        cancel = pack({"id": None, "action": "cancel", "ctx": {"seq": seq}}, self._binary)
+        if self._multiplex:
+            try:
+                with self._lock:
+                    self._sock.sendall(cancel)
+            except OSError:
+                pass
+            return
+
+        self._sock.settimeout(_CANCEL_GRACE)
+        try:
+            self._sock.sendall(cancel)
+            self._recv_frame()
+        except socket.timeout:
+            # not a TimeoutError before python 3.10.
+            raise TimeoutError('pptrs did not answer the cancelled request in %.3fs' % _CANCEL_GRACE) from None
+        self._sock.settimeout(None)
+
+    def _read_loop(self):
+        error = None
+        try:
+            while not self._closed:
+                jd, size = self._recv_frame()
+                if jd and jd.get('sub') is not None:
+                    self._dispatch(jd)
+                    continue
+
+                waiter = self._waiters.get(jd.get('seq')) if jd else None
+                if waiter:
+                    waiter.set_result(jd, size)
+                elif self._logger:
+                    self._logger.warning('drop frame without waiter: seq=%s', jd and jd.get('seq'))
+        except Exception as e:
+            error = e
+            if not self._closed and self._logger:
+                self._logger.warning('pptrc reader stopped:\n' + traceback.format_exc())
+        finally:
+            self._closed = True
+            for waiter in list(self._waiters.values()):
+                waiter.set_error(ConnectionError('pptrs connection lost: %s' % error))
+            for handler in list(self._listeners.values()):
+                handler(None)
+            self._listeners.clear()
+
+    def _dispatch(self, jd):
+        handler = self._listeners.get(jd['sub'])
+        if handler is None:
+            return
+        try:
+            handler(jd.get('events') or [])
+        except Exception:
+            if self._logger:
+                self._logger.warning('event listener failed:\n' + traceback.format_exc())
@@ -0,0 +1,73 @@
+/**
+ *  Author: Zr
+ *  Email: zrtj1111@hotmail.com
+ *  Create: 2026-10-18
+ */
+
+class HandleCache {
+  /**
+   * bounded key => handle table, least recently used entries are evicted
+   * once maxSize is reached. onEvict(key, value) runs for every entry that
+   * leaves the table, whether evicted, replaced or deleted.
+   */
+  constructor(maxSize, onEvict = null) {
+    this.maxSize = maxSize;
+    this.onEvict = onEvict;
+    this.map = new Map();
+    this.evictions = 0;
+  }
+
+  get size() {
+    return this.map.size;
+  }
+
+  get(key) {
+    let value = this.map.get(key);
+    if (value !== undefined) {
+      // Map keeps insertion order, re-inserting marks the entry as recent.
+      this.map.delete(key);
+      this.map.set(key, value);
+    }
+    return value;
+  }
+
+  set(key, value) {
+    if (this.map.has(key)) this.delete(key);
+    this.map.set(key, value);
+
+    while (this.maxSize > 0 && this.map.size > this.maxSize) {
+      this.delete(this.map.keys().next().value);
+      this.evictions++;
+    }
+  }
+
+  delete(key) {
+    let value = this.map.get(key);
+    if (value === undefined) return false;
+    this.map.delete(key);
+    if (this.onEvict) this.onEvict(key, value);
+    return true;
+  }
+
+  deletePrefix(prefix) {
+    let n = 0;
+    for (let key of Array.from(this.map.keys())) {
+      if (key.startsWith(prefix) && this.delete(key)) n++;
+    }
+    return n;
+  }
+
+  keysOf(value) {
+    let keys = new Array();
+    for (let [key, v] of this.map) {
+      if (v === value) keys.push(key);
+    }
+    return keys;
+  }
+
+  clear() {
+    for (let key of Array.from(this.map.keys())) this.delete(key);
+  }
+}
+
+module.exports.HandleCache = HandleCache;
@@ -0,0 +1,172 @@
+/**
+ *  Author: Zr
+ *  Email: zrtj1111@hotmail.com
+ *  Create: 2026-10-18
+ */
+
+const util = require(__dirname + "/util");
+
+const EVENTS = [
+  "response",
+  "requestfailed",
+  "console",
+  "dialog",
+  "framenavigated",
+];
+
+class Subscription {
+  /**
+   * page events filtered on the server and pushed to the client in
+   * batches of up to maxBatch events, at most flushInterval ms apart.
+   *
+   * ctx => sub, events, url{pattern, regex, flags}, types, levels,
+   *        body, maxBody, dialog: accept|dismiss|null,
+   *        maxBatch, flushInterval
+   * push(events) writes one frame to the subscribing connection,
+   * frameKey(frame) names frames the way frames() does.
+   */
+  constructor(page, ctx, push, frameKey, logger) {
+    this.id = ctx.sub;
+    this.page = page;
+    this.push = push;
+    this.frameKey = frameKey;
+    this.logger = logger;
+    this.url = ctx.url ? util.urlMatcher(ctx.url) : null;
+    this.types = ctx.types && ctx.types.length > 0 ? new Set(ctx.types) : null;
+    this.levels =
+      ctx.levels && ctx.levels.length > 0 ? new Set(ctx.levels) : null;
+    this.body = !!ctx.body;
+    this.maxBody = ctx.maxBody || 1024 * 1024;
+    this.dialog = ctx.dialog === undefined ? "dismiss" : ctx.dialog;
+    this.maxBatch = ctx.maxBatch || 100;
+    this.flushInterval = ctx.flushInterval || 50;
+    this.buffer = new Array();
+    this.timer = null;
+    this.closed = false;
+    this.listeners = {};
+
+    for (let name of ctx.events || EVENTS) {
+      if (EVENTS.indexOf(name) < 0) {
+        throw new Error(`unknown event: ${name}, use one of ${EVENTS}`);
+      }
+      this.listeners[name] = (arg) => {
+        this[`_${name}`](arg).catch((e) => this.logger.warn(e.message));
+      };
+      page.on(name, this.listeners[name]);
+    }
+  }
+
+  _emit(event) {
+    if (this.closed) return;
+    event.time = Date.now();
+    this.buffer.push(event);
+
+    if (this.buffer.length >= this.maxBatch) {
+      this.flush();
+    } else if (!this.timer) {
+      this.timer = setTimeout(() => this.flush(), this.flushInterval);
+    }
+  }
+
+  flush() {
+    clearTimeout(this.timer);
+    this.timer = null;
+    if (this.buffer.length == 0) return;
+
+    let events = this.buffer;
+    this.buffer = new Array();
+    this.push(events).catch((e) => this.logger.warn(e.message));
+  }
+
+  _matchRequest(req) {
+    if (this.types && !this.types.has(req.resourceType())) return false;
+    if (this.url && !this.url(req.url())) return false;
+    return true;
+  }
+
+  async _response(resp) {
+    let req = resp.request();
+    if (!this._matchRequest(req)) return;
+
+    let event = {
+      type: "response",
+      url: resp.url(),
+      status: resp.status(),
+      method: req.method(),
+      resourceType: req.resourceType(),
+      headers: resp.headers(),
+    };
+
+    if (this.body) {
+      try {
+        let body = await resp.buffer();
+        event.truncated = body.length > this.maxBody;
+        event.body = event.truncated ? body.subarray(0, this.maxBody) : body;
+      } catch (e) {
+        // redirects and evicted bodies have nothing to read.
+        event.body = null;
+      }
+    }
+    this._emit(event);
+  }
+
+  async _requestfailed(req) {
+    if (!this._matchRequest(req)) return;
+
+    let failure = req.failure();
+    this._emit({
+      type: "requestfailed",
+      url: req.url(),
+      method: req.method(),
+      resourceType: req.resourceType(),
+      errorText: failure ? failure.errorText : null,
+    });
+  }
+
+  async _console(msg) {
+    if (this.levels && !this.levels.has(msg.type())) return;
+
+    this._emit({
+      type: "console",
+      level: msg.type(),
+      text: msg.text(),
+      location: msg.location ? msg.location() : null,
+    });
+  }
+
+  async _dialog(dialog) {
+    this._emit({
+      type: "dialog",
+      dialogType: dialog.type(),
+      message: dialog.message(),
+      defaultValue: dialog.defaultValue(),
+    });
+
+    // an unanswered dialog blocks the page.
+    if (this.dialog == "accept") await dialog.accept();
+    else if (this.dialog == "dismiss") await dialog.dismiss();
+  }
+
+  async _framenavigated(frame) {
+    if (this.url && !this.url(frame.url())) return;
+
+    this._emit({
+      type: "framenavigated",
+      url: frame.url(),
+      main: frame === this.page.mainFrame(),
+      frameKey: this.frameKey(frame),
+    });
+  }
+
+  close() {
+    if (this.closed) return;
+    for (let name of Object.keys(this.listeners)) {
+      this.page.off(name, this.listeners[name]);
+    }
+    this.flush();
+    this.closed = true;
+  }
+}
+
+module.exports.Subscription = Subscription;
+module.exports.EVENTS = EVENTS;
@@ -0,0 +1,52 @@
+/**
+ *  Author: Zr
+ *  Email: zrtj1111@hotmail.com
+ *  Create: 2026-10-18
+ */
+
+// runs inside the page through page.evaluate, so it must not reference
+// anything outside its own body.
+// spec => {selector, all, attr | property | fields, transform, default}
+const extractSchema = (spec) => {
+  const transforms = {
+    trim: (v) => String(v).trim(),
+    lower: (v) => String(v).toLowerCase(),
+    upper: (v) => String(v).toUpperCase(),
+    int: (v) => parseInt(v, 10),
+    float: (v) => parseFloat(v),
+    number: (v) => parseFloat(String(v).replace(/[^0-9.eE+-]/g, "")),
+  };
+
+  const value = (el, s) => {
+    if (s.fields) {
+      let out = {};
+      for (let k of Object.keys(s.fields)) out[k] = field(el, s.fields[k]);
+      return out;
+    }
+
+    let v = s.attr ? el.getAttribute(s.attr) : el[s.property];
+    if (v === undefined) v = null;
+    if (v !== null && s.transform && transforms[s.transform]) {
+      v = transforms[s.transform](v);
+      if (typeof v == "number" && isNaN(v)) v = null;
+    }
+    return v;
+  };
+
+  const field = (scope, s) => {
+    if (!s.selector) return s.all ? [value(scope, s)] : value(scope, s);
+    if (s.all) {
+      return Array.from(scope.querySelectorAll(s.selector)).map((el) =>
+        value(el, s)
+      );
+    }
+
+    let el = scope.querySelector(s.selector);
+    if (!el) return s.default === undefined ? null : s.default;
+    return value(el, s);
+  };
+
+  return field(document, spec);
+};
+
+module.exports.extractSchema = extractSchema;
@@ -0,0 +1,175 @@
+/**
+ *  Author: Zr
+ *  Email: zrtj1111@hotmail.com
+ *  Create: 2026-10-18
+ */
+
+const util = require(__dirname + "/util");
+
+const _compile = (rule) => {
+  /**
+   * rule => action: abort|continue|fulfill,
+   *         types: resource types, url: {pattern, regex, flags},
+   *         error (abort), headers (continue, fulfill),
+   *         status, contentType, body (fulfill)
+   */
+  if (["abort", "continue", "fulfill"].indexOf(rule.action) < 0) {
+    throw new Error(`unknown interception action: ${rule.action}`);
+  }
+  return {
+    action: rule.action,
+    types: rule.types && rule.types.length > 0 ? new Set(rule.types) : null,
+    url: rule.url ? util.urlMatcher(rule.url) : null,
+    error: rule.error || "blockedbyclient",
+    headers: rule.headers || null,
+    status: rule.status || 200,
+    contentType: rule.contentType || null,
+    body: util.toBytes(rule.body) || Buffer.alloc(0),
+  };
+};
+
+class Interceptor {
+  /**
+   * request interception of one page, every request is decided here
+   * without a round trip to the client. the first matching rule wins,
+   * requests matching no rule continue untouched, or are answered from
+   * the response cache when one is set.
+   */
+  constructor(page, logger) {
+    this.page = page;
+    this.logger = logger;
+    this.rules = new Array();
+    this.cache = null;
+    this.cacheTypes = new Set();
+    this.pending = new WeakSet();
+    this.enabled = false;
+    this.stats = {
+      aborted: 0,
+      continued: 0,
+      fulfilled: 0,
+      cached: 0,
+    };
+    this.onRequest = (req) => {
+      this.handle(req).catch((e) => this.logger.error(e));
+    };
+    this.onResponse = (resp) => {
+      this.store(resp).catch((e) => this.logger.warn(e.message));
+    };
+  }
+
+  async setRules(rules) {
+    this.rules = (rules || []).map(_compile);
+    await this.refresh();
+  }
+
+  async setCache(cache, types) {
+    this.cache = cache;
+    this.cacheTypes = new Set(types || []);
+    await this.refresh();
+  }
+
+  wanted() {
+    return this.rules.length > 0 || this.cache != null;
+  }
+
+  async refresh() {
+    // interception stalls every request until it is handled, keep it off
+    // while there is nothing to decide.
+    let enable = this.wanted();
+    if (enable == this.enabled) return;
+
+    this.enabled = enable;
+    if (enable) {
+      this.page.on("request", this.onRequest);
+      this.page.on("response", this.onResponse);
+    } else {
+      this.page.off("request", this.onRequest);
+      this.page.off("response", this.onResponse);
+    }
+    await this.page.setRequestInterception(enable);
+  }
+
+  close() {
+    // the page goes away with its browser, only the listeners are dropped.
+    if (!this.enabled) return;
+    this.enabled = false;
+    this.page.off("request", this.onRequest);
+    this.page.off("response", this.onResponse);
+  }
+
+  cacheable(req) {
+    return (
+      this.cache != null &&
+      req.method() == "GET" &&
+      this.cacheTypes.has(req.resourceType())
+    );
+  }
+
+  async store(resp) {
+    let req = resp.request();
+    if (!this.pending.has(req)) return;
+    this.pending.delete(req);
+
+    let cache = this.cache;
+    let status = resp.status();
+    if (!cache || status != 200 || (resp.fromCache && resp.fromCache())) return;
+    await cache.put(req.url(), status, resp.headers(), await resp.buffer());
+  }
+
+  match(req) {
+    for (let rule of this.rules) {
+      if (rule.types && !rule.types.has(req.resourceType())) continue;
+      if (rule.url && !rule.url(req.url())) continue;
+      return rule;
+    }
+    return null;
+  }
+
+  async handle(req) {
+    if (req.isInterceptResolutionHandled && req.isInterceptResolutionHandled())
+      return;
+
+    let rule = this.match(req);
+    if (!rule) {
+      if (this.cacheable(req)) {
+        let hit = await this.cache.get(req.url());
+        if (hit) {
+          this.stats.cached++;
+          return await req.respond(hit);
+        }
+        this.pending.add(req);
+      }
+
+      this.stats.continued++;
+      return await req.continue();
+    }
+
+    if (rule.action == "abort") {
+      this.stats.aborted++;
+      return await req.abort(rule.error);
+    }
+
+    if (rule.action == "fulfill") {
+      this.stats.fulfilled++;
+      let response = {
+        status: rule.status,
+        headers: rule.headers || {},
+        body: rule.body,
+      };
+      if (rule.contentType) response.contentType = rule.contentType;
+      return await req.respond(response);
+    }
+
+    this.stats.continued++;
+    if (!rule.headers) return await req.continue();
+
+    // a null header value removes the header.
+    let headers = Object.assign({}, req.headers(), rule.headers);
+    for (let k of Object.keys(headers)) {
+      if (headers[k] === null) delete headers[k];
+    }
+    return await req.continue({ headers: headers });
+  }
+}
+
+module.exports.Interceptor = Interceptor;
@@ -0,0 +1,65 @@
+/**
+ *  Author: Zr
+ *  Email: zrtj1111@hotmail.com
+ *  Create: 2026-10-18
+ */
+
+// milliseconds, the same buckets as pptrc/metrics.py, +Inf is implied.
+const BUCKETS = [
+  1, 2.5, 5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000, 10000, 30000,
+  60000,
+];
+
+class Metrics {
+  /**
+   * per-action counts, errors, request/response bytes and a histogram
+   * of the time spent inside the action, for the whole server process.
+   */
+  constructor() {
+    this.since = Date.now();
+    this.actions = new Map();
+  }
+
+  record(action, ms, recvBytes, sentBytes, error) {
+    let a = this.actions.get(action);
+    if (!a) {
+      a = {
+        count: 0,
+        errors: 0,
+        recvBytes: 0,
+        sentBytes: 0,
+        sum: 0,
+        buckets: new Array(BUCKETS.length + 1).fill(0),
+      };
+      this.actions.set(action, a);
+    }
+
+    let i = 0;
+    while (i < BUCKETS.length && ms > BUCKETS[i]) i++;
+    a.buckets[i]++;
+    a.count++;
+    a.sum += ms;
+    a.recvBytes += recvBytes;
+    a.sentBytes += sentBytes;
+    if (error) a.errors++;
+  }
+
+  snapshot() {
+    let actions = {};
+    for (let [name, a] of this.actions) {
+      actions[name] = {
+        count: a.count,
+        errors: a.errors,
+        recvBytes: a.recvBytes,
+        sentBytes: a.sentBytes,
+        sum: a.sum,
+        buckets: a.buckets.slice(),
+      };
+    }
+    // buckets[i] counts times <= bounds[i], the last one the rest.
+    return { since: this.since, bounds: BUCKETS, actions: actions };
+  }
+}
+
+module.exports.Metrics = Metrics;
+module.exports.BUCKETS = BUCKETS;
@@ -0,0 +1,196 @@
+/**
+ *  Author: Zr
+ *  Email: zrtj1111@hotmail.com
+ *  Create: 2026-10-18
+ */
+
+const crypto = require("crypto");
+const fs = require("fs");
+const path = require("path");
+
+// hop-by-hop or stale once the body is stored decoded.
+const _DROP_HEADERS = [
+  "connection",
+  "content-encoding",
+  "content-length",
+  "keep-alive",
+  "set-cookie",
+  "transfer-encoding",
+];
+
+const _freshness = (headers, defaultTtl) => {
+  // seconds a response may be served from the cache, 0 for never.
+  let cc = (headers["cache-control"] || "").toLowerCase();
+  if (/no-store|no-cache|private/.test(cc)) return 0;
+  if (headers["set-cookie"] || (headers["vary"] || "").trim() == "*") return 0;
+
+  let m = cc.match(/s-maxage=(\d+)/) || cc.match(/max-age=(\d+)/);
+  if (m) return parseInt(m[1]);
+
+  if (headers["expires"]) {
+    let expires = Date.parse(headers["expires"]);
+    let date = Date.parse(headers["date"] || "") || Date.now();
+    if (!isNaN(expires)) {
+      return Math.max(0, Math.floor((expires - date) / 1000));
+    }
+  }
+  return defaultTtl;
+};
+
+class ResponseCache {
+  /**
+   * GET responses stored in a directory, shared by every browser of the
+   * server process: `<sha1 of url>.body` holds the decoded body and
+   * `<sha1 of url>.json` its url, status, headers and expiry. the index
+   * lives in memory, rebuilt from the .json files at startup, least
+   * recently used entries are removed once maxBytes is exceeded.
+   */
+  constructor(dir, maxBytes, defaultTtl, logger) {
+    this.dir = dir;
+    this.maxBytes = maxBytes;
+    this.defaultTtl = defaultTtl;
+    this.logger = logger;
+    this.entries = new Map();
+    this.bytes = 0;
+    this.stats = {
+      hits: 0,
+      misses: 0,
+      stores: 0,
+      evictions: 0,
+    };
+
+    fs.mkdirSync(dir, { recursive: true });
+    this._load();
+  }
+
+  _load() {
+    let metas = new Array();
+    for (let f of fs.readdirSync(this.dir)) {
+      if (!f.endsWith(".json")) continue;
+      try {
+        metas.push(JSON.parse(fs.readFileSync(path.join(this.dir, f))));
+      } catch (e) {
+        this.logger.warn("drop unreadable cache entry %s: %s", f, e.message);
+      }
+    }
+
+    metas.sort((a, b) => a.atime - b.atime);
+    for (let meta of metas) this._add(meta);
+    this._evict();
+  }
+
+  _key(url) {
+    return crypto.createHash("sha1").update(url).digest("hex");
+  }
+
+  _file(key, ext) {
+    return path.join(this.dir, `${key}.${ext}`);
+  }
+
+  _add(meta) {
+    this.entries.set(meta.key, meta);
+    this.bytes += meta.size;
+  }
+
+  _remove(key) {
+    let meta = this.entries.get(key);
+    if (!meta) return;
+    this.entries.delete(key);
+    this.bytes -= meta.size;
+    fs.promises.unlink(this._file(key, "json")).catch(() => {});
+    fs.promises.unlink(this._file(key, "body")).catch(() => {});
+  }
+
+  _evict() {
+    while (this.bytes > this.maxBytes && this.entries.size > 0) {
+      this._remove(this.entries.keys().next().value);
+      this.stats.evictions++;
+    }
+  }
+
+  async get(url) {
+    // {status, headers, body} of a fresh entry, null on a miss.
+    let key = this._key(url);
+    let meta = this.entries.get(key);
+    if (!meta || meta.url != url || meta.expires < Date.now()) {
+      if (meta && meta.expires < Date.now()) this._remove(key);
+      this.stats.misses++;
+      return null;
+    }
+
+    let body = null;
+    try {
+      body = await fs.promises.readFile(this._file(key, "body"));
+    } catch (e) {
+      // removed by another worker sharing the directory.
+      this._remove(key);
+      this.stats.misses++;
+      return null;
+    }
+
+    this.entries.delete(key);
+    meta.atime = Date.now();
+    this.entries.set(key, meta);
+    this.stats.hits++;
+    return {
+      status: meta.status,
+      headers: meta.headers,
+      body: body,
+    };
+  }
+
+  async put(url, status, headers, body) {
+    if (status != 200 || body.length > this.maxBytes) return false;
+    let ttl = _freshness(headers, this.defaultTtl);
+    if (ttl <= 0) return false;
+
+    let kept = {};
+    for (let k of Object.keys(headers)) {
+      if (_DROP_HEADERS.indexOf(k) < 0) kept[k] = headers[k];
+    }
+
+    let key = this._key(url);
+    let meta = {
+      key: key,
+      url: url,
+      status: status,
+      headers: kept,
+      size: body.length,
+      expires: Date.now() + ttl * 1000,
+      atime: Date.now(),
+    };
+
+    // write to temporary names first, readers never see half a file.
+    let bodyFile = this._file(key, "body");
+    let metaFile = this._file(key, "json");
+    let tmp = `.${process.pid}.tmp`;
+    await fs.promises.writeFile(bodyFile + tmp, body);
+    await fs.promises.writeFile(metaFile + tmp, JSON.stringify(meta));
+    await fs.promises.rename(bodyFile + tmp, bodyFile);
+    await fs.promises.rename(metaFile + tmp, metaFile);
+
+    if (this.entries.has(key)) {
+      this.bytes -= this.entries.get(key).size;
+      this.entries.delete(key);
+    }
+    this._add(meta);
+    this.stats.stores++;
+    this._evict();
+    return true;
+  }
+
+  info() {
+    return Object.assign(
+      {
+        enabled: true,
+        dir: this.dir,
+        entries: this.entries.size,
+        bytes: this.bytes,
+        maxBytes: this.maxBytes,
+      },
+      this.stats
+    );
+  }
+}
+
+module.exports.ResponseCache = ResponseCache;
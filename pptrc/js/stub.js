@@ -5,22 +5,43 @@
  */
 
 const getLogger = require(__dirname + "/log").getLogger;
+const HandleCache = require(__dirname + "/cache").HandleCache;
+const Metrics = require(__dirname + "/metrics").Metrics;
+const extractSchema = require(__dirname + "/extract").extractSchema;
+const Interceptor = require(__dirname + "/intercept").Interceptor;
+const ResponseCache = require(__dirname + "/respcache").ResponseCache;
+const Subscription = require(__dirname + "/events").Subscription;
 const util = require(__dirname + "/util");
 const isNoneOrFalse = util.isNoneOrFalse;
+const fs = require("fs");
 const net = require("net");
+const os = require("os");
+const path = require("path");
 const puppeteer = require("puppeteer-core");
 
 var logger = null;
 var BP_POOL = {};
 var BP_TIMER = {};
+var RESPONSE_CACHE = null;
+var METRICS = new Metrics();
 
 class BrowserProxy {
   constructor() {
     this.id = null;
     this.browser = null;
     this.pages = null;
-    this.frameCache = {};
-    this.elemCache = {};
+    this.frameCache = new HandleCache(_maxFrameHandles);
+    this.elemCache = new HandleCache(_maxElemHandles, (key, elem) => {
+      elem.dispose().catch(() => {});
+    });
+    this.handleSeq = 0;
+    this.frameIds = new WeakMap();
+    this.frameSeq = 0;
+    this.pageIds = new WeakMap();
+    this.pageSeq = 0;
+    this.watched = new WeakSet();
+    this.interceptors = new WeakMap();
+    this.subscriptions = new Map();
   }
 
   //==========================browser method============================
@@ -28,23 +49,146 @@ class BrowserProxy {
     if (!options.args) options.args = new Array();
     this.browser = await puppeteer.launch(options);
     this.id = await this.browser.wsEndpoint();
-    this.pages = await this.browser.pages();
+    this.browser.on("disconnected", () => {
+      // chrome crashed or was closed from outside, quit() has run otherwise.
+      if (BP_POOL[this.id] !== this) return;
+      logger.warn("browser disconnected, id: <%s>", this.id);
+      this.quit().catch((e) => logger.warn(e.message));
+    });
+    await this._refreshPages();
 
     return this;
   }
 
-  quit() {
-    this.browser.close();
+  async _refreshPages() {
+    this.pages = await this.browser.pages();
+    for (let page of this.pages) this._watchPage(page);
+  }
+
+  _watchPage(page) {
+    // handles die with their document, drop them as soon as it goes away
+    // instead of waiting for the next goto.
+    if (this.watched.has(page)) return;
+    this.watched.add(page);
+
+    page.on("framenavigated", (frame) => {
+      let i = this.pages.indexOf(page);
+      if (i < 0) return;
+      if (frame === page.mainFrame()) {
+        this._clearElemCache(`[PAGE_${i}]`);
+      } else {
+        for (let key of this.frameCache.keysOf(frame)) {
+          this._clearElemCache(key);
+        }
+      }
+    });
+    page.on("framedetached", (frame) => {
+      for (let key of this.frameCache.keysOf(frame)) {
+        this._clearElemCache(key);
+        this.frameCache.delete(key);
+      }
+    });
+    page.on("close", () => {
+      let i = this.pages.indexOf(page);
+      if (i < 0) return;
+      this._clearElemCache(`[PAGE_${i}]`);
+      this._clearFrameCache(`[PAGE_${i}]`);
+    });
+  }
+
+  _handleKey(prefix) {
+    // keys are never reused, a stale client Elem cannot dispose a newer
+    // handle cached for the same selector.
+    return `${prefix}#${++this.handleSeq}`;
+  }
+
+  disposeHandles(ctx) {
+    /**
+     * ctx => keys
+     */
+    let n = 0;
+    for (let key of ctx.keys || []) {
+      if (this.elemCache.delete(key)) n++;
+    }
+    return {
+      retCode: 1,
+      retMsg: "OK",
+      data: {
+        disposed: n,
+      },
+    };
+  }
+
+  async quit() {
+    // out of load and health at once, not when the idle timer fires.
+    delete BP_POOL[this.id];
+    clearTimeout(BP_TIMER[this.id]);
+    delete BP_TIMER[this.id];
+
+    for (let sub of Array.from(this.subscriptions.keys())) {
+      this.unsubscribe({ sub: sub });
+    }
+    for (let page of this.pages || []) {
+      let interceptor = this.interceptors.get(page);
+      if (interceptor) interceptor.close();
+    }
+    this.elemCache.clear();
+    this.frameCache.clear();
+
+    await this.browser.close();
   }
 
   async newPage() {
-    await this.browser.newPage();
-    this.pages = await this.browser.pages();
+    let page = await this.browser.newPage();
+    await this._refreshPages();
+    let i = this.pages.indexOf(page);
+    return {
+      retCode: 1,
+      retMsg: "OK",
+      data: {
+        pageIndex: i < 0 ? this.pages.length - 1 : i,
+        pageId: this._pageId(page),
+      },
+    };
+  }
+
+  _pageId(page) {
+    // stable across closes of other tabs, unlike the index into this.pages.
+    let id = this.pageIds.get(page);
+    if (id === undefined) {
+      id = ++this.pageSeq;
+      this.pageIds.set(page, id);
+    }
+    return id;
+  }
+
+  async _pageIndex(pageId) {
+    let find = () =>
+      this.pages.findIndex((page) => this.pageIds.get(page) === pageId);
+    let i = find();
+    if (i < 0) {
+      await this._refreshPages();
+      i = find();
+    }
+    if (i < 0) throw new Error(`page ${pageId} is closed`);
+    return i;
+  }
+
+  async ping() {
+    /**
+     * a round trip to chrome, unlike pagesCount which stub.js answers alone.
+     */
+    if (!this.browser.isConnected()) {
+      return {
+        retCode: -1,
+        retMsg: "browser disconnected",
+      };
+    }
     return {
       retCode: 1,
       retMsg: "OK",
       data: {
-        pageIndex: this.pages.length - 1,
+        version: await this.browser.version(),
       },
     };
   }
@@ -60,23 +204,15 @@ class BrowserProxy {
   }
 
   _clearElemCache(s) {
-    //s is `[PAGE_${pageIndex}`;
-    for (const k of Object.keys(this.elemCache)) {
-      if (k.indexOf(s) == 0) {
-        logger.debug(`Page elemCache found: ${k}`);
-        k = null;
-      }
-    }
+    //s is `[PAGE_${pageIndex}]` or a frameKey;
+    let n = this.elemCache.deletePrefix(s);
+    if (n > 0) logger.debug(`elemCache cleared ${n} handles of ${s}`);
   }
 
   _clearFrameCache(s) {
-    // s is `[PAGE_${pageIndex}`;
-    for (const k of Object.keys(this.frameCache)) {
-      if (k.indexOf(s) == 0) {
-        logger.debug(`Page frameCache found: ${k}`);
-        k = null;
-      }
-    }
+    // s is `[PAGE_${pageIndex}]`;
+    let n = this.frameCache.deletePrefix(s);
+    if (n > 0) logger.debug(`frameCache cleared ${n} frames of ${s}`);
   }
 
   //===========================end browser methods============================/
@@ -90,7 +226,7 @@ class BrowserProxy {
     /**
      * ctx => selector
      */
-    let key = `[PAGE_${ctx.pageIndex}][ELEM_${ctx.selector}]`;
+    let key = this._handleKey(`[PAGE_${ctx.pageIndex}][ELEM_${ctx.selector}]`);
     let elem = await this.pages[ctx.pageIndex].$(ctx.selector);
     if (isNoneOrFalse(elem)) {
       return {
@@ -99,7 +235,7 @@ class BrowserProxy {
       };
     }
 
-    this.elemCache[key] = elem;
+    this.elemCache.set(key, elem);
 
     return {
       retCode: 1,
@@ -111,10 +247,10 @@ class BrowserProxy {
   }
 
   async waitForSelector(ctx) {
-    let key = `[PAGE_${ctx.pageIndex}][ELEM_${ctx.selector}]`;
+    let key = this._handleKey(`[PAGE_${ctx.pageIndex}][ELEM_${ctx.selector}]`);
     let elem = await this.pages[ctx.pageIndex].waitForSelector(
       ctx.selector,
-      ctx.options
+      Object.assign({}, ctx.options, { signal: ctx.signal })
     );
     if (isNoneOrFalse(elem)) {
       return {
@@ -123,7 +259,7 @@ class BrowserProxy {
       };
     }
 
-    this.elemCache[key] = elem;
+    this.elemCache.set(key, elem);
 
     return {
       retCode: 1,
@@ -149,8 +285,10 @@ class BrowserProxy {
 
     let keys = new Array();
     for (let i = 0; i < elems.length; i++) {
-      let key = `[PAGE_${ctx.pageIndex}][ELEM_${ctx.selector}][${i}]`;
-      this.elemCache[key] = elems[i];
+      let key = this._handleKey(
+        `[PAGE_${ctx.pageIndex}][ELEM_${ctx.selector}][${i}]`
+      );
+      this.elemCache.set(key, elems[i]);
       keys.push(key);
     }
 
@@ -197,6 +335,114 @@ class BrowserProxy {
     };
   }
 
+  async extract(ctx) {
+    /**
+     * ctx => pageIndex, schema
+     * the whole schema is evaluated in one page.evaluate.
+     */
+    let result = await this.pages[ctx.pageIndex].evaluate(
+      extractSchema,
+      ctx.schema
+    );
+    return {
+      retCode: 1,
+      retMsg: "OK",
+      data: {
+        result: result,
+      },
+    };
+  }
+
+  async waitForFunction(ctx) {
+    /**
+     * ctx => pageIndex, script, polling, timeout
+     * script is an expression, resolves once it is truthy.
+     */
+    return await this._waitForFunction(this.pages[ctx.pageIndex], ctx);
+  }
+
+  async _waitForFunction(target, ctx) {
+    let handle = await target.waitForFunction(util.decodeBytes(ctx.script), {
+      polling: ctx.polling,
+      timeout: ctx.timeout,
+      signal: ctx.signal,
+    });
+    try {
+      return {
+        retCode: 1,
+        retMsg: "OK",
+        data: {
+          result: await handle.jsonValue(),
+        },
+      };
+    } finally {
+      handle.dispose().catch(() => {});
+    }
+  }
+
+  async waitForResponse(ctx) {
+    /**
+     * ctx => pageIndex, url{pattern, regex, flags}, timeout
+     */
+    let match = util.urlMatcher(ctx.url);
+    let response = await this.pages[ctx.pageIndex].waitForResponse(
+      (r) => match(r.url()),
+      { timeout: ctx.timeout, signal: ctx.signal }
+    );
+    return {
+      retCode: 1,
+      retMsg: "OK",
+      data: {
+        url: response.url(),
+        status: response.status(),
+        headers: response.headers(),
+      },
+    };
+  }
+
+  async waitForNetworkIdle(ctx) {
+    /**
+     * ctx => pageIndex, idleTime, timeout
+     */
+    await this.pages[ctx.pageIndex].waitForNetworkIdle({
+      idleTime: ctx.idleTime,
+      timeout: ctx.timeout,
+      signal: ctx.signal,
+    });
+  }
+
+  async scrollToView(ctx) {
+    /**
+     * ctx => pageIndex, selector, timeout
+     * one request instead of the client scrolling until the element shows.
+     */
+    let page = this.pages[ctx.pageIndex];
+    let elem = await page.waitForSelector(ctx.selector, {
+      timeout: ctx.timeout,
+      signal: ctx.signal,
+    });
+    try {
+      await elem.evaluate((el) =>
+        el.scrollIntoView({ block: "center", inline: "center" })
+      );
+      await page.waitForFunction(
+        (el) => {
+          let r = el.getBoundingClientRect();
+          return (
+            r.bottom > 0 &&
+            r.right > 0 &&
+            r.top < window.innerHeight &&
+            r.left < window.innerWidth
+          );
+        },
+        { polling: "raf", timeout: ctx.timeout, signal: ctx.signal },
+        elem
+      );
+    } finally {
+      elem.dispose().catch(() => {});
+    }
+  }
+
   async setDefaultNavigationTimeout(ctx) {
     /**
      * ctx => timeout|milliseconds
@@ -208,15 +454,16 @@ class BrowserProxy {
     /**
      * ctx => pageIndex, script
      */
-    let script = Buffer.from(ctx.script, "base64").toString();
+    let script = util.decodeBytes(ctx.script);
     await this.pages[ctx.pageIndex].evaluateOnNewDocument((script) => {
       return eval(script);
     }, script);
   }
 
   async waitForNavigation(ctx) {
-    this._clearElemCache(`[PAGE_${ctx.pageIndex}`);
-    await this.pages[ctx.pageIndex].waitForNavigation(ctx.options);
+    this._clearElemCache(`[PAGE_${ctx.pageIndex}]`);
+    let page = this.pages[ctx.pageIndex];
+    await _navigate(page, ctx, (options) => page.waitForNavigation(options));
   }
 
   async bringToFront(ctx) {
@@ -230,8 +477,11 @@ class BrowserProxy {
     /**
      * ctx => pageIndex, url, options{waitUntil,timeout,referer}
      */
-    let result = await this.pages[ctx.pageIndex].goto(ctx.url, ctx.options);
-    this._clearElemCache(`[PAGE_${ctx.pageIndex}`);
+    let page = this.pages[ctx.pageIndex];
+    let result = await _navigate(page, ctx, (options) =>
+      page.goto(ctx.url, options)
+    );
+    this._clearElemCache(`[PAGE_${ctx.pageIndex}]`);
     return {
       retCode: 1,
       retMsg: "OK",
@@ -242,19 +492,21 @@ class BrowserProxy {
   }
 
   async goForward(ctx) {
-    await this.pages[ctx.pageIndex].goForward(ctx.options);
-    this._clearElemCache(`[PAGE_${ctx.pageIndex}`);
+    let page = this.pages[ctx.pageIndex];
+    await _navigate(page, ctx, (options) => page.goForward(options));
+    this._clearElemCache(`[PAGE_${ctx.pageIndex}]`);
   }
 
   async goBack(ctx) {
-    await this.pages[ctx.pageIndex].goBack(ctx.options);
-    this._clearElemCache(`[PAGE_${ctx.pageIndex}`);
+    let page = this.pages[ctx.pageIndex];
+    await _navigate(page, ctx, (options) => page.goBack(options));
+    this._clearElemCache(`[PAGE_${ctx.pageIndex}]`);
   }
 
   async html(ctx) {
     let html = await this.pages[ctx.pageIndex].content();
     if (html) {
-      html = Buffer.from(html).toString("base64");
+      html = Buffer.from(html);
     }
 
     return {
@@ -307,15 +559,174 @@ class BrowserProxy {
     };
   }
 
+  async resetPage(ctx) {
+    /**
+     * ctx => pageIndex, url, clearAllCookies
+     * make a used tab look new: cookies, storage, document and cached handles.
+     */
+    let page = this.pages[ctx.pageIndex];
+    let url = page.url();
+
+    if (this.interceptors.has(page)) {
+      await this.interceptors.get(page).setRules([]);
+      await this.interceptors.get(page).setCache(null);
+    }
+
+    await page.evaluate(() => {
+      try {
+        localStorage.clear();
+        sessionStorage.clear();
+      } catch (e) {}
+    });
+
+    let session = page.createCDPSession
+      ? await page.createCDPSession()
+      : await page.target().createCDPSession();
+    try {
+      if (ctx.clearAllCookies) {
+        await session.send("Network.clearBrowserCookies");
+      } else {
+        let cookies = await page.cookies();
+        if (cookies.length > 0) await page.deleteCookie(...cookies);
+      }
+
+      if (url.startsWith("http")) {
+        await session.send("Storage.clearDataForOrigin", {
+          origin: new URL(url).origin,
+          storageTypes: "indexeddb,cache_storage,service_workers,websql",
+        });
+      }
+    } finally {
+      await session.detach();
+    }
+
+    let navigation = { signal: ctx.signal, deadlineAt: ctx.deadlineAt };
+    await _navigate(page, navigation, (options) =>
+      page.goto(ctx.url || "about:blank", options)
+    );
+    this._clearElemCache(`[PAGE_${ctx.pageIndex}]`);
+    this._clearFrameCache(`[PAGE_${ctx.pageIndex}]`);
+  }
+
+  _interceptor(page) {
+    let interceptor = this.interceptors.get(page);
+    if (!interceptor) {
+      interceptor = new Interceptor(page, logger);
+      this.interceptors.set(page, interceptor);
+    }
+    return interceptor;
+  }
+
+  async setInterception(ctx) {
+    /**
+     * ctx => pageIndex, rules
+     * replaces the interception rules of the page, no rules turns
+     * interception off.
+     */
+    let interceptor = this._interceptor(this.pages[ctx.pageIndex]);
+    await interceptor.setRules(ctx.rules);
+    return {
+      retCode: 1,
+      retMsg: "OK",
+      data: {
+        enabled: interceptor.enabled,
+        stats: interceptor.stats,
+      },
+    };
+  }
+
+  async setResponseCache(ctx) {
+    /**
+     * ctx => pageIndex, enabled, types
+     * answer GET requests of these resource types from the response cache
+     * shared by every browser of this process.
+     */
+    if (ctx.enabled && !RESPONSE_CACHE) {
+      return {
+        retCode: -1,
+        retMsg: "response cache is off, start pptrs with --cache-dir",
+      };
+    }
+
+    let interceptor = this._interceptor(this.pages[ctx.pageIndex]);
+    await interceptor.setCache(ctx.enabled ? RESPONSE_CACHE : null, ctx.types);
+    return {
+      retCode: 1,
+      retMsg: "OK",
+      data: {
+        enabled: interceptor.cache != null,
+      },
+    };
+  }
+
+  async interceptionStats(ctx) {
+    let interceptor = this.interceptors.get(this.pages[ctx.pageIndex]);
+    return {
+      retCode: 1,
+      retMsg: "OK",
+      data: {
+        enabled: interceptor ? interceptor.enabled : false,
+        stats: interceptor ? interceptor.stats : {},
+      },
+    };
+  }
+
+  async subscribe(ctx, conn) {
+    /**
+     * ctx => pageIndex, sub, events and filters, see events.js
+     * events are pushed on this connection as {sub, events} frames
+     * without seq until unsubscribe or the connection closes.
+     */
+    let page = this.pages[ctx.pageIndex];
+    if (this.subscriptions.has(ctx.sub)) {
+      this.unsubscribe({ sub: ctx.sub });
+    }
+
+    let sub = new Subscription(
+      page,
+      ctx,
+      async (events) => {
+        if (conn.socket.destroyed) return this.unsubscribe({ sub: ctx.sub });
+        await _write(conn, {
+          retCode: 1,
+          retMsg: "OK",
+          sub: ctx.sub,
+          events: events,
+        });
+      },
+      (frame) => this._cacheFrame(this.pages.indexOf(page), frame),
+      logger
+    );
+    this.subscriptions.set(sub.id, sub);
+    conn.subs.set(sub.id, () => {
+      if (this.subscriptions.get(sub.id) === sub) {
+        this.unsubscribe({ sub: sub.id });
+      }
+    });
+  }
+
+  unsubscribe(ctx) {
+    /**
+     * ctx => sub
+     */
+    let sub = this.subscriptions.get(ctx.sub);
+    if (sub) {
+      this.subscriptions.delete(ctx.sub);
+      sub.close();
+    }
+  }
+
   async closePage(ctx) {
     /**
      * ctx => pageIndex
      */
-    this.pages = await this.browser.pages();
+    await this._refreshPages();
     if (this.pages.length == 1) {
       await this.quit();
     } else {
       await this.pages[ctx.pageIndex].close();
+      // later tabs move down one index.
+      await this._refreshPages();
     }
   }
 
@@ -339,7 +750,17 @@ class BrowserProxy {
   }
 
   async pdf(ctx) {
-    await this.pages[ctx.pageIndex].pdf(ctx.options);
+    /**
+     * ctx => options, without options.path the pdf is returned as bytes
+     */
+    let pdf = await this.pages[ctx.pageIndex].pdf(ctx.options);
+    return {
+      retCode: 1,
+      retMsg: "OK",
+      data: {
+        pdf: ctx.options.path ? null : util.toBuffer(pdf),
+      },
+    };
   }
 
   async scroll(ctx) {
@@ -392,7 +813,7 @@ class BrowserProxy {
   }
 
   async evaluate(ctx) {
-    let script = Buffer.from(ctx.script, "base64").toString();
+    let script = util.decodeBytes(ctx.script);
     let result = await this.pages[ctx.pageIndex].evaluate((script) => {
       return eval(script);
     }, script);
@@ -414,14 +835,83 @@ class BrowserProxy {
   }
 
   async screenShot(ctx) {
-    await this.pages[ctx.pageIndex].screenshot({
-      path: ctx.path,
+    /**
+     * ctx => path, omitBackground, fullPage, type, quality
+     *        without path the image is returned as bytes
+     */
+    let image = await this.pages[ctx.pageIndex].screenshot(
+      this._screenshotOptions(ctx)
+    );
+
+    return {
+      retCode: 1,
+      retMsg: "OK",
+      data: {
+        image: ctx.path ? null : util.toBuffer(image),
+      },
+    };
+  }
+
+  _screenshotOptions(ctx) {
+    let options = {
       omitBackground: ctx.omitBackground,
-    });
+    };
+    if (ctx.path) options.path = ctx.path;
+    if (ctx.fullPage) options.fullPage = ctx.fullPage;
+    if (ctx.type) options.type = ctx.type;
+    if (ctx.quality) options.quality = ctx.quality;
+    return options;
+  }
+
+  async batch(ctx) {
+    /**
+     * ctx => pageIndex, steps[{action, ctx}], stopOnError
+     */
+    let results = new Array();
+    for (let step of ctx.steps) {
+      // a cancelled batch runs no further steps.
+      if (ctx.signal && ctx.signal.aborted) break;
+      let resp = null;
+      try {
+        if (
+          step.action == "batch" ||
+          step.action.startsWith("_") ||
+          typeof this[step.action] != "function"
+        ) {
+          throw new Error(`action not allowed in batch: ${step.action}`);
+        }
+        resp = await this[step.action](
+          Object.assign({ pageIndex: ctx.pageIndex }, step.ctx, {
+            signal: ctx.signal,
+            deadlineAt: ctx.deadlineAt,
+          })
+        );
+      } catch (e) {
+        resp = {
+          retCode: -2,
+          retMsg: e.message,
+          data: {},
+        };
+        logger.error(e);
+      }
+
+      if (resp == null)
+        resp = {
+          retCode: 1,
+          retMsg: "OK",
+          data: {},
+        };
+
+      results.push(resp);
+      if (resp.retCode < 0 && ctx.stopOnError) break;
+    }
 
     return {
       retCode: 1,
       retMsg: "OK",
+      data: {
+        results: results,
+      },
     };
   }
 
@@ -430,29 +920,91 @@ class BrowserProxy {
   //============================frame Methods==================================/
   async frames(ctx) {
     /**
-     * ctx => selector
+     * ctx => pageIndex
+     * every frame of the page with its metadata, one round trip.
      */
-    let keys = new Array();
     let frames = await this.pages[ctx.pageIndex].frames();
-    for (let frame of frames) {
-      let buff = Buffer.from(frame.url());
-      let id = buff.toString("base64");
-      let key = `[PAGE_${ctx.pageIndex}][FRAME_${id}]`;
-      this.frameCache[key] = frame;
-      keys.push(key);
-    }
+    let infos = frames.map((frame) => this._frameInfo(ctx.pageIndex, frame));
 
     return {
       retCode: 1,
       retMsg: "OK",
       data: {
-        keys: keys,
+        keys: infos.map((info) => info.key),
+        frames: infos,
       },
     };
   }
 
+  _cacheFrame(pageIndex, frame) {
+    // ids follow the Frame object, not its url: frames sharing a url keep
+    // their own keys and a key survives navigations of its frame.
+    let id = this.frameIds.get(frame);
+    if (id === undefined) {
+      id = ++this.frameSeq;
+      this.frameIds.set(frame, id);
+    }
+    let key = `[PAGE_${pageIndex}][FRAME_${id}]`;
+    this.frameCache.set(key, frame);
+    return key;
+  }
+
+  _frameInfo(pageIndex, frame) {
+    let parent = frame.parentFrame();
+    return {
+      key: this._cacheFrame(pageIndex, frame),
+      url: frame.url(),
+      name: typeof frame.name == "function" ? frame.name() : frame._name,
+      parent: parent ? this._cacheFrame(pageIndex, parent) : null,
+      detached:
+        typeof frame.isDetached == "function"
+          ? frame.isDetached()
+          : !!frame.detached,
+    };
+  }
+
+  async waitForFrame(ctx) {
+    /**
+     * ctx => pageIndex, url{pattern, regex, flags}, timeout
+     * resolves on the first frame, existing or attached later, whose url
+     * matches.
+     */
+    let page = this.pages[ctx.pageIndex];
+    let match = util.urlMatcher(ctx.url);
+    let found = page.frames().find((f) => match(f.url()));
+
+    if (!found) {
+      found = await new Promise((resolve, reject) => {
+        const check = (frame) => {
+          if (match(frame.url())) done(null, frame);
+        };
+        const abort = () => done(ctx.signal.reason);
+        const done = (err, frame) => {
+          clearTimeout(timer);
+          page.off("frameattached", check);
+          page.off("framenavigated", check);
+          if (ctx.signal) ctx.signal.removeEventListener("abort", abort);
+          err ? reject(err) : resolve(frame);
+        };
+        let timer = setTimeout(
+          () => done(new Error(`waitForFrame timeout ${ctx.timeout}ms`)),
+          ctx.timeout
+        );
+        page.on("frameattached", check);
+        page.on("framenavigated", check);
+        if (ctx.signal) ctx.signal.addEventListener("abort", abort);
+      });
+    }
+
+    return {
+      retCode: 1,
+      retMsg: "OK",
+      data: this._frameInfo(ctx.pageIndex, found),
+    };
+  }
+
   async f_url(ctx) {
-    let url = this.frameCache[ctx.frameKey].url();
+    let url = this.frameCache.get(ctx.frameKey).url();
     return {
       retCode: 1,
       retMsg: "OK",
@@ -467,8 +1019,8 @@ class BrowserProxy {
      * ctx =>   selector
      *          frameKey
      */
-    let key = `${ctx.frameKey}[${ctx.selector}]`;
-    let elem = await this.frameCache[ctx.frameKey].$(ctx.selector);
+    let key = this._handleKey(`${ctx.frameKey}[${ctx.selector}]`);
+    let elem = await this.frameCache.get(ctx.frameKey).$(ctx.selector);
     if (isNoneOrFalse(elem)) {
       return {
         retCode: -1,
@@ -476,7 +1028,7 @@ class BrowserProxy {
       };
     }
 
-    this.elemCache[key] = elem;
+    this.elemCache.set(key, elem);
 
     return {
       retCode: 1,
@@ -492,8 +1044,7 @@ class BrowserProxy {
      * ctx =>   selector
      *          frameKey
      */
-    let key = `${ctx.frameKey}[${ctx.selector}]`;
-    let elems = await this.frameCache[ctx.frameKey].$$(ctx.selector);
+    let elems = await this.frameCache.get(ctx.frameKey).$$(ctx.selector);
     if (isNoneOrFalse(elems)) {
       return {
         retCode: -1,
@@ -503,8 +1054,10 @@ class BrowserProxy {
 
     let keys = new Array();
     for (let i = 0; i < elems.length; i++) {
-      let key = `${ctx.frameKey}[ELEM_${ctx.selector}][${i}]`;
-      this.elemCache[key] = elems[i];
+      let key = this._handleKey(
+        `${ctx.frameKey}[ELEM_${ctx.selector}][${i}]`
+      );
+      this.elemCache.set(key, elems[i]);
       keys.push(key);
     }
 
@@ -521,7 +1074,7 @@ class BrowserProxy {
     /**
      * ctx => pageIndex, frameKey, options
      */
-    let frame = this.frameCache[ctx.frameKey];
+    let frame = this.frameCache.get(ctx.frameKey);
     if (isNoneOrFalse(frame)) {
       return {
         retCode: -1,
@@ -533,7 +1086,10 @@ class BrowserProxy {
   }
 
   async f_waitForNavigation(ctx) {
-    await this.frameCache[ctx.frameKey].waitForNavigation(ctx.options);
+    let frame = this.frameCache.get(ctx.frameKey);
+    await _navigate(frame.page(), ctx, (options) =>
+      frame.waitForNavigation(options)
+    );
     this._clearElemCache(ctx.frameKey);
   }
 
@@ -542,10 +1098,10 @@ class BrowserProxy {
      * ctx =>   selector
      *          frameKey
      */
-    let key = `${ctx.frameKey}[${ctx.selector}]`;
-    let elem = await this.frameCache[ctx.frameKey].waitForSelector(
+    let key = this._handleKey(`${ctx.frameKey}[${ctx.selector}]`);
+    let elem = await this.frameCache.get(ctx.frameKey).waitForSelector(
       ctx.selector,
-      ctx.options
+      Object.assign({}, ctx.options, { signal: ctx.signal })
     );
     if (isNoneOrFalse(elem)) {
       return {
@@ -554,7 +1110,7 @@ class BrowserProxy {
       };
     }
 
-    this.elemCache[key] = elem;
+    this.elemCache.set(key, elem);
 
     return {
       retCode: 1,
@@ -566,8 +1122,9 @@ class BrowserProxy {
   }
 
   async f_evaluate(ctx) {
-    let script = Buffer.from(ctx.script, "base64").toString();
-    let result = await this.frameCache[ctx.frameKey].evaluate((script) => {
+    let script = util.decodeBytes(ctx.script);
+    let frame = this.frameCache.get(ctx.frameKey);
+    let result = await frame.evaluate((script) => {
       return eval(script);
     }, script);
     return {
@@ -580,7 +1137,7 @@ class BrowserProxy {
   }
 
   async f_$eval(ctx) {
-    let result = await this.frameCache[ctx.frameKey].$eval(
+    let result = await this.frameCache.get(ctx.frameKey).$eval(
       ctx.selector,
       (el, attr) => el[attr],
       ctx.attr
@@ -596,7 +1153,7 @@ class BrowserProxy {
   }
 
   async f_$$eval(ctx) {
-    let result = await this.frameCache[ctx.frameKey].$$eval(
+    let result = await this.frameCache.get(ctx.frameKey).$$eval(
       ctx.selector,
       (els, attr) => {
         return els.map((el) => el[attr]);
@@ -613,6 +1170,35 @@ class BrowserProxy {
     };
   }
 
+  async f_waitForFunction(ctx) {
+    /**
+     * ctx => frameKey, script, polling, timeout
+     */
+    return await this._waitForFunction(this.frameCache.get(ctx.frameKey), ctx);
+  }
+
+  async f_extract(ctx) {
+    /**
+     * ctx => frameKey, schema
+     */
+    let frame = this.frameCache.get(ctx.frameKey);
+    if (isNoneOrFalse(frame)) {
+      return {
+        retCode: -1,
+        retMsg: "Frame not found in cache.",
+      };
+    }
+
+    let result = await frame.evaluate(extractSchema, ctx.schema);
+    return {
+      retCode: 1,
+      retMsg: "OK",
+      data: {
+        result: result,
+      },
+    };
+  }
+
   //============================End Frame Methods=============================/
 
   //============================Element methods=============================/
@@ -620,8 +1206,8 @@ class BrowserProxy {
     /**
      * ctx => key, selector
      */
-    let key = `${ctx.key}[${ctx.selector}]`;
-    let elem = this.elemCache[ctx.key];
+    let key = this._handleKey(`${ctx.key}[${ctx.selector}]`);
+    let elem = this.elemCache.get(ctx.key);
     if (isNoneOrFalse(elem)) {
       return {
         retCode: -1,
@@ -636,7 +1222,7 @@ class BrowserProxy {
       };
     }
 
-    this.elemCache[key] = elemChild;
+    this.elemCache.set(key, elemChild);
 
     return {
       retCode: 1,
@@ -652,7 +1238,7 @@ class BrowserProxy {
      * ctx => key, selector
      */
     let key = `${ctx.key}[${ctx.selector}]`;
-    let elem = this.elemCache[ctx.key];
+    let elem = this.elemCache.get(ctx.key);
     if (isNoneOrFalse(elem)) {
       return {
         retCode: -1,
@@ -670,8 +1256,8 @@ class BrowserProxy {
 
     let keys = new Array();
     for (let i = 0; i < elemChildren.length; i++) {
-      let _k = `${key}[${i}]`;
-      this.elemCache[_k] = elemChildren[i];
+      let _k = this._handleKey(`${key}[${i}]`);
+      this.elemCache.set(_k, elemChildren[i]);
       keys.push(_k);
     }
 
@@ -688,7 +1274,7 @@ class BrowserProxy {
     /**
      * ctx => pageIndex,key
      */
-    let elem = this.elemCache[ctx.key];
+    let elem = this.elemCache.get(ctx.key);
     if (isNoneOrFalse(elem)) {
       return {
         retCode: -1,
@@ -703,7 +1289,7 @@ class BrowserProxy {
     /**
      * ctx => attr
      */
-    let elem = this.elemCache[ctx.key];
+    let elem = this.elemCache.get(ctx.key);
     if (isNoneOrFalse(elem)) {
       return {
         retCode: -1,
@@ -713,8 +1299,8 @@ class BrowserProxy {
 
     let ret = await (await elem.getProperty(ctx.attr)).jsonValue();
 
-    if (ret) {
-      ret = Buffer.from(ret).toString("base64");
+    if (ret && typeof ret == "string") {
+      ret = Buffer.from(ret);
     }
 
     return {
@@ -726,8 +1312,30 @@ class BrowserProxy {
     };
   }
 
+  async e_screenShot(ctx) {
+    /**
+     * ctx => key, path, omitBackground, type, quality
+     */
+    let elem = this.elemCache.get(ctx.key);
+    if (isNoneOrFalse(elem)) {
+      return {
+        retCode: -1,
+        retMsg: "Element not found in cache.",
+      };
+    }
+
+    let image = await elem.screenshot(this._screenshotOptions(ctx));
+    return {
+      retCode: 1,
+      retMsg: "OK",
+      data: {
+        image: ctx.path ? null : util.toBuffer(image),
+      },
+    };
+  }
+
   async e_isIntersectingViewport(ctx) {
-    let elem = this.elemCache[ctx.key];
+    let elem = this.elemCache.get(ctx.key);
     if (isNoneOrFalse(elem)) {
       return {
         retCode: -1,
@@ -745,7 +1353,7 @@ class BrowserProxy {
   }
 
   async e_scrollIntoView(ctx) {
-    let elem = this.elemCache[ctx.key];
+    let elem = this.elemCache.get(ctx.key);
     if (isNoneOrFalse(elem)) {
       return {
         retCode: -1,
@@ -771,10 +1379,11 @@ const resetTimer = (id, duration) => {
     clearTimeout(BP_TIMER[bp.id]);
     BP_TIMER[bp.id] = setTimeout(
       (bp) => {
-        bp.browser.close().then(() => {
-          delete BP_POOL[id];
-          logger.warn("time out, dipose browser instance. id: <%s>", id);
-        });
+        bp.quit()
+          .then(() => {
+            logger.warn("time out, dipose browser instance. id: <%s>", id);
+          })
+          .catch((e) => logger.error(e));
       },
       duration,
       bp
@@ -782,20 +1391,330 @@ const resetTimer = (id, duration) => {
   }
 };
 
-const _write = (socket, resp) => {
-  let data = JSON.stringify(resp);
-  let num = util.pad(data.length, _headerLength);
-  logger.debug("send data size: %d", num);
-  socket.write(num + data);
+const _stripBuffers = (obj, path, atts, binary) => {
+  // Buffers in a response are payloads: base64 strings in ascii framing,
+  // raw attachments listed under `$bin` in binary framing.
+  let isArray = Array.isArray(obj);
+  let keys = isArray ? obj.keys() : Object.keys(obj);
+  for (let k of keys) {
+    let v = obj[k];
+    if (Buffer.isBuffer(v)) {
+      if (binary) {
+        atts.push([path.concat([k]), v]);
+        obj[k] = null;
+      } else {
+        obj[k] = v.toString("base64");
+      }
+    } else if (v !== null && typeof v == "object") {
+      _stripBuffers(v, path.concat([k]), atts, binary);
+    }
+  }
+};
+
+const _encode = (resp, binary) => {
+  let atts = new Array();
+  _stripBuffers(resp, [], atts, binary);
+
+  if (!binary) {
+    let data = Buffer.from(JSON.stringify(resp));
+    return [Buffer.from(util.pad(data.length, _headerLength)), data];
+  }
+
+  if (atts.length > 0) resp.$bin = atts.map(([p, b]) => [p, b.length]);
+  let data = Buffer.from(JSON.stringify(resp));
+  let head = Buffer.alloc(_headerLength);
+  head.writeUInt32BE(data.length, 0);
+  head.writeUInt32BE(
+    atts.reduce((n, [p, b]) => n + b.length, 0),
+    4
+  );
+  return [head, data].concat(atts.map(([p, b]) => b));
+};
+
+const _decode = (head, body, binary) => {
+  if (!binary) return JSON.parse(body.toString("utf8"));
+
+  let jsonLen = head.readUInt32BE(0);
+  let jd = JSON.parse(body.toString("utf8", 0, jsonLen));
+  let offset = jsonLen;
+  for (let [path, size] of jd.$bin || []) {
+    let obj = jd;
+    for (let p of path.slice(0, -1)) obj = obj[p];
+    obj[path[path.length - 1]] = body.subarray(offset, offset + size);
+    offset += size;
+  }
+  delete jd.$bin;
+  return jd;
+};
+
+const _bodySize = (head, binary) => {
+  if (!binary) return parseInt(head.toString("latin1"));
+  return head.readUInt32BE(0) + head.readUInt32BE(4);
+};
+
+const _isLoopback = (address) => {
+  return ["127.0.0.1", "::1", "::ffff:127.0.0.1"].indexOf(address) >= 0;
+};
+
+const _writeShm = async (conn, bufs) => {
+  // files already mapped and removed by the client need no cleanup.
+  for (let f of conn.files) {
+    if (!fs.existsSync(f)) conn.files.delete(f);
+  }
+
+  let file = path.join(_shmDir, `pptrs-${process.pid}-${++_shmSeq}`);
+  let fh = await fs.promises.open(file, "w", 0o600);
+  try {
+    await fh.writev(bufs);
+  } finally {
+    await fh.close();
+  }
+  conn.files.add(file);
+  return file;
+};
+
+const _write = async (conn, resp) => {
+  let bufs = _encode(resp, conn.binary);
+  let size = bufs.reduce((n, b) => n + b.length, 0);
+  logger.debug("send data size: %d", size);
+
+  if (conn.shm > 0 && size > conn.shm) {
+    // large payload for a local client: hand the whole frame over in a file
+    // on tmpfs, the socket only carries its path.
+    let file = await _writeShm(conn, bufs);
+    bufs = _encode(
+      { retCode: 1, retMsg: "OK", file: file, seq: resp.seq },
+      conn.binary
+    );
+    size = bufs.reduce((n, b) => n + b.length, 0);
+  }
+
+  conn.socket.write(bufs.length == 1 ? bufs[0] : Buffer.concat(bufs, size));
+  return size;
+};
+
+const SERVER_ACTIONS = {
+  cacheStats: async (conn, ctx) => {
+    return {
+      retCode: 1,
+      retMsg: "OK",
+      data: RESPONSE_CACHE ? RESPONSE_CACHE.info() : { enabled: false },
+    };
+  },
+  metrics: async (conn, ctx) => {
+    return {
+      retCode: 1,
+      retMsg: "OK",
+      data: METRICS.snapshot(),
+    };
+  },
+  load: async (conn, ctx) => {
+    let pages = 0;
+    for (let bp of Object.values(BP_POOL)) {
+      pages += bp.pages ? bp.pages.length : 0;
+    }
+    return {
+      retCode: 1,
+      retMsg: "OK",
+      data: {
+        browsers: Object.keys(BP_POOL),
+        pages: pages,
+      },
+    };
+  },
+  health: async (conn, ctx) => {
+    // answered without touching any browser, so it works while one is busy.
+    let pages = 0;
+    let elemHandles = 0;
+    let frameHandles = 0;
+    for (let bp of Object.values(BP_POOL)) {
+      pages += bp.pages ? bp.pages.length : 0;
+      elemHandles += bp.elemCache.size;
+      frameHandles += bp.frameCache.size;
+    }
+    let connections = await new Promise((resolve) =>
+      server.getConnections((err, count) => resolve(err ? null : count))
+    );
+    return {
+      retCode: 1,
+      retMsg: "OK",
+      data: {
+        pid: process.pid,
+        uptime: process.uptime(),
+        connections: connections,
+        browsers: Object.keys(BP_POOL).length,
+        pages: pages,
+        elemHandles: elemHandles,
+        frameHandles: frameHandles,
+        responseCache: RESPONSE_CACHE
+          ? { entries: RESPONSE_CACHE.entries.size, bytes: RESPONSE_CACHE.bytes }
+          : null,
+        rss: process.memoryUsage().rss,
+      },
+    };
+  },
+  hello: async (conn, ctx) => {
+    // answered in ascii framing, switch after the response is written.
+    conn.upgrade = ctx.framing == "binary";
+    conn.shm =
+      ctx.shm > 0 && _isLoopback(conn.socket.remoteAddress) ? ctx.shm : 0;
+    return {
+      retCode: 1,
+      retMsg: "OK",
+      data: {
+        framing: conn.upgrade ? "binary" : "ascii",
+        shm: conn.shm > 0,
+      },
+    };
+  },
+};
+
+const _elapsed = (start) => {
+  // milliseconds since start, microsecond precision.
+  return Math.round(Number(process.hrtime.bigint() - start) / 1000) / 1000;
+};
+
+// requests in flight on a connection, by seq or "ordered" for the one frame
+// without seq being handled. each gets an AbortController, aborted by its
+// `deadline` (ms), a `cancel` frame or the connection closing; actions receive
+// the signal as ctx.signal and pass it to the puppeteer waits.
+const _track = (conn, jd) => {
+  let entry = {
+    key: jd.seq == undefined ? "ordered" : jd.seq,
+    controller: new AbortController(),
+    // Date.now() by which the request must be answered, 0 for no deadline.
+    at: jd.deadline > 0 ? Date.now() + jd.deadline : 0,
+    timer: null,
+    cancelled: false,
+  };
+  if (jd.deadline > 0) {
+    entry.timer = setTimeout(
+      () =>
+        entry.controller.abort(
+          new Error(`deadline exceeded: ${jd.deadline}ms`)
+        ),
+      jd.deadline
+    );
+  }
+  conn.pending.set(entry.key, entry);
+  return entry;
+};
+
+const _untrack = (conn, entry) => {
+  clearTimeout(entry.timer);
+  if (conn.pending.get(entry.key) === entry) conn.pending.delete(entry.key);
+};
+
+const _cancel = (conn, ctx) => {
+  let entry = conn.pending.get(ctx.seq == undefined ? "ordered" : ctx.seq);
+  if (entry) {
+    entry.cancelled = true;
+    entry.controller.abort(new Error("cancelled by client"));
+  }
+};
+
+const _abortable = (promise, signal) => {
+  // settles with promise, or rejects with the abort reason as soon as the
+  // signal fires, the abandoned promise can no longer reject unhandled.
+  return new Promise((resolve, reject) => {
+    const abort = () => reject(signal.reason);
+    if (signal.aborted) abort();
+    signal.addEventListener("abort", abort, { once: true });
+    promise.then(
+      (v) => {
+        signal.removeEventListener("abort", abort);
+        resolve(v);
+      },
+      (e) => {
+        signal.removeEventListener("abort", abort);
+        reject(e);
+      }
+    );
+  });
 };
 
-const handleEvent = async (socket, data) => {
-  logger.debug("recv: %s", data.toString());
+const _stopLoading = async (page) => {
+  let session = page.createCDPSession
+    ? await page.createCDPSession()
+    : await page.target().createCDPSession();
+  try {
+    await session.send("Page.stopLoading");
+  } finally {
+    await session.detach();
+  }
+};
+
+const _navigate = async (page, ctx, navigate) => {
+  // navigations take no signal: their timeout is capped at the request
+  // deadline, and an abort or that timeout stops the load instead of leaving
+  // it running in the tab to race the next action on the page.
+  let options = Object.assign({}, ctx.options);
+  let capped = false;
+  if (ctx.deadlineAt > 0) {
+    let left = Math.max(1, ctx.deadlineAt - Date.now());
+    capped = !(options.timeout > 0 && options.timeout < left);
+    if (capped) options.timeout = left;
+  }
+  if (ctx.signal && ctx.signal.aborted) throw ctx.signal.reason;
+
+  const stop = () => {
+    _stopLoading(page).catch((e) =>
+      logger.warn("stop loading: %s", e.message)
+    );
+  };
+  if (ctx.signal) ctx.signal.addEventListener("abort", stop, { once: true });
+  try {
+    return await navigate(options);
+  } catch (e) {
+    let aborted = ctx.signal && ctx.signal.aborted;
+    if (capped && e.name == "TimeoutError" && !aborted) {
+      // puppeteer's clock ran out first, it is the request deadline still.
+      e.deadline = true;
+      stop();
+    }
+    throw e;
+  } finally {
+    if (ctx.signal) ctx.signal.removeEventListener("abort", stop);
+  }
+};
+
+const handleEvent = async (conn, jd, size) => {
+  logger.debug("recv: %j", jd);
   let resp = null;
-  let jd = JSON.parse(data);
+  let start = process.hrtime.bigint();
+
+  if (SERVER_ACTIONS[jd.action]) {
+    try {
+      resp = await SERVER_ACTIONS[jd.action](conn, jd.ctx || {});
+    } catch (e) {
+      resp = {
+        retCode: -2,
+        retMsg: e.message,
+        data: {},
+      };
+      logger.error(e);
+    }
 
+    if (jd.seq != undefined) resp.seq = jd.seq;
+    resp.elapsed = _elapsed(start);
+    let sent = await _write(conn, resp);
+    METRICS.record(jd.action, resp.elapsed, size, sent, resp.retCode < 0);
+
+    if (conn.upgrade != undefined) {
+      conn.binary = conn.upgrade;
+      delete conn.upgrade;
+    }
+    return;
+  }
+
+  let entry = _track(conn, jd);
   try {
     let bp = BP_POOL[jd.id];
+    if (bp && jd.dispose) {
+      // handles released by client side garbage collection ride along with
+      // the next request instead of costing a round trip each.
+      bp.disposeHandles({ keys: jd.dispose });
+    }
     if (jd.action == "launch") {
       if (bp) {
         bp = BP_POOL[jd.id];
@@ -813,25 +1732,41 @@ const handleEvent = async (socket, data) => {
         },
       };
     } else {
-      resp = await bp[jd.action](jd.ctx);
+      let signal = entry.controller.signal;
+      jd.ctx.signal = signal;
+      jd.ctx.deadlineAt = entry.at;
+      if (jd.ctx.pageId != undefined) {
+        jd.ctx.pageIndex = await bp._pageIndex(jd.ctx.pageId);
+      }
+      // quit, disposeHandles and unsubscribe return plain values.
+      resp = await _abortable(
+        Promise.resolve(bp[jd.action](jd.ctx, conn)),
+        signal
+      );
       logger.debug(
-        `ElemCache size: ${
-          Object.entries(bp.elemCache).length
-        }, FrameCache size: ${Object.entries(bp.frameCache).length}`
+        `ElemCache size: ${bp.elemCache.size}, ` +
+          `FrameCache size: ${bp.frameCache.size}`
       );
     }
   } catch (e) {
-    resp = {
-      retCode: -2,
-      retMsg: e.message,
-      data: {},
-    };
-    logger.error(e);
+    if (entry.controller.signal.aborted || e.deadline) {
+      resp = {
+        retCode: -3,
+        retMsg: e.message,
+        data: {},
+      };
+      logger.warn("%s %s", jd.action, e.message);
+    } else {
+      resp = {
+        retCode: -2,
+        retMsg: e.message,
+        data: {},
+      };
+      logger.error(e);
+    }
   } finally {
+    _untrack(conn, entry);
     resetTimer(jd.id, _duration);
-    if (jd.action == "quit") {
-      clearTimeout(BP_TIMER[jd.id]);
-    }
 
     if (resp == null)
       resp = {
@@ -840,12 +1775,33 @@ const handleEvent = async (socket, data) => {
         data: {},
       };
 
-    _write(socket, resp);
+    if (jd.seq != undefined) resp.seq = jd.seq;
+    // time spent in the action itself, the client compares it with its
+    // round trip.
+    resp.elapsed = _elapsed(start);
+
+    let sent = 0;
+    // a client that cancelled a seq request stopped waiting for it, an
+    // ordered one is still answered to keep the stream in step.
+    if (!(entry.cancelled && jd.seq != undefined)) {
+      try {
+        sent = await _write(conn, resp);
+      } catch (e) {
+        logger.error(e);
+      }
+    }
+    METRICS.record(jd.action, resp.elapsed, size, sent, resp.retCode < 0);
   }
 };
 
 //main
-const args = process.argv.splice(2);
+// --name=value options may appear anywhere, the rest are positional.
+const options = {};
+const args = process.argv.splice(2).filter((arg) => {
+  let m = arg.match(/^--([\w-]+)=(.*)$/);
+  if (m) options[m[1]] = m[2];
+  return !m;
+});
 var _host = "0.0.0.0";
 var _port = 9999;
 var _logFile = null;
@@ -854,6 +1810,11 @@ var _logLevel = "OFF";
 const _maxConnections = 100;
 const _headerLength = 8;
 const _duration = 1800000;
+// per browser, least recently used handles are disposed beyond these.
+const _maxElemHandles = 10000;
+const _maxFrameHandles = 1000;
+const _shmDir = fs.existsSync("/dev/shm") ? "/dev/shm" : os.tmpdir();
+var _shmSeq = 0;
 
 if (!isNoneOrFalse(args)) {
   _host = args[0];
@@ -869,6 +1830,21 @@ if (!isNoneOrFalse(args)) {
 }
 
 logger = getLogger(_logLevel, _logFile);
+
+if (options["cache-dir"]) {
+  RESPONSE_CACHE = new ResponseCache(
+    options["cache-dir"],
+    parseInt(options["cache-size"] || 512 * 1024 * 1024),
+    parseInt(options["cache-ttl"] || 0),
+    logger
+  );
+  logger.info(
+    "response cache: %s, %d entries, %d bytes",
+    RESPONSE_CACHE.dir,
+    RESPONSE_CACHE.entries.size,
+    RESPONSE_CACHE.bytes
+  );
+}
 var server = net.createServer();
 
 server.maxConnections = _maxConnections;
@@ -885,30 +1861,86 @@ server.on("listening", function () {
     _logLevel,
     _logFile
   );
+  // --ready-fd: the supervisor waits on this pipe instead of polling the port.
+  if (options["ready-fd"]) {
+    let fd = parseInt(options["ready-fd"]);
+    fs.writeSync(fd, `ready ${process.pid} ${server.address().port}\n`);
+    fs.closeSync(fd);
+  }
+});
+
+server.on("error", function (e) {
+  logger.error("server error: %s", e);
+  process.exit(1);
 });
 
 server.on("connection", async (socket) => {
   logger.info(
     "client connected: " + socket.remoteAddress + ":" + socket.remotePort
   );
-  socket.setEncoding("utf8");
 
-  let recv = "";
-  let msgLen = 0;
+  let conn = {
+    socket: socket,
+    binary: false,
+    shm: 0,
+    files: new Set(),
+    subs: new Map(),
+    pending: new Map(),
+  };
+  let recv = Buffer.alloc(0);
+  // frames without `seq` are answered strictly in order, frames with `seq`
+  // run concurrently and may be answered out of order.
+  let ordered = Promise.resolve();
+
+  socket.on("data", (data) => {
+    recv = recv.length == 0 ? data : Buffer.concat([recv, data]);
+
+    while (recv.length >= _headerLength) {
+      let head = recv.subarray(0, _headerLength);
+      let msgLen = _bodySize(head, conn.binary);
+      if (isNaN(msgLen)) {
+        logger.error("bad frame header, close connection.");
+        socket.destroy();
+        return;
+      }
+      if (recv.length < _headerLength + msgLen) break;
+
+      let size = _headerLength + msgLen;
+      let body = recv.subarray(_headerLength, _headerLength + msgLen);
+      recv = recv.subarray(_headerLength + msgLen);
+
+      let jd = null;
+      try {
+        jd = _decode(head, body, conn.binary);
+      } catch (e) {
+        logger.error(e);
+        socket.destroy();
+        return;
+      }
 
-  socket.on("data", async (data) => {
-    //logger.debug(typeof data);
-    if (msgLen == 0) {
-      msgLen = parseInt(data.substring(0, _headerLength));
-      recv += data.substring(_headerLength, data.length);
-    } else {
-      recv += data;
+      if (jd.action == "cancel") {
+        // never queued behind the request it cancels, never answered.
+        _cancel(conn, jd.ctx || {});
+      } else if (jd.seq == undefined) {
+        ordered = ordered.then(() => handleEvent(conn, jd, size));
+      } else {
+        handleEvent(conn, jd, size);
+      }
+    }
+  });
+
+  socket.on("close", function () {
+    for (let f of conn.files) {
+      fs.unlink(f, () => {});
     }
+    conn.files.clear();
+
+    for (let unsubscribe of conn.subs.values()) unsubscribe();
+    conn.subs.clear();
 
-    if (recv.length == msgLen) {
-      await handleEvent(socket, recv);
-      recv = "";
-      msgLen = 0;
+    for (let entry of conn.pending.values()) {
+      entry.cancelled = true;
+      entry.controller.abort(new Error("connection closed"));
     }
   });
 
@@ -927,3 +1959,6 @@ server.on("connection", async (socket) => {
     logger.warn("socket timeout");
   });
 });
+
+// for tests/js/handle_event.js, which drives requests without a socket.
+module.exports = { handleEvent: handleEvent, BP_POOL: BP_POOL };
@@ -86,4 +86,33 @@ module.exports.mkdirsSync = (dirname) => {
   }
 };
 
+module.exports.decodeBytes = (val) => {
+  // client payload: Buffer in binary framing, base64 string in ascii framing.
+  if (isNoneOrFalse(val)) return val;
+  if (Buffer.isBuffer(val)) return val.toString();
+  return Buffer.from(val, "base64").toString();
+};
+
+module.exports.toBuffer = (val) => {
+  // newer puppeteer returns Uint8Array for screenshots and pdfs.
+  if (isNoneOrFalse(val) || Buffer.isBuffer(val)) return val;
+  return Buffer.from(val.buffer, val.byteOffset, val.byteLength);
+};
+
+module.exports.toBytes = (val) => {
+  // client payload kept as bytes: Buffer in binary framing, base64 string in
+  // ascii framing.
+  if (isNoneOrFalse(val) || Buffer.isBuffer(val)) return val;
+  return Buffer.from(val, "base64");
+};
+
+module.exports.urlMatcher = (url) => {
+  // url => {pattern, regex, flags}, a plain pattern matches as a substring.
+  if (url.regex) {
+    let re = new RegExp(url.pattern, url.flags || "");
+    return (u) => re.test(u);
+  }
+  return (u) => u.indexOf(url.pattern) >= 0;
+};
+
 module.exports.isNoneOrFalse = isNoneOrFalse;
@@ -2,18 +2,32 @@
 # @Time    : 2024/4/15 上午11:12 上午11:12
 # @Author  : Zr
 # @Comment :
+import atexit
+import hashlib
+import json
 import logging
 import os
+import select
+import shutil
 import subprocess
+import time
+import weakref
 from logging import CRITICAL, FATAL, ERROR, WARNING, WARN, INFO, DEBUG, NOTSET
 from .log import getFileLogger
 
+# environment checks passed for this key are not run again, see LocalPPTRSMgr._check_env.
+_STATE_FILE = '.pptrc-env.json'
+
 
 def _cmd(cmd, args=None, cwd=None):
-    if type(args) is list:
-        args = ' '.join(args)
+    '''
+    cmd: executable name, resolved on PATH (npm is npm.cmd on windows), no shell involved.
+    '''
+    exe = shutil.which(cmd)
+    if exe is None:
+        return 127, '', f'{cmd} not found'
 
-    ret = subprocess.run(f"{cmd} {args or ''}", cwd=cwd, shell=True, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+    ret = subprocess.run([exe] + list(args or []), cwd=cwd, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
 
     stdout = ret.stdout.decode('utf8', errors='ignore')
     stderr = ret.stderr.decode('utf8', errors='ignore')
@@ -21,57 +35,146 @@ def _cmd(cmd, args=None, cwd=None):
     return ret.returncode, stdout, stderr
 
 
+def _file_key(path):
+    if not path:
+        return None
+    st = os.stat(path)
+    return [path, st.st_size, st.st_mtime_ns]
+
+
+def _stop_all(ref):
+    mgr = ref()
+    if mgr is not None:
+        mgr._stop_processes(list(mgr._procs))
+
+
 class LocalPPTRSMgr():
-    def __init__(self, host='0.0.0.0', port=9999, log_level="debug", log_file=None):
+    def __init__(self, host='0.0.0.0', port=9999, log_level="debug", log_file=None, workers=1, cache_dir=None,
+                 cache_size=512 * 1024 * 1024, cache_ttl=0, supervisor='pm2', ready_timeout=30):
+        '''
+        workers: number of stub.js processes, listening on port, port + 1, ... port + workers - 1.
+                 each worker is its own node event loop, route browsers to them with
+                 pptrc.WorkerRouter(mgr.workers()).
+        cache_dir: directory of the http response cache, off when None, see Page.useResponseCache.
+                   workers may share it, each keeps its own index and size count.
+        cache_size: bytes, least recently used responses are removed beyond it.
+        cache_ttl: seconds to keep responses that carry no max-age/Expires, 0 to skip them.
+        supervisor: 'pm2', workers are pm2 apps and outlive this process.
+                    'process' (posix), workers are node children of this process started without pm2 or a shell,
+                    start() returns once each one is listening, they are stopped at exit.
+        ready_timeout: seconds start() waits for a 'process' worker to listen.
+        '''
+        if supervisor not in ('pm2', 'process'):
+            raise ValueError(f'unknown supervisor: {supervisor}')
+        if supervisor == 'process' and os.name != 'posix':
+            # the ready pipe is handed over with pass_fds and waited on with select.
+            raise ValueError("supervisor='process' needs a posix system, use supervisor='pm2'")
 
         self._pptrs_path = os.path.join(os.path.dirname(__file__), 'js')
         self._port = port
+        self._workers = workers
         self._host = host
         self._script = 'stub.js'
         self._log_file = log_file
+        self._cache_dir = cache_dir
+        self._cache_size = cache_size
+        self._cache_ttl = cache_ttl
+        self._supervisor = supervisor
+        self._ready_timeout = ready_timeout
+        self._procs = {}
         self._logger = getFileLogger(file=self._log_file, level=log_level)
 
         if not os.path.exists(self._pptrs_path):
             raise RuntimeError(f'pptrc server[javascript] not foud in {os.getcwd()}')
 
-        returncode, stdout, stderr = _cmd("node -v")
-        if returncode != 0:
+        self._node = shutil.which('node')
+        if self._node is None:
             raise RuntimeError('node not found in system.')
 
-        returncode, stdout, stderr = _cmd("pm2 -v")
+        self._check_env()
+
+        if supervisor == 'process':
+            atexit.register(_stop_all, weakref.ref(self))
+
+    def _env_key(self):
+        '''
+        node and pm2 binaries by path, size and mtime, package.json by content:
+        an upgrade of any of them runs the checks again.
+        '''
+        with open(os.path.join(self._pptrs_path, 'package.json'), 'rb') as f:
+            package = hashlib.sha1(f.read()).hexdigest()
+
+        return {
+            'node': _file_key(self._node),
+            'pm2': _file_key(shutil.which('pm2')) if self._supervisor == 'pm2' else None,
+            'package': package
+        }
+
+    def _check_env(self):
+        '''
+        node -v, pm2 -v and npm i only when the state file was written for another key,
+        or node_modules went missing.
+        '''
+        state_file = os.path.join(self._pptrs_path, _STATE_FILE)
+        _node_modules_path = os.path.join(self._pptrs_path, 'node_modules')
+        key = self._env_key()
+        try:
+            with open(state_file, encoding='utf-8') as f:
+                state = json.load(f)
+        except (OSError, ValueError):
+            state = {}
+
+        if state.get('key') == key and os.path.exists(_node_modules_path):
+            return
+
+        returncode, stdout, stderr = _cmd("node", ["-v"])
         if returncode != 0:
-            self._logger.info('pm2 not found in system.\ninstalling pm2...')
-            returncode, stdout, stderr = _cmd("npm i -g pm2")
+            raise RuntimeError('node not found in system.')
+        state['node'] = stdout.strip()
+
+        if self._supervisor == 'pm2':
+            returncode, stdout, stderr = _cmd("pm2", ["-v"])
             if returncode != 0:
-                raise RuntimeError('npm install pm2 failed, pls install manual by: npm i -g pm2')
+                self._logger.info('pm2 not found in system.\ninstalling pm2...')
+                returncode, stdout, stderr = _cmd("npm", ["i", "-g", "pm2"])
+                if returncode != 0:
+                    raise RuntimeError('npm install pm2 failed, pls install manual by: npm i -g pm2')
+                key = self._env_key()
 
         # install
-        _node_modules_path = os.path.join(self._pptrs_path, 'node_modules')
         if not os.path.exists(_node_modules_path):
             self._logger.info('node_modules not found, installing js packages...')
-            returncode, stdout, stderr = _cmd("npm i", cwd=self._pptrs_path)
+            returncode, stdout, stderr = _cmd("npm", ["i"], cwd=self._pptrs_path)
             if returncode != 0:
-                os.removedirs(_node_modules_path)
+                shutil.rmtree(_node_modules_path, ignore_errors=True)
                 raise RuntimeError('npm install failed.')
 
-    def _pm2_run(self, action, name, script=None, args=None, cwd=None, log_file=None):
-        if args:
-            if type(args) is list:
-                args = ' '.join(args)
-
-            args = f' -- {args}'
+        state['key'] = key
+        try:
+            with open(state_file, 'w', encoding='utf-8') as f:
+                json.dump(state, f)
+        except OSError:
+            self._logger.warning(f'can not write {state_file}, environment checks run on every start.')
 
+    def _pm2_run(self, action, name, script=None, args=None, cwd=None, log_file=None):
+        cmd = [action]
         if action == 'start':
-            name = f'-n {name}'
+            cmd += ['-n', name]
+        else:
+            cmd.append(name)
 
         if log_file:
-            log_file = f'-l {log_file}'
+            cmd += ['-l', log_file]
+
+        if script:
+            cmd.append(script)
 
-        cmd = f"pm2 {action} {name} {log_file or ''} {script or ''} {args or ''}"
+        if args:
+            cmd += ['--'] + list(args)
 
-        returncode, stdout, stderr = _cmd(cmd, cwd=cwd)
+        returncode, stdout, stderr = _cmd('pm2', cmd, cwd=cwd)
 
-        self._logger.debug(f"\n\n>>>>>{cmd}")
+        self._logger.debug(f"\n\n>>>>>pm2 {' '.join(cmd)}")
 
         if stdout.strip('\n'):
             self._logger.debug(f'\n\n>>>>>{stdout}')
@@ -81,10 +184,22 @@ class LocalPPTRSMgr():
 
         return returncode, stdout, stderr
 
-    def start(self, id=None):
-        if not id:
-            id = f'{self._port}'
-
+    def _ids(self, id=None):
+        '''
+        [(pm2 name, port), ...], a worker is named after its port unless id is given.
+        '''
+        if id:
+            return [(id, self._port)]
+        return [(f'{self._port + i}', self._port + i) for i in range(self._workers)]
+
+    def workers(self):
+        '''
+        [(host, port), ...] of every worker, host as seen from this machine.
+        '''
+        host = '127.0.0.1' if self._host in ('0.0.0.0', '') else self._host
+        return [(host, self._port + i) for i in range(self._workers)]
+
+    def _log_level_name(self):
         if self._logger.level in [logging.CRITICAL, logging.FATAL]:
             _log_level = 'FATAL'
         elif self._logger.level in [logging.WARNING, logging.WARN]:
@@ -100,42 +215,158 @@ class LocalPPTRSMgr():
         else:
             _log_level = 'DEBUG'
 
-        _args = [self._host, str(self._port), _log_level]
+        return _log_level
+
+    def _args(self, port):
+        _args = [self._host, str(port), self._log_level_name()]
         if self._log_file:
             _args.append(self._log_file)
+        if self._cache_dir:
+            _args += [f'--cache-dir={os.path.abspath(self._cache_dir)}', f'--cache-size={self._cache_size}',
+                      f'--cache-ttl={self._cache_ttl}']
+        return _args
 
+    def _start(self, id, port):
         return \
-            self._pm2_run('start', name=id, script=self._script, args=_args,
+            self._pm2_run('start', name=id, script=self._script, args=self._args(port),
                           cwd=self._pptrs_path)[
                 0]
 
+    def _spawn(self, id, port):
+        '''
+        node stub.js as a child, it writes a line to the ready pipe once listening and
+        exits if it can not listen, so the read end sees either the line or eof.
+        '''
+        r, w = os.pipe()
+        # the console output goes where pm2 would log it: the log file, written by stub.js itself.
+        out = subprocess.DEVNULL if self._log_file else None
+        try:
+            proc = subprocess.Popen([self._node, self._script] + self._args(port) + [f'--ready-fd={w}'],
+                                    cwd=self._pptrs_path, stdin=subprocess.DEVNULL, stdout=out, stderr=out,
+                                    pass_fds=(w,))
+        except Exception:
+            os.close(r)
+            raise
+        finally:
+            os.close(w)
+
+        self._procs[id] = proc
+        self._logger.debug(f'started {id} on port {port}, pid {proc.pid}')
+        return r
+
+    def _wait_ready(self, pipes):
+        '''
+        pipes: {read fd: id}, all workers start together and are waited on together.
+        returns the ids that did not become ready.
+        '''
+        deadline = time.time() + self._ready_timeout
+        pending = dict(pipes)
+        failed = []
+        try:
+            while pending:
+                timeout = deadline - time.time()
+                readable = select.select(list(pending), [], [], max(timeout, 0))[0] if timeout > 0 else []
+                if not readable:
+                    break
+                for fd in readable:
+                    line = os.read(fd, 256)
+                    id = pending.pop(fd)
+                    os.close(fd)
+                    if line.startswith(b'ready'):
+                        self._logger.debug(f'{id} ready: {line.decode().strip()}')
+                    else:
+                        failed.append(id)
+        finally:
+            for fd, id in pending.items():
+                os.close(fd)
+                failed.append(id)
+
+        return failed
+
+    def _stop_processes(self, ids):
+        for _id in ids:
+            proc = self._procs.pop(_id, None)
+            if proc is None or proc.poll() is not None:
+                continue
+            proc.terminate()
+            try:
+                proc.wait(5)
+            except subprocess.TimeoutExpired:
+                proc.kill()
+                proc.wait()
+
+    def _alive(self, id):
+        proc = self._procs.get(id)
+        return proc is not None and proc.poll() is None
+
+    def _start_processes(self, ids):
+        pipes = {}
+        for _id, _port in ids:
+            if not self._alive(_id):
+                pipes[self._spawn(_id, _port)] = _id
+
+        failed = self._wait_ready(pipes)
+        for _id in failed:
+            try:
+                code = self._procs[_id].wait(1)
+            except subprocess.TimeoutExpired:
+                code = None
+            self._logger.error(f'{_id} not ready in {self._ready_timeout}s' if code is None
+                               else f'{_id} exited with {code} before listening')
+        self._stop_processes(failed)
+
+        return 1 if failed else 0
+
+    def start(self, id=None):
+        if self._supervisor == 'process':
+            return self._start_processes(self._ids(id))
+
+        returncode = 0
+        for _id, _port in self._ids(id):
+            returncode = self._start(_id, _port) or returncode
+
+        return returncode
+
     def stop(self, id=None):
-        if not id:
-            id = f'{self._port}'
+        if self._supervisor == 'process':
+            self._stop_processes([_id for _id, _port in self._ids(id)])
+            return 0
 
-        return self._pm2_run('stop', name=id, cwd=self._pptrs_path)[0]
+        returncode = 0
+        for _id, _port in self._ids(id):
+            returncode = self._pm2_run('stop', name=_id, cwd=self._pptrs_path)[0] or returncode
+        return returncode
 
     def delete(self, id=None):
-        if not id:
-            id = f'{self._port}'
-        return self._pm2_run('delete', name=id, cwd=self._pptrs_path)[0]
+        if self._supervisor == 'process':
+            return self.stop(id)
 
-    def restart(self, id=None):
-        if not id:
-            id = f'{self._port}'
+        returncode = 0
+        for _id, _port in self._ids(id):
+            returncode = self._pm2_run('delete', name=_id, cwd=self._pptrs_path)[0] or returncode
+        return returncode
 
-        if not self.exists(id):
+    def restart(self, id=None):
+        if self._supervisor == 'process':
+            self.stop(id)
             return self.start(id)
 
-        return self._pm2_run('restart', name=id, cwd=self._pptrs_path)[0]
+        returncode = 0
+        for _id, _port in self._ids(id):
+            if not self.exists(_id):
+                returncode = self._start(_id, _port) or returncode
+            else:
+                returncode = self._pm2_run('restart', name=_id, cwd=self._pptrs_path)[0] or returncode
+        return returncode
 
     def exists(self, id=None):
-        if not id:
-            id = f'{self._port}'
+        if self._supervisor == 'process':
+            return all(self._alive(_id) for _id, _port in self._ids(id))
 
-        returncode, stdout, stderr = self._pm2_run('pid', name=id, cwd=self._pptrs_path)
-        stdout = stdout.strip('\n')
-        if not stdout:
-            return False
-        else:
-            return True
+        for _id, _port in self._ids(id):
+            returncode, stdout, stderr = self._pm2_run('pid', name=_id, cwd=self._pptrs_path)
+            stdout = stdout.strip('\n')
+            if not stdout:
+                return False
+
+        return True
@@ -1,10 +1,17 @@
 # -*- encoding: utf-8 -*-
 
 __all__ = [
-    'getFileLogger', 'getLogger'
+    'getFileLogger', 'getLogger', 'configure', 'flush', 'dropped', 'sampled', 'RpcMessage', 'JsonFormatter'
 ]
 
+import atexit
+import json
 import logging
+import os
+import queue
+import random
+import threading
+import time
 from logging.handlers import TimedRotatingFileHandler
 
 _formatter = logging.Formatter(
@@ -25,27 +32,267 @@ _nameToLevel = {
     'NOTSET': logging.NOTSET,
 }
 
+# loggers are named, never the root one: pptrc must not reconfigure the application's logging.
+_DEFAULT_NAME = 'pptrc'
+
+_options = {
+    'sample': 1.0,
+    'max_field': 256,
+    'max_items': 20
+}
+# one handler per file, shared by every logger writing to it.
+_fhandlers = {}
+_lock = threading.Lock()
+
+
+class _Pipeline():
+    '''
+    records go into a bounded queue and are formatted and written by one daemon
+    thread, callers never wait for the console or the disk. a full queue drops the
+    record and counts it instead of blocking.
+    '''
+
+    def __init__(self, maxsize=10000):
+        self.queue = queue.Queue(maxsize)
+        self.dropped = 0
+        self._thread = None
+
+    def submit(self, sinks, record):
+        if self._thread is None:
+            self._start()
+        try:
+            self.queue.put_nowait((sinks, record))
+        except queue.Full:
+            self.dropped += 1
+
+    def _start(self):
+        with _lock:
+            if self._thread is None:
+                t = threading.Thread(target=self._run, name='pptrc-log')
+                t.daemon = True
+                t.start()
+                self._thread = t
+
+    def _run(self):
+        while True:
+            sinks, record = self.queue.get()
+            try:
+                for h in sinks:
+                    if record.levelno >= h.level:
+                        h.handle(record)
+            except Exception:
+                pass
+            finally:
+                self.queue.task_done()
+
+    def flush(self, timeout=5):
+        deadline = time.time() + timeout
+        while self.queue.unfinished_tasks and time.time() < deadline:
+            time.sleep(0.005)
+        for h in [_chandler] + list(_fhandlers.values()):
+            try:
+                h.flush()
+            except (OSError, ValueError):
+                # the stream may be closed already at exit, as logging.shutdown allows.
+                pass
+
+
+_pipeline = _Pipeline()
 
-def getFileLogger(name=None, file=None, level='DEBUG'):
-    level = _nameToLevel[level.upper()]
-    _fhandler = TimedRotatingFileHandler(file, when='midnight', backupCount=10, encoding="utf-8")
-    _fhandler.suffix = "%Y-%m-%d"
-    _fhandler.setFormatter(_formatter)
 
-    logger = logging.getLogger(name)
-    logger.handlers.clear()
+class _QueueingHandler(logging.Handler):
+    '''
+    the only handler attached to a pptrc logger, hands records to the pipeline
+    together with the sinks they go to. nothing is formatted on the calling thread.
+    '''
 
-    logger.setLevel(level)
-    logger.addHandler(_fhandler)
-    logger.addHandler(_chandler)
+    def __init__(self):
+        super(_QueueingHandler, self).__init__()
+        self.sinks = ()
+
+    def handle(self, record):
+        _pipeline.submit(self.sinks, record)
+        return True
+
+    def emit(self, record):
+        _pipeline.submit(self.sinks, record)
+
+
+def _queueing_handler(logger):
+    for h in logger.handlers:
+        if isinstance(h, _QueueingHandler):
+            return h
+
+    # handlers and propagation set by the application are left as they are.
+    h = _QueueingHandler()
+    logger.addHandler(h)
+    return h
+
+
+def _file_handler(file):
+    path = os.path.abspath(file)
+    with _lock:
+        h = _fhandlers.get(path)
+        if h is None:
+            h = TimedRotatingFileHandler(path, when='midnight', backupCount=10, encoding="utf-8")
+            h.suffix = "%Y-%m-%d"
+            h.setFormatter(_chandler.formatter)
+            _fhandlers[path] = h
+    return h
+
+
+def _set_level(logger, level):
+    # None keeps the level the application gave the logger, WARNING through root by default.
+    if level is not None:
+        logger.setLevel(_nameToLevel[level.upper()])
+
+
+def getFileLogger(name=None, file=None, level='DEBUG'):
+    '''
+    console and file, file=None for console only. calling it again for the same
+    name replaces the sinks instead of adding more.
+    '''
+    logger = logging.getLogger(name or _DEFAULT_NAME)
+    _set_level(logger, level)
+    h = _queueing_handler(logger)
+    h.sinks = (_file_handler(file), _chandler) if file else (_chandler,)
 
     return logger
 
 
 def getLogger(name=None, level='DEBUG'):
-    level = _nameToLevel[level.upper()]
-    logger = logging.getLogger(name)
-    logger.setLevel(level)
-    logger.addHandler(_chandler)
+    '''
+    console, file sinks set earlier by getFileLogger for the same name are kept.
+    '''
+    logger = logging.getLogger(name or _DEFAULT_NAME)
+    _set_level(logger, level)
+    h = _queueing_handler(logger)
+    if _chandler not in h.sinks:
+        h.sinks = h.sinks + (_chandler,)
 
     return logger
+
+
+def configure(format=None, sample=None, max_field=None, max_items=None, queue_size=None):
+    '''
+    format: 'text' or 'json' (one object per line) for the console and every file.
+    sample: 0..1, share of requests whose send/recv records are logged at debug level.
+    max_field: characters kept of a string value in a request record, bytes become `<n bytes>`.
+    max_items: items kept of a list in a request record.
+    queue_size: records waiting for the log thread before new ones are dropped.
+    '''
+    if format is not None:
+        formatter = JsonFormatter() if format == 'json' else _formatter
+        _chandler.setFormatter(formatter)
+        for h in _fhandlers.values():
+            h.setFormatter(formatter)
+    if sample is not None:
+        _options['sample'] = sample
+    if max_field is not None:
+        _options['max_field'] = max_field
+    if max_items is not None:
+        _options['max_items'] = max_items
+    if queue_size is not None:
+        _pipeline.queue.maxsize = queue_size
+
+
+def flush(timeout=5):
+    '''
+    wait until the records queued so far are written.
+    '''
+    _pipeline.flush(timeout)
+
+
+def dropped():
+    '''
+    records dropped because the queue was full.
+    '''
+    return _pipeline.dropped
+
+
+def sampled():
+    '''
+    whether the next request is logged, drawn once for its send and recv records.
+    '''
+    rate = _options['sample']
+    return rate >= 1 or random.random() < rate
+
+
+def _truncate(v, max_field, max_items):
+    if isinstance(v, dict):
+        return {k: _truncate(x, max_field, max_items) for k, x in v.items()}
+    if isinstance(v, (list, tuple)):
+        out = [_truncate(x, max_field, max_items) for x in v[:max_items]]
+        if len(v) > max_items:
+            out.append('...(+%d items)' % (len(v) - max_items))
+        return out
+    if isinstance(v, (bytes, bytearray, memoryview)):
+        return '<%d bytes>' % len(v)
+    if isinstance(v, str) and len(v) > max_field:
+        return v[:max_field] + '...(+%d chars)' % (len(v) - max_field)
+    return v
+
+
+class RpcMessage():
+    '''
+    one request or response, rendered only when the log thread writes it:
+    compact json, long strings and lists cut, payload bytes replaced by their size.
+    the top level is copied on the calling thread, `seq`/`deadline` set on the request
+    afterwards do not show up, nested values must not be changed after it is logged.
+    '''
+    __slots__ = ('direction', 'message')
+
+    def __init__(self, direction, message):
+        self.direction = direction
+        self.message = dict(message)
+
+    def fields(self):
+        m = self.message
+        ctx = m.get('ctx') or {}
+        out = {'direction': self.direction}
+        for k, v in (('action', m.get('action')), ('id', m.get('id')), ('pageIndex', ctx.get('pageIndex')),
+                     ('seq', m.get('seq')), ('retCode', m.get('retCode')), ('elapsed', m.get('elapsed'))):
+            if v is not None:
+                out[k] = v
+        return out
+
+    def payload(self):
+        return _truncate(self.message, _options['max_field'], _options['max_items'])
+
+    def __str__(self):
+        try:
+            return '%s %s' % (self.direction, json.dumps(self.payload(), ensure_ascii=False, default=str))
+        except Exception as e:
+            return '%s <unprintable: %s>' % (self.direction, e)
+
+
+class JsonFormatter(logging.Formatter):
+    '''
+    one json object per record: time, level, logger, thread, location and message,
+    request records add their action, ids and truncated payload as fields.
+    '''
+
+    def format(self, record):
+        out = {
+            'time': self.formatTime(record, "%Y-%m-%d %H:%M:%S") + '.%03d' % record.msecs,
+            'level': record.levelname,
+            'logger': record.name,
+            'thread': record.thread,
+            'where': '%s:%d' % (record.filename, record.lineno),
+        }
+        rpc = record.args[0] if isinstance(record.args, tuple) and len(record.args) == 1 else None
+        if isinstance(rpc, RpcMessage):
+            out.update(rpc.fields())
+            out['payload'] = rpc.payload()
+        else:
+            out['message'] = record.getMessage()
+        if record.exc_info:
+            out['exc'] = self.formatException(record.exc_info)
+        return json.dumps(out, ensure_ascii=False, default=str)
+
+
+@atexit.register
+def _close():
+    _pipeline.flush(2)
+    for h in list(_fhandlers.values()):
+        h.close()
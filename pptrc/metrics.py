@@ -0,0 +1,193 @@
+# -*- coding: utf-8 -*-
+# @Time    : 2026/10/18 下午7:40
+# @Author  : Zr
+# @Comment : per-action rpc metrics and a prometheus text exporter
+
+import bisect
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+__all__ = [
+    'Histogram', 'Metrics', 'default_metrics', 'prometheus_text', 'start_exporter'
+]
+
+# milliseconds, upper bounds of the latency buckets, +Inf is implied.
+BUCKETS = (1, 2.5, 5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000, 10000, 30000, 60000)
+
+
+class Histogram():
+    def __init__(self, buckets=BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, v):
+        self.counts[bisect.bisect_left(self.buckets, v)] += 1
+        self.sum += v
+        self.count += 1
+
+    def quantile(self, q):
+        '''
+        estimated from the buckets, linear inside the bucket holding the rank.
+        '''
+        if self.count == 0:
+            return None
+
+        rank = q * self.count
+        seen = 0
+        for i, n in enumerate(self.counts):
+            if seen + n >= rank and n > 0:
+                lower = self.buckets[i - 1] if i > 0 else 0
+                upper = self.buckets[i] if i < len(self.buckets) else self.buckets[-1]
+                return lower + (upper - lower) * (rank - seen) / n
+            seen += n
+        return self.buckets[-1]
+
+    def snapshot(self):
+        return {
+            'count': self.count,
+            'sum': self.sum,
+            'avg': self.sum / self.count if self.count else None,
+            'p50': self.quantile(0.5),
+            'p90': self.quantile(0.9),
+            'p99': self.quantile(0.99),
+            'buckets': dict(zip([str(b) for b in self.buckets] + ['+Inf'], self.counts))
+        }
+
+
+class _Action():
+    def __init__(self):
+        self.count = 0
+        self.errors = 0
+        self.sent_bytes = 0
+        self.recv_bytes = 0
+        self.client = Histogram()
+        self.server = Histogram()
+
+
+class Metrics():
+    '''
+    per-action counts, errors, request/response bytes and latency histograms in
+    milliseconds: `client` from before the request is packed until the response is
+    decoded, `server` as measured by pptrs around the action itself. the gap between
+    them is socket, framing and json time.
+    '''
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._actions = {}
+
+    def record(self, action, client_ms, server_ms=None, sent=0, recv=0, error=False):
+        with self._lock:
+            a = self._actions.get(action)
+            if a is None:
+                a = self._actions[action] = _Action()
+            a.count += 1
+            a.sent_bytes += sent
+            a.recv_bytes += recv
+            a.client.observe(client_ms)
+            if server_ms is not None:
+                a.server.observe(server_ms)
+            if error:
+                a.errors += 1
+
+    def reset(self):
+        with self._lock:
+            self._actions.clear()
+
+    def snapshot(self):
+        '''
+        {action: {count, errors, sent_bytes, recv_bytes, client{...}, server{...}}}
+        '''
+        with self._lock:
+            return {
+                name: {
+                    'count': a.count,
+                    'errors': a.errors,
+                    'sent_bytes': a.sent_bytes,
+                    'recv_bytes': a.recv_bytes,
+                    'client': a.client.snapshot(),
+                    'server': a.server.snapshot()
+                } for name, a in self._actions.items()
+            }
+
+
+_default_metrics = Metrics()
+
+
+def default_metrics():
+    '''
+    process wide registry every Browser records into unless given its own.
+    '''
+    return _default_metrics
+
+
+def _label(v):
+    return str(v).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def prometheus_text(snapshot=None, prefix='pptrc'):
+    '''
+    prometheus text exposition of a Metrics.snapshot(), latencies in seconds.
+    '''
+    if snapshot is None:
+        snapshot = default_metrics().snapshot()
+
+    lines = []
+
+    def counter(name, help, key):
+        lines.append('# HELP %s_%s %s' % (prefix, name, help))
+        lines.append('# TYPE %s_%s counter' % (prefix, name))
+        for action, m in sorted(snapshot.items()):
+            lines.append('%s_%s{action="%s"} %s' % (prefix, name, _label(action), m[key]))
+
+    def histogram(name, help, key):
+        lines.append('# HELP %s_%s %s' % (prefix, name, help))
+        lines.append('# TYPE %s_%s histogram' % (prefix, name))
+        for action, m in sorted(snapshot.items()):
+            h = m[key]
+            total = 0
+            for le, n in h['buckets'].items():
+                total += n
+                le = le if le == '+Inf' else repr(float(le) / 1000)
+                lines.append('%s_%s_bucket{action="%s",le="%s"} %d' % (prefix, name, _label(action), le, total))
+            lines.append('%s_%s_sum{action="%s"} %r' % (prefix, name, _label(action), h['sum'] / 1000))
+            lines.append('%s_%s_count{action="%s"} %d' % (prefix, name, _label(action), h['count']))
+
+    counter('requests_total', 'Requests sent to pptrs.', 'count')
+    counter('errors_total', 'Requests that failed or returned a negative retCode.', 'errors')
+    counter('request_bytes_total', 'Bytes of request frames.', 'sent_bytes')
+    counter('response_bytes_total', 'Bytes of response frames.', 'recv_bytes')
+    histogram('client_latency_seconds', 'Round trip as seen by the client.', 'client')
+    histogram('server_latency_seconds', 'Action execution time inside pptrs.', 'server')
+    return '\n'.join(lines) + '\n'
+
+
+def start_exporter(port=9464, host='0.0.0.0', metrics=None, prefix='pptrc'):
+    '''
+    serve prometheus_text on http://host:port/metrics from a daemon thread,
+    returns the server, stop it with server.shutdown().
+    '''
+    metrics = metrics or default_metrics()
+
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            if self.path.split('?')[0] not in ('/', '/metrics'):
+                self.send_error(404)
+                return
+            body = prometheus_text(metrics.snapshot(), prefix=prefix).encode('utf-8')
+            self.send_response(200)
+            self.send_header('Content-Type', 'text/plain; version=0.0.4; charset=utf-8')
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format, *args):
+            pass
+
+    server = ThreadingHTTPServer((host, port), Handler)
+    t = threading.Thread(target=server.serve_forever, name='pptrc-metrics-exporter')
+    t.daemon = True
+    t.start()
+    return server
@@ -0,0 +1,451 @@
+# -*- coding: utf-8 -*-
+# @Time    : 2026/10/18 下午2:10
+# @Author  : Zr
+# @Comment : pooled resources shared across Browser objects
+
+import logging
+import queue
+import threading
+import time
+import traceback
+from contextlib import contextmanager
+from .connection import Connection
+
+__all__ = [
+    'ConnectionPool', 'default_pool', 'BrowserPool', 'PagePool'
+]
+
+logger = logging.getLogger('pptrc')
+
+
+class ConnectionPool():
+    '''
+    connections to pptrs keyed by host, port and connection options, borrowed per
+    request by Browser objects:
+        pool = ConnectionPool(max_size=4)
+        b1 = Browser(pool=pool)
+        b2 = Browser(pool=pool)
+
+    max_size: connections per key.
+    max_inflight: requests a multiplexed connection carries before another one is opened.
+    idle_timeout: seconds, idle connections are closed by a reaper thread, unless
+                  a Page.subscribe is still listening on them.
+    '''
+
+    def __init__(self, max_size=4, max_inflight=32, idle_timeout=300, reap_interval=30):
+        self.max_size = max_size
+        self.max_inflight = max_inflight
+        self.idle_timeout = idle_timeout
+        self.reap_interval = reap_interval
+        self._lock = threading.Lock()
+        # notified whenever a connection being opened lands or fails.
+        self._opened = threading.Condition(self._lock)
+        self._conns = {}
+        self._opening = {}
+        self._reaper = None
+        self._closed = False
+        self._stop = threading.Event()
+
+    def get(self, host, port, multiplex=False, binary=False, shm_threshold=None, logger=None, timeout=None):
+        '''
+        timeout: seconds to wait for a connection, including connecting a new one.
+        '''
+        key = (host, port, multiplex, binary, shm_threshold)
+        deadline = None if timeout is None else time.time() + timeout
+        with self._lock:
+            while True:
+                if self._closed:
+                    raise Exception('ConnectionPool is closed')
+
+                conns = self._conns.setdefault(key, [])
+                for c in [c for c in conns if not c.alive()]:
+                    conns.remove(c)
+                    c.close()
+
+                full = len(conns) + self._opening.get(key, 0) >= self.max_size
+                if conns:
+                    best = min(conns, key=lambda c: c.inflight)
+                    limit = self.max_inflight if best.multiplex else 1
+                    if best.inflight < limit or full:
+                        best.last_used = time.time()
+                        return best
+                if not full:
+                    # the slot is taken now, the connect runs outside the lock.
+                    self._opening[key] = self._opening.get(key, 0) + 1
+                    break
+
+                remaining = None if deadline is None else deadline - time.time()
+                if remaining is not None and remaining <= 0:
+                    raise TimeoutError('no connection to %s:%s in %.3fs' % (host, port, timeout))
+                self._opened.wait(remaining)
+
+        try:
+            c = Connection(host, port, multiplex=multiplex, binary=binary, shm_threshold=shm_threshold,
+                           logger=logger, timeout=None if deadline is None else max(deadline - time.time(), 0.001))
+        except BaseException:
+            with self._lock:
+                self._release_slot(key)
+            raise
+
+        with self._lock:
+            self._release_slot(key)
+            if not self._closed:
+                self._conns.setdefault(key, []).append(c)
+                self._start_reaper()
+                return c
+        c.close()
+        raise Exception('ConnectionPool is closed')
+
+    def _release_slot(self, key):
+        # caller holds self._lock
+        self._opening[key] -= 1
+        self._opened.notify_all()
+
+    def size(self):
+        with self._lock:
+            return sum(len(conns) for conns in self._conns.values())
+
+    def reap(self):
+        now = time.time()
+        with self._lock:
+            for conns in self._conns.values():
+                for c in list(conns):
+                    # a subscription keeps its connection, stub.js drops it with the socket.
+                    idle = c.inflight == 0 and not c.listening and now - c.last_used > self.idle_timeout
+                    if not c.alive() or idle:
+                        conns.remove(c)
+                        c.close()
+
+    def close(self):
+        self._stop.set()
+        with self._lock:
+            self._closed = True
+            self._opened.notify_all()
+            for conns in self._conns.values():
+                for c in conns:
+                    c.close()
+            self._conns.clear()
+
+    def _start_reaper(self):
+        if self._reaper is None or not self._reaper.is_alive():
+            self._reaper = threading.Thread(target=self._reap_loop, name='pptrc-pool-reaper')
+            self._reaper.daemon = True
+            self._reaper.start()
+
+    def _reap_loop(self):
+        # close() sets _stop, the reaper exits at once instead of after its sleep.
+        while not self._stop.wait(self.reap_interval):
+            try:
+                self.reap()
+            except Exception:
+                logger.exception('ConnectionPool reaper failed')
+
+
+# seconds a pooled browser has to answer ping before it is replaced.
+_PING_TIMEOUT = 5
+
+_default_pool = None
+_default_pool_lock = threading.Lock()
+
+
+def default_pool():
+    '''
+    process wide pool used by Browser(pool=True).
+    '''
+    global _default_pool
+    with _default_pool_lock:
+        if _default_pool is None:
+            _default_pool = ConnectionPool()
+        return _default_pool
+
+
+class BrowserPool():
+    '''
+    keeps `size` browsers launched with identical options warm, so a job never pays
+    for a chrome cold start:
+        bp = BrowserPool(size=4, port=9999, headless=True, executable_path='...')
+        with bp.lease() as browser:
+            page = browser.newPage()
+
+    browser_options: kwargs for Browser(), e.g. {'multiplex': True, 'pool': True}.
+    launch_options: kwargs for Browser.launch().
+    max_age: seconds, older browsers are replaced instead of handed out again.
+    max_uses: leases per browser before it is replaced, None for unlimited.
+    check_interval: seconds between health checks of idle browsers, also keeps
+                    them clear of the 30 minutes idle timer in stub.js.
+    '''
+
+    def __init__(self, size=2, host='127.0.0.1', port=9999, max_age=1800, max_uses=None, check_interval=60,
+                 browser_options=None, **launch_options):
+        self.size = size
+        self.host = host
+        self.port = port
+        self.max_age = max_age
+        self.max_uses = max_uses
+        self.check_interval = check_interval
+        self.browser_options = browser_options or {}
+        self.launch_options = launch_options
+
+        self._lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._idle = queue.Queue()
+        self._meta = {}
+        self._launching = 0
+        self._closed = False
+
+        self._maintainer = threading.Thread(target=self._maintain_loop, name='pptrc-browser-pool')
+        self._maintainer.daemon = True
+        self._maintainer.start()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+    def _launch(self):
+        from .client import Browser
+        browser = Browser(host=self.host, port=self.port, **self.browser_options)
+        browser.launch(**self.launch_options)
+        return browser
+
+    def _expired(self, browser):
+        created, uses = self._meta[browser]
+        if self.max_age and time.time() - created > self.max_age:
+            return True
+        if self.max_uses and uses >= self.max_uses:
+            return True
+        return False
+
+    def _healthy(self, browser):
+        from .client import deadline
+        # pagesCount is answered by stub.js alone, ping reaches chrome.
+        try:
+            with deadline(_PING_TIMEOUT):
+                browser.ping()
+            return True
+        except Exception:
+            return False
+
+    def _retire(self, browser):
+        with self._lock:
+            self._meta.pop(browser, None)
+        try:
+            browser.quit()
+        except Exception:
+            pass
+        browser._close()
+        self._wakeup.set()
+
+    def _maintain_loop(self):
+        last_check = time.time()
+        while not self._closed:
+            with self._lock:
+                missing = self.size - len(self._meta) - self._launching
+                if missing > 0:
+                    self._launching += 1
+
+            if missing > 0:
+                try:
+                    browser = self._launch()
+                except Exception:
+                    logger.exception('BrowserPool failed to launch a browser')
+                    with self._lock:
+                        self._launching -= 1
+                    self._wakeup.wait(1)
+                    continue
+
+                with self._lock:
+                    self._launching -= 1
+                    # close() may have drained the pool while this one was starting.
+                    closed = self._closed
+                    if not closed:
+                        self._meta[browser] = [time.time(), 0]
+                        self._idle.put(browser)
+                if closed:
+                    self._retire(browser)
+                continue
+
+            if time.time() - last_check > self.check_interval:
+                last_check = time.time()
+                self._check_idle()
+
+            self._wakeup.wait(min(self.check_interval, 1))
+            self._wakeup.clear()
+
+    def _check_idle(self):
+        for _ in range(self._idle.qsize()):
+            try:
+                browser = self._idle.get_nowait()
+            except queue.Empty:
+                break
+            if self._expired(browser) or not self._healthy(browser):
+                self._retire(browser)
+            else:
+                self._idle.put(browser)
+
+    def acquire(self, timeout=None):
+        deadline = None if timeout is None else time.time() + timeout
+        while True:
+            if self._closed:
+                raise Exception('BrowserPool is closed')
+
+            remaining = None if deadline is None else max(0, deadline - time.time())
+            try:
+                browser = self._idle.get(timeout=remaining)
+            except queue.Empty:
+                raise Exception('no browser available in %s seconds' % timeout)
+
+            if self._expired(browser):
+                self._retire(browser)
+                continue
+
+            with self._lock:
+                self._meta[browser][1] += 1
+            return browser
+
+    def release(self, browser):
+        if browser not in self._meta:
+            return
+
+        if self._closed or self._expired(browser) or not self._healthy(browser):
+            self._retire(browser)
+        else:
+            self._idle.put(browser)
+
+    @contextmanager
+    def lease(self, timeout=None):
+        browser = self.acquire(timeout=timeout)
+        try:
+            yield browser
+        finally:
+            self.release(browser)
+
+    def idle(self):
+        return self._idle.qsize()
+
+    def close(self, timeout=None):
+        '''
+        retire idle browsers, including one still launching: waits for the maintainer
+        thread, at most timeout seconds. leased browsers are retired on release.
+        '''
+        with self._lock:
+            self._closed = True
+        self._wakeup.set()
+        if self._maintainer is not threading.current_thread():
+            self._maintainer.join(timeout)
+        while True:
+            try:
+                browser = self._idle.get_nowait()
+            except queue.Empty:
+                break
+            self._retire(browser)
+
+
+class PagePool():
+    '''
+    reuses tabs of one Browser between jobs, a reset tab replaces newPage + first navigation:
+        pp = PagePool(browser, size=4)
+        with pp.lease() as page:
+            page.goto(url)
+
+    size: tabs opened at most.
+    max_uses: leases per tab before it is closed and a new tab is opened, None for unlimited.
+    tabs that fail to reset are replaced as well. pooled tabs are addressed by their pageId,
+    closing one does not move the others.
+    '''
+
+    def __init__(self, browser, size=4, max_uses=None, reset_url='about:blank', clear_all_cookies=False):
+        self.browser = browser
+        self.size = size
+        self.max_uses = max_uses
+        self.reset_url = reset_url
+        self.clear_all_cookies = clear_all_cookies
+
+        self._lock = threading.Lock()
+        self._idle = queue.Queue()
+        self._uses = {}
+        self._opened = 0
+
+    def acquire(self, timeout=None):
+        with self._lock:
+            try:
+                page = self._idle.get_nowait()
+            except queue.Empty:
+                page = None
+
+            if page is None and self._opened < self.size:
+                self._opened += 1
+                try:
+                    page = self.browser.newPage()
+                except Exception:
+                    self._opened -= 1
+                    raise
+
+        if page is None:
+            try:
+                page = self._idle.get(timeout=timeout)
+            except queue.Empty:
+                raise Exception('no page available in %s seconds' % timeout)
+
+        with self._lock:
+            self._uses[page] = self._uses.get(page, 0) + 1
+        return page
+
+    def release(self, page):
+        with self._lock:
+            uses = self._uses.get(page)
+        if uses is None:
+            return
+
+        try:
+            if self.max_uses and uses >= self.max_uses:
+                raise Exception('page reached max_uses')
+            page.reset(url=self.reset_url, clear_all_cookies=self.clear_all_cookies)
+        except Exception:
+            with self._lock:
+                self._uses.pop(page, None)
+            self._replace(page)
+            return
+
+        self._idle.put(page)
+
+    def _replace(self, page):
+        '''
+        a fresh tab takes the slot of a dropped one. it is opened first, closing
+        the last tab would quit chrome.
+        '''
+        try:
+            fresh = self.browser.newPage()
+        except Exception:
+            logger.warning('opening a tab to replace a dropped one failed:\n%s', traceback.format_exc())
+            fresh = None
+
+        closed = False
+        try:
+            if fresh is not None or self.browser.pagesCount() > 1:
+                page.close()
+                closed = True
+        except Exception:
+            logger.warning('closing a dropped tab failed:\n%s', traceback.format_exc())
+
+        with self._lock:
+            if fresh is not None:
+                self._idle.put(fresh)
+            elif closed:
+                self._opened -= 1
+            else:
+                # the browser's last tab stays in service instead of leaking its slot.
+                self._uses[page] = 0
+                self._idle.put(page)
+
+    @contextmanager
+    def lease(self, timeout=None):
+        page = self.acquire(timeout=timeout)
+        try:
+            yield page
+        finally:
+            self.release(page)
+
+    def idle(self):
+        return self._idle.qsize()
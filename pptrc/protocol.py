@@ -0,0 +1,136 @@
+# -*- coding: utf-8 -*-
+# @Time    : 2026/10/18 上午10:12
+# @Author  : Zr
+# @Comment : stub.js wire protocol, shared by sync and asyncio clients
+
+import base64
+import json
+import mmap
+import os
+import struct
+
+__all__ = [
+    'HEAD_LEN', 'pack', 'unpack', 'unpack_head', 'body_size', 'hello', 'load_file', 'is_local'
+]
+
+HEAD_LEN = 8
+
+# binary framing: uint32 json length + uint32 attachments length, both big endian.
+_BIN_HEAD = struct.Struct('>II')
+_BIN_KEY = '$bin'
+_BYTES = (bytes, bytearray, memoryview)
+_LOCAL_HOSTS = ('127.0.0.1', 'localhost', '::1')
+
+
+def _strip(obj, path, atts):
+    '''
+    copy obj, bytes values are replaced by None and recorded in atts as (path, bytes)
+    '''
+    if isinstance(obj, dict):
+        return {k: _strip(v, path + [k], atts) for k, v in obj.items()}
+    if isinstance(obj, (list, tuple)):
+        return [_strip(v, path + [i], atts) for i, v in enumerate(obj)]
+    if isinstance(obj, _BYTES):
+        atts.append((path, obj))
+        return None
+    return obj
+
+
+def _set(obj, path, value):
+    for p in path[:-1]:
+        obj = obj[p]
+    obj[path[-1]] = value
+
+
+def is_local(host):
+    return host in _LOCAL_HOSTS
+
+
+def hello(binary, shm_threshold=None):
+    '''
+    first frame on a connection, always sent in ascii framing.
+    shm_threshold: bytes, larger responses are handed over through a shared memory
+                   file instead of the socket. only honoured for loopback clients.
+    '''
+    ctx = {
+        "framing": "binary" if binary else "ascii"
+    }
+    if shm_threshold:
+        ctx['shm'] = shm_threshold
+
+    return {
+        "id": None,
+        "action": "hello",
+        "ctx": ctx
+    }
+
+
+def pack(message, binary=False):
+    '''
+    message: dict, bytes values anywhere in it are payloads.
+    ascii:  `8 ascii digits length` + `json body`, payloads are base64 strings.
+    binary: `json length` + `payloads length` + `json body` + `raw payloads`,
+            json body lists payload positions under `$bin`.
+    '''
+    atts = []
+    message = _strip(message, [], atts)
+
+    if not binary:
+        for path, b in atts:
+            _set(message, path, base64.b64encode(b).decode('ascii'))
+        body = json.dumps(message).encode('utf-8')
+        return str(len(body)).zfill(HEAD_LEN).encode('utf-8') + body
+
+    if atts:
+        message[_BIN_KEY] = [[path, len(b)] for path, b in atts]
+    body = json.dumps(message).encode('utf-8')
+    return b''.join([_BIN_HEAD.pack(len(body), sum(len(b) for _, b in atts)), body] + [b for _, b in atts])
+
+
+def unpack_head(head):
+    if len(head) != HEAD_LEN:
+        raise Exception('ERROR: bad frame head: %r' % head)
+    return int(head)
+
+
+def body_size(head, binary=False):
+    if not binary:
+        return unpack_head(head)
+
+    json_len, att_len = _BIN_HEAD.unpack(head)
+    return json_len + att_len
+
+
+def unpack(head, body, binary=False):
+    '''
+    body: bytes-like, the json part is decoded straight from it without an extra copy.
+    '''
+    if not body:
+        return None
+
+    with memoryview(body) as view:
+        if not binary:
+            return json.loads(str(view, 'utf-8'))
+
+        json_len, att_len = _BIN_HEAD.unpack(head)
+        jd = json.loads(str(view[:json_len], 'utf-8'))
+        offset = json_len
+        for path, size in jd.pop(_BIN_KEY, []):
+            _set(jd, path, bytes(view[offset:offset + size]))
+            offset += size
+
+        return jd
+
+
+def load_file(path, binary=False):
+    '''
+    large response handed over by pptrs as a file holding one whole frame,
+    mapped and decoded in place, then removed.
+    '''
+    try:
+        with open(path, 'rb') as f:
+            with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+                with memoryview(mm) as view, view[HEAD_LEN:] as body:
+                    return unpack(bytes(view[:HEAD_LEN]), body, binary)
+    finally:
+        os.remove(path)
@@ -0,0 +1,140 @@
+# -*- coding: utf-8 -*-
+# @Time    : 2026/10/18 下午9:10
+# @Author  : Zr
+# @Comment : per-rpc tracing hooks and a chrome trace-event writer
+
+import json
+import os
+import threading
+import time
+
+__all__ = ['Call', 'Tracer', 'ChromeTraceWriter']
+
+
+class Call():
+    '''
+    one request as seen by the hooks.
+    action, id (browser), page_index, key (element), frame_key: the target.
+    start: time.time() before the request was packed.
+    client_ms: round trip, server_ms: time pptrs spent in the action.
+    sent, recv: frame bytes. ret_code, ret_msg: the response, None on a failed request.
+    '''
+    __slots__ = ('action', 'id', 'page_index', 'key', 'frame_key', 'thread', 'start', 'client_ms',
+                 'server_ms', 'sent', 'recv', 'ret_code', 'ret_msg')
+
+    def __init__(self, send):
+        ctx = send.get('ctx') or {}
+        self.action = send.get('action')
+        self.id = send.get('id')
+        self.page_index = ctx.get('pageIndex')
+        self.key = ctx.get('key')
+        self.frame_key = ctx.get('frameKey')
+        self.thread = threading.get_ident()
+        self.start = time.time()
+        self.client_ms = None
+        self.server_ms = None
+        self.sent = 0
+        self.recv = 0
+        self.ret_code = None
+        self.ret_msg = None
+
+
+class Tracer():
+    '''
+    hooks run on the calling thread (the event loop for AsyncBrowser) around every
+    request, an exception raised in a hook is logged and ignored.
+    before_send(call): nothing measured yet.
+    after_recv(call): the response came back with retCode >= 0.
+    on_error(call, error): the request failed or pptrs returned a negative retCode,
+                           after_recv is not called then.
+    '''
+
+    def before_send(self, call):
+        pass
+
+    def after_recv(self, call):
+        pass
+
+    def on_error(self, call, error):
+        pass
+
+
+class ChromeTraceWriter(Tracer):
+    '''
+    writes every request as a complete ("X") event in chrome trace-event json, open the
+    file in chrome://tracing or https://ui.perfetto.dev. one track per thread, the time
+    spent inside pptrs is drawn as a child span centered in the round trip.
+    the file is valid json once close() is called, a truncated one still loads.
+    '''
+
+    def __init__(self, path, server_spans=True):
+        self.path = path
+        self.server_spans = server_spans
+        self._lock = threading.Lock()
+        self._pid = os.getpid()
+        self._threads = set()
+        self._first = True
+        self._fp = open(path, 'w', encoding='utf-8')
+        self._fp.write('[\n')
+
+    def _write(self, event):
+        with self._lock:
+            if self._fp is None:
+                return
+            if event['tid'] not in self._threads:
+                self._threads.add(event['tid'])
+                self._emit({'name': 'thread_name', 'ph': 'M', 'pid': self._pid, 'tid': event['tid'],
+                            'args': {'name': threading.current_thread().name}})
+            self._emit(event)
+
+    def _emit(self, event):
+        self._fp.write(('' if self._first else ',\n') + json.dumps(event, ensure_ascii=False))
+        self._first = False
+
+    def _span(self, call, error=None):
+        args = {'browser': call.id, 'sent': call.sent, 'recv': call.recv}
+        if call.page_index is not None:
+            args['pageIndex'] = call.page_index
+        if call.key is not None:
+            args['key'] = call.key
+        if call.frame_key is not None:
+            args['frameKey'] = call.frame_key
+        if call.server_ms is not None:
+            args['server_ms'] = call.server_ms
+        if error is not None:
+            args['error'] = str(error)
+
+        ts = call.start * 1e6
+        dur = (call.client_ms or 0) * 1000
+        self._write({'name': call.action, 'cat': 'rpc', 'ph': 'X', 'ts': ts, 'dur': dur,
+                     'pid': self._pid, 'tid': call.thread, 'args': args})
+
+        if self.server_spans and call.server_ms is not None:
+            server = min(call.server_ms * 1000, dur)
+            self._write({'name': 'pptrs:%s' % call.action, 'cat': 'server', 'ph': 'X',
+                         'ts': ts + (dur - server) / 2, 'dur': server, 'pid': self._pid, 'tid': call.thread})
+
+    def after_recv(self, call):
+        self._span(call)
+
+    def on_error(self, call, error):
+        self._span(call, error)
+
+    def flush(self):
+        with self._lock:
+            if self._fp is not None:
+                self._fp.flush()
+
+    def close(self):
+        with self._lock:
+            if self._fp is None:
+                return
+            self._fp.write('\n]\n')
+            self._fp.close()
+            self._fp = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
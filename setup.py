@@ -6,9 +6,7 @@
 
 from setuptools import find_packages, setup
 
-requirements = [
-    "chardet"
-]
+requirements = []
 
 setup(
     name='pptrc',
@@ -27,7 +25,6 @@ setup(
     classifiers=[
         'Programming Language :: Python',
         'Operating System :: OS Independent',
-        'Programming Language :: Python :: 3.6',
         'Programming Language :: Python :: 3.7',
         'Programming Language :: Python :: 3.8',
         'Programming Language :: Python :: 3.9',
@@ -35,5 +32,5 @@ setup(
         'Programming Language :: Python :: 3.11',
         'Programming Language :: Python :: 3.12',
     ],
-    python_requires=">=3.6"
+    python_requires=">=3.7"
 )
@@ -0,0 +1,58 @@
+# -*- coding: utf-8 -*-
+# @Time    : 2026/10/18 下午11:40
+# @Author  : Zr
+# @Comment : fixtures, every test talks to the stand-in server, no node or chrome needed
+
+import os
+import shutil
+import subprocess
+import sys
+
+import pytest
+
+_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(_ROOT, 'bench'))
+
+from standin import StandInServer  # noqa: E402
+
+# Browser.launch() looks chrome up when no executable is given, the stand-in ignores it.
+LAUNCH = {'executable_path': 'chrome'}
+
+
+@pytest.fixture
+def server():
+    with StandInServer(size=1024) as s:
+        yield s
+
+
+@pytest.fixture
+def slow_server():
+    # every action takes 300ms, long enough to run past a deadline.
+    with StandInServer(size=1024, latency=300) as s:
+        yield s
+
+
+@pytest.fixture
+def stub():
+    '''
+    the real stub.js, with puppeteer-core and log4js replaced by tests/js/fake_puppeteer.js,
+    yields its port.
+    '''
+    node = shutil.which('node')
+    if node is None:
+        pytest.skip('node is not installed')
+
+    r, w = os.pipe()
+    proc = subprocess.Popen([node, '-r', os.path.join(_ROOT, 'tests', 'js', 'fake_puppeteer.js'),
+                             os.path.join(_ROOT, 'pptrc', 'js', 'stub.js'), '127.0.0.1', '0',
+                             '--ready-fd=%d' % w], pass_fds=(w,))
+    os.close(w)
+    try:
+        with os.fdopen(r) as ready:
+            line = ready.readline().split()
+        if not line:
+            raise Exception('stub.js exited with %s' % proc.wait(5))
+        yield int(line[2])
+    finally:
+        proc.kill()
+        proc.wait()
@@ -0,0 +1,184 @@
+/**
+ *  Author: Zr
+ *  Email: zrtj1111@hotmail.com
+ *  Create: 2026-10-18
+ *
+ *  preloaded with `node -r` so stub.js runs without chrome: puppeteer-core
+ *  is answered by in-memory browsers and pages, log4js by a silent logger.
+ *  a goto to a `slow:` url settles after 500ms unless Page.stopLoading or
+ *  its timeout ends it first, `crash:` disconnects the browser.
+ */
+
+const EventEmitter = require("events");
+const Module = require("module");
+
+let browserSeq = 0;
+let elemSeq = 0;
+
+class FakeElem {
+  constructor() {
+    // stub.js treats an object without own properties as no element.
+    this.id = ++elemSeq;
+  }
+
+  async dispose() {}
+  async evaluate() {}
+}
+
+class FakeSession {
+  constructor(page) {
+    this.page = page;
+  }
+
+  async send(method) {
+    if (method == "Page.stopLoading") this.page._stop();
+    return {};
+  }
+
+  async detach() {}
+}
+
+class FakePage extends EventEmitter {
+  constructor(browser) {
+    super();
+    this.browser = browser;
+    this._url = "about:blank";
+    this._closed = false;
+    this._navigation = null;
+  }
+
+  url() {
+    return this._url;
+  }
+
+  isClosed() {
+    return this._closed;
+  }
+
+  mainFrame() {
+    return this;
+  }
+
+  frames() {
+    return [this];
+  }
+
+  async content() {
+    return "<html></html>";
+  }
+
+  async $() {
+    return new FakeElem();
+  }
+
+  async evaluate() {}
+
+  async setRequestInterception() {}
+
+  async createCDPSession() {
+    return new FakeSession(this);
+  }
+
+  target() {
+    return { createCDPSession: async () => new FakeSession(this) };
+  }
+
+  goto(url, options = {}) {
+    if (url == "crash:") {
+      // chrome died, as far as puppeteer can tell.
+      this.browser._connected = false;
+      this.browser.emit("disconnected");
+      return Promise.reject(new Error("Navigating frame was detached"));
+    }
+    return new Promise((resolve, reject) => {
+      let done = (error) => {
+        clearTimeout(loaded);
+        clearTimeout(timeout);
+        this._navigation = null;
+        if (error) return reject(error);
+        this._url = url;
+        resolve({ status: () => 200 });
+      };
+      let loaded = setTimeout(done, url.startsWith("slow:") ? 500 : 0);
+      let timeout =
+        options.timeout > 0
+          ? setTimeout(() => {
+              let e = new Error(`Navigation timeout of ${options.timeout} ms exceeded`);
+              e.name = "TimeoutError";
+              done(e);
+            }, options.timeout)
+          : null;
+      this._navigation = done;
+    });
+  }
+
+  _stop() {
+    if (this._navigation) this._navigation(new Error("net::ERR_ABORTED"));
+  }
+
+  async close() {
+    this._closed = true;
+    this.browser._pages.splice(this.browser._pages.indexOf(this), 1);
+    this.emit("close");
+  }
+}
+
+class FakeBrowser extends EventEmitter {
+  constructor() {
+    super();
+    this._id = `ws://fake/${++browserSeq}`;
+    this._connected = true;
+    this._pages = [new FakePage(this)];
+  }
+
+  wsEndpoint() {
+    return this._id;
+  }
+
+  isConnected() {
+    return this._connected;
+  }
+
+  async version() {
+    if (!this._connected) throw new Error("Protocol error: Connection closed.");
+    return "HeadlessChrome/fake";
+  }
+
+  async pages() {
+    return this._pages.slice();
+  }
+
+  async newPage() {
+    let page = new FakePage(this);
+    this._pages.push(page);
+    return page;
+  }
+
+  async close() {
+    if (!this._connected) return;
+    this._connected = false;
+    this.emit("disconnected");
+  }
+}
+
+const silent = {
+  trace() {},
+  debug() {},
+  info() {},
+  warn() {},
+  error() {},
+  fatal() {},
+};
+
+const fakes = {
+  "puppeteer-core": { launch: async () => new FakeBrowser() },
+  log4js: { configure() {}, getLogger: () => silent },
+};
+
+const load = Module._load;
+Module._load = function (request) {
+  if (Object.prototype.hasOwnProperty.call(fakes, request)) {
+    return fakes[request];
+  }
+  return load.apply(this, arguments);
+};
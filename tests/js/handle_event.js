@@ -0,0 +1,97 @@
+/**
+ *  Author: Zr
+ *  Email: zrtj1111@hotmail.com
+ *  Create: 2026-10-18
+ *
+ *  run with `node -r tests/js/fake_puppeteer.js`: calls handleEvent of
+ *  stub.js directly with a connection whose socket records the frames,
+ *  exits non zero on the first failed check.
+ */
+
+const assert = require("assert");
+const path = require("path");
+
+process.argv.push("127.0.0.1", "0");
+const stub = require(path.join(__dirname, "..", "..", "pptrc", "js", "stub"));
+
+const _conn = () => {
+  let conn = {
+    socket: { destroyed: false, write: (buf) => conn.frames.push(buf) },
+    binary: false,
+    shm: 0,
+    files: new Set(),
+    subs: new Map(),
+    pending: new Map(),
+    frames: [],
+  };
+  return conn;
+};
+
+const _call = async (conn, jd) => {
+  conn.frames = [];
+  await stub.handleEvent(conn, jd, 0);
+  assert.strictEqual(conn.frames.length, 1, `${jd.action}: one answer`);
+  // ascii framing: 8 digits of length, then the json body.
+  return JSON.parse(conn.frames[0].subarray(8).toString("utf8"));
+};
+
+const main = async () => {
+  let conn = _conn();
+  let resp = await _call(conn, {
+    action: "launch",
+    ctx: { options: { executablePath: "chrome" } },
+  });
+  assert.strictEqual(resp.retCode, 1, resp.retMsg);
+  let id = resp.data.wsEndpoint;
+
+  resp = await _call(conn, { id: id, action: "newPage", ctx: {} });
+  let pageIndex = resp.data.pageIndex;
+
+  resp = await _call(conn, { id: id, action: "$", ctx: { pageIndex: pageIndex, selector: "#a" } });
+  let key = resp.data.key;
+
+  // plain values, not promises: answered like any async action.
+  resp = await _call(conn, { id: id, action: "disposeHandles", ctx: { keys: [key] } });
+  assert.strictEqual(resp.retCode, 1, resp.retMsg);
+  assert.strictEqual(resp.data.disposed, 1);
+  assert.strictEqual(stub.BP_POOL[id].elemCache.size, 0);
+
+  resp = await _call(conn, {
+    id: id,
+    action: "subscribe",
+    ctx: { pageIndex: pageIndex, sub: "s1", events: ["console"] },
+  });
+  assert.strictEqual(resp.retCode, 1, resp.retMsg);
+  resp = await _call(conn, { id: id, action: "unsubscribe", ctx: { sub: "s1" } });
+  assert.strictEqual(resp.retCode, 1, resp.retMsg);
+  assert.strictEqual(stub.BP_POOL[id].subscriptions.size, 0);
+
+  resp = await _call(conn, { id: id, action: "quit", ctx: {} });
+  assert.strictEqual(resp.retCode, 1, resp.retMsg);
+  assert.strictEqual(stub.BP_POOL[id], undefined);
+
+  // the same three with a deadline, raced against the request's signal.
+  resp = await _call(conn, {
+    action: "launch",
+    ctx: { options: { executablePath: "chrome" } },
+  });
+  id = resp.data.wsEndpoint;
+  for (let [action, ctx] of [
+    ["disposeHandles", { keys: ["none"] }],
+    ["unsubscribe", { sub: "none" }],
+    ["quit", {}],
+  ]) {
+    resp = await _call(conn, { id: id, action: action, ctx: ctx, seq: 1, deadline: 1000 });
+    assert.strictEqual(resp.retCode, 1, `${action}: ${resp.retMsg}`);
+    assert.strictEqual(resp.seq, 1);
+    assert.strictEqual(conn.pending.size, 0);
+  }
+};
+
+main().then(
+  () => process.exit(0),
+  (e) => {
+    console.error(e);
+    process.exit(1);
+  }
+);
@@ -0,0 +1,165 @@
+# -*- coding: utf-8 -*-
+# @Time    : 2026/10/18 下午11:40
+# @Author  : Zr
+# @Comment : Browser/AsyncBrowser against the stand-in: retries, reconnects, deadlines
+
+import asyncio
+import socket
+import threading
+import time
+
+import pytest
+
+import pptrc
+from pptrc import Browser, AsyncBrowser
+from pptrc.client import _retryable, _default_executable_path
+from standin import StandInServer
+from conftest import LAUNCH
+
+
+def _browser(port, **kwargs):
+    return Browser(port=port, log_level='warning', **kwargs).launch(**LAUNCH)
+
+
+@pytest.mark.parametrize('multiplex,binary', [(False, False), (True, False), (True, True)])
+def test_pages(server, multiplex, binary):
+    b = _browser(server.port, multiplex=multiplex, binary=binary)
+    assert b.wsEndpoint().startswith('ws://standin/')
+    page = b.newPage()
+    assert page.page_id is not None
+    assert b.pagesCount() == 2
+    assert page.getUrl() == 'http://standin/'
+    assert page.getHtml() == 'x' * 1024
+
+
+def test_retryable():
+    assert _retryable(ConnectionRefusedError(), 'newPage', sent=False)
+    assert _retryable(ConnectionResetError(), 'url', sent=True)
+    assert not _retryable(ConnectionResetError(), 'newPage', sent=True)
+    assert not _retryable(TimeoutError(), 'url', sent=True)
+    assert not _retryable(socket.timeout(), 'url', sent=True)
+    assert not _retryable(ValueError(), 'url', sent=False)
+
+
+def test_reconnect_after_restart(server):
+    b = _browser(server.port, retries=5, backoff=0.05)
+    port = server.port
+    server.stop()
+
+    restarted = StandInServer(port=port)
+    timer = threading.Timer(0.1, restarted.start)
+    timer.start()
+    try:
+        # refused until the timer fires, then sent on a fresh connection.
+        assert b.pagesCount() == 1
+    finally:
+        timer.join()
+        restarted.stop()
+
+
+def test_no_retry_without_retries(server):
+    b = _browser(server.port, retries=0)
+    server.stop()
+    with pytest.raises(OSError):
+        b.pagesCount()
+
+
+def test_dispose_keys_survive_failure(server):
+    b = _browser(server.port, retries=0)
+    b._release_handle('k1')
+    server.stop()
+    with pytest.raises(OSError):
+        b.pagesCount()
+    assert b._released == ['k1']
+
+
+@pytest.mark.parametrize('multiplex', [False, True])
+def test_browser_deadline(slow_server, multiplex):
+    b = _browser(slow_server.port, multiplex=multiplex)
+    b._deadline = 0.05
+    start = time.time()
+    with pytest.raises(TimeoutError):
+        b.pagesCount()
+    assert time.time() - start < 0.3 + 1.0
+
+    b._deadline = None
+    assert b.pagesCount() == 1
+
+
+def test_deadline_block(slow_server):
+    b = _browser(slow_server.port, multiplex=True)
+    with pptrc.deadline(5):
+        with pptrc.deadline(0.05):
+            with pytest.raises(TimeoutError):
+                b.pagesCount()
+        # the outer block allows the full round trip.
+        assert b.pagesCount() == 1
+
+
+def test_deadline_spent_before_send(server):
+    b = _browser(server.port)
+    with pptrc.deadline(0.01):
+        time.sleep(0.02)
+        with pytest.raises(TimeoutError):
+            b.pagesCount()
+
+
+def test_async_browser(slow_server):
+    async def run():
+        b = AsyncBrowser(port=slow_server.port, log_level='warning')
+        await b.launch(**LAUNCH)
+        try:
+            start = time.time()
+            counts = await asyncio.gather(*[b.pagesCount() for _ in range(8)])
+            assert counts == [1] * 8
+            # multiplexed, the eight round trips overlap.
+            assert time.time() - start < 1.5
+
+            with pptrc.deadline(0.05):
+                with pytest.raises(TimeoutError):
+                    await b.pagesCount()
+            assert await b.pagesCount() == 1
+        finally:
+            await b.close()
+
+    asyncio.run(run())
+
+
+def test_deadline_bounds_connect():
+    # accepts, never answers hello.
+    with socket.socket() as listener:
+        listener.bind(('127.0.0.1', 0))
+        listener.listen()
+        port = listener.getsockname()[1]
+
+        start = time.time()
+        with pytest.raises(TimeoutError):
+            with pptrc.deadline(0.2):
+                Browser(port=port, binary=True, log_level='warning')
+        with pytest.raises(TimeoutError):
+            Browser(port=port, binary=True, log_level='warning', deadline=0.2)
+        assert time.time() - start < 2
+
+        async def run():
+            ab = AsyncBrowser(port=port, binary=True, log_level='warning')
+            with pytest.raises(TimeoutError):
+                with pptrc.deadline(0.2):
+                    await ab.pagesCount()
+
+        start = time.time()
+        asyncio.run(run())
+        assert time.time() - start < 1
+
+
+def test_default_executable_path(monkeypatch, tmp_path):
+    chromium = tmp_path / 'chromium'
+    chromium.write_text('')
+    chromium.chmod(0o755)
+    monkeypatch.setattr('sys.platform', 'linux')
+    monkeypatch.setenv('PATH', str(tmp_path))
+    assert _default_executable_path('chrome') == str(chromium)
+
+    chromium.unlink()
+    with pytest.raises(Exception, match='pass executable_path'):
+        _default_executable_path('chrome')
+
@@ -0,0 +1,72 @@
+# -*- coding: utf-8 -*-
+# @Time    : 2026/10/18 下午11:40
+# @Author  : Zr
+# @Comment : WorkerRouter placement and reservations
+
+import pytest
+
+from pptrc import Browser, WorkerRouter
+from standin import StandInServer
+from conftest import LAUNCH
+
+
+@pytest.fixture
+def workers():
+    servers = [StandInServer().start(), StandInServer().start()]
+    yield servers
+    for s in servers:
+        s.stop()
+
+
+def _pending(router):
+    return sum(router._pending.values())
+
+
+def test_launches_spread(workers):
+    router = WorkerRouter([('127.0.0.1', s.port) for s in workers])
+    browsers = [Browser(router=router, log_level='warning').launch(**LAUNCH) for _ in range(4)]
+    assert sorted(b._port for b in browsers) == sorted([s.port for s in workers] * 2)
+    assert _pending(router) == 0
+
+    attached = Browser(browsers[1].wsEndpoint(), router=router, log_level='warning')
+    assert attached._port == browsers[1]._port
+
+
+def test_unlaunched_browser_reserves_nothing(workers):
+    router = WorkerRouter([('127.0.0.1', s.port) for s in workers])
+    Browser(router=router, log_level='warning')
+    assert _pending(router) == 0
+
+
+def test_reservations(workers):
+    router = WorkerRouter([('127.0.0.1', s.port) for s in workers])
+    first = router.least_loaded()
+    second = router.least_loaded()
+    # the pending launch counts, the second goes to the other worker.
+    assert first.worker != second.worker
+    assert _pending(router) == 2
+
+    router.register('ws://attached', first.worker)
+    assert _pending(router) == 2
+
+    router.register('ws://launched', first.worker, first)
+    router.cancel(first)
+    router.cancel(second)
+    router.cancel(second)
+    assert _pending(router) == 0
+    assert router.locate('ws://launched') == first.worker
+
+
+def test_unknown_browser(workers):
+    router = WorkerRouter([('127.0.0.1', s.port) for s in workers])
+    with pytest.raises(Exception):
+        router.locate('ws://nowhere')
+
+
+def test_no_worker_reachable(workers):
+    router = WorkerRouter([('127.0.0.1', s.port) for s in workers], timeout=1)
+    for s in workers:
+        s.stop()
+    with pytest.raises(Exception):
+        Browser(router=router, log_level='warning').launch(**LAUNCH)
+    assert _pending(router) == 0
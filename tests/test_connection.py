@@ -0,0 +1,73 @@
+# -*- coding: utf-8 -*-
+# @Time    : 2026/10/18 下午11:40
+# @Author  : Zr
+# @Comment : multiplexed requests, timeouts and cancel frames
+
+import threading
+import time
+
+import pytest
+
+from pptrc.connection import Connection
+
+
+def test_multiplex_concurrent(slow_server):
+    conn = Connection('127.0.0.1', slow_server.port, multiplex=True)
+    results = []
+
+    def call(i):
+        results.append(conn.request({'id': 'b', 'action': 'url', 'ctx': {'i': i}}))
+
+    try:
+        start = time.time()
+        threads = [threading.Thread(target=call, args=(i,)) for i in range(8)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        # answered concurrently, not one 300ms round trip after the other.
+        assert time.time() - start < 1.5
+        assert len(results) == 8 and all(r['retCode'] == 1 for r in results)
+    finally:
+        conn.close()
+
+
+def test_multiplex_timeout_cancels(slow_server):
+    conn = Connection('127.0.0.1', slow_server.port, multiplex=True)
+    try:
+        with pytest.raises(TimeoutError):
+            conn.request({'id': 'b', 'action': 'url', 'ctx': {}}, timeout=0.05)
+        assert conn.alive()
+        assert conn.request({'id': 'b', 'action': 'url', 'ctx': {}})['retCode'] == 1
+    finally:
+        conn.close()
+
+
+def test_ordered_timeout_keeps_connection(slow_server):
+    conn = Connection('127.0.0.1', slow_server.port)
+    try:
+        with pytest.raises(TimeoutError):
+            conn.request({'id': 'b', 'action': 'url', 'ctx': {}}, timeout=0.05)
+        # the late answer to the cancelled request was read and dropped.
+        assert conn.alive()
+        jd = conn.request({'id': 'b', 'action': 'url', 'ctx': {}})
+        assert jd['data'] == {'url': 'http://standin/'}
+    finally:
+        conn.close()
+
+
+def test_server_deadline(slow_server):
+    conn = Connection('127.0.0.1', slow_server.port)
+    try:
+        jd = conn.request({'id': 'b', 'action': 'url', 'ctx': {}, 'deadline': 50})
+        assert jd['retCode'] == -3
+    finally:
+        conn.close()
+
+
+def test_closed_by_server(server):
+    conn = Connection('127.0.0.1', server.port)
+    server.stop()
+    with pytest.raises(OSError):
+        conn.request({'id': 'b', 'action': 'url', 'ctx': {}})
+    assert not conn.alive()
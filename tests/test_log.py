@@ -0,0 +1,47 @@
+# -*- coding: utf-8 -*-
+# @Time    : 2026/10/18 下午11:55
+# @Author  : Zr
+# @Comment : pptrc logging leaves the application's logging setup alone
+
+import logging
+
+from pptrc import Browser
+from pptrc.log import flush
+
+
+class _Collect(logging.Handler):
+    def __init__(self):
+        super(_Collect, self).__init__()
+        self.records = []
+
+    def emit(self, record):
+        self.records.append(record)
+
+
+def test_application_handlers_kept(server):
+    logger = logging.getLogger('pptrc')
+    own, root = _Collect(), _Collect()
+    logger.addHandler(own)
+    logging.getLogger().addHandler(root)
+    try:
+        b = Browser(port=server.port, log_level='warning')
+        assert own in logger.handlers
+        b._logger.warning('to the application')
+        flush()
+        # records reach handlers on the pptrc logger and, propagated, on root.
+        assert [r.getMessage() for r in own.records] == ['to the application']
+        assert [r.getMessage() for r in root.records] == ['to the application']
+    finally:
+        logger.removeHandler(own)
+        logging.getLogger().removeHandler(root)
+
+
+def test_default_level_left_alone(server):
+    logger = logging.getLogger('pptrc')
+    logger.setLevel(logging.ERROR)
+    try:
+        Browser(port=server.port)
+        assert logger.level == logging.ERROR
+        assert not logger.isEnabledFor(logging.DEBUG)
+    finally:
+        logger.setLevel(logging.NOTSET)
@@ -0,0 +1,133 @@
+# -*- coding: utf-8 -*-
+# @Time    : 2026/10/18 下午11:40
+# @Author  : Zr
+# @Comment : ConnectionPool, BrowserPool and PagePool lifecycles
+
+import socket
+import threading
+import time
+
+import pytest
+
+from pptrc import Browser, ConnectionPool, BrowserPool, PagePool
+from conftest import LAUNCH
+
+
+def _wait(predicate, timeout=5):
+    deadline = time.time() + timeout
+    while not predicate():
+        if time.time() > deadline:
+            return False
+        time.sleep(0.01)
+    return True
+
+
+def test_connection_pool_reuse_and_close(server):
+    pool = ConnectionPool(max_size=2, reap_interval=60)
+    b = Browser(port=server.port, pool=pool, log_level='warning').launch(**LAUNCH)
+    b.pagesCount()
+    b.pagesCount()
+    assert pool.size() == 1
+
+    pool.close()
+    # the reaper waits on an event, close() stops it without sleeping out reap_interval.
+    pool._reaper.join(1)
+    assert not pool._reaper.is_alive()
+    assert pool.size() == 0
+
+
+def test_connection_pool_reap_idle(server):
+    pool = ConnectionPool(idle_timeout=0)
+    conn = pool.get('127.0.0.1', server.port)
+    conn.last_used -= 1
+    pool.reap()
+    assert pool.size() == 0 and not conn.alive()
+    pool.close()
+
+
+def test_page_pool_reuses_tabs(server):
+    b = Browser(port=server.port, log_level='warning').launch(**LAUNCH)
+    pp = PagePool(b, size=2)
+    with pp.lease() as first:
+        pass
+    with pp.lease() as again:
+        assert again is first
+    assert b.pagesCount() == 2
+
+
+def test_page_pool_closes_dropped_tabs(server):
+    b = Browser(port=server.port, log_level='warning').launch(**LAUNCH)
+    pp = PagePool(b, size=2, max_uses=2)
+    for _ in range(6):
+        with pp.lease():
+            pass
+    # tabs past max_uses were replaced, never more than size of them.
+    assert b.pagesCount() == 2
+    assert pp._opened == 1 and pp.idle() == 1
+
+
+def test_browser_pool_lease(server):
+    with BrowserPool(size=2, port=server.port, browser_options={'log_level': 'warning'}, **LAUNCH) as bp:
+        assert _wait(lambda: bp.idle() == 2)
+        with bp.lease(timeout=1) as b:
+            assert b.pagesCount() == 1
+            assert bp.idle() == 1
+        assert bp.idle() == 2
+
+
+def test_browser_pool_max_uses(server):
+    with BrowserPool(size=1, port=server.port, max_uses=1, browser_options={'log_level': 'warning'},
+                     **LAUNCH) as bp:
+        with bp.lease(timeout=2) as first:
+            pass
+        with bp.lease(timeout=2) as second:
+            assert second is not first
+
+
+def test_browser_pool_close_during_launch(slow_server):
+    bp = BrowserPool(size=1, port=slow_server.port, browser_options={'log_level': 'warning'}, **LAUNCH)
+    # the launch takes 300ms, close while it is in flight.
+    time.sleep(0.05)
+    bp.close(timeout=5)
+    assert not bp._maintainer.is_alive()
+    assert bp.idle() == 0 and not bp._meta
+    with pytest.raises(Exception):
+        bp.acquire(timeout=0)
+
+
+def test_connection_pool_closed(server):
+    pool = ConnectionPool()
+    pool.close()
+    with pytest.raises(Exception):
+        pool.get('127.0.0.1', server.port)
+    assert pool.size() == 0 and pool._reaper is None
+
+
+def test_connection_pool_connects_outside_lock(server):
+    # accepts, never answers hello.
+    with socket.socket() as listener:
+        listener.bind(('127.0.0.1', 0))
+        listener.listen()
+        pool = ConnectionPool()
+        stuck = threading.Thread(target=lambda: pytest.raises(TimeoutError, pool.get, '127.0.0.1',
+                                                              listener.getsockname()[1], binary=True, timeout=1))
+        stuck.start()
+        time.sleep(0.1)
+        start = time.time()
+        pool.get('127.0.0.1', server.port)
+        # another host is not held up by the stuck connect.
+        assert time.time() - start < 0.5
+        stuck.join()
+        pool.close()
+
+
+def test_connection_pool_max_size(server):
+    pool = ConnectionPool(max_size=2)
+    conns = []
+    for _ in range(2):
+        conns.append(pool.get('127.0.0.1', server.port))
+        conns[-1].inflight += 1
+    # every slot busy, the least busy one is shared.
+    assert pool.get('127.0.0.1', server.port) in conns
+    assert pool.size() == 2
+    pool.close()
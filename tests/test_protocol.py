@@ -0,0 +1,73 @@
+# -*- coding: utf-8 -*-
+# @Time    : 2026/10/18 下午11:40
+# @Author  : Zr
+# @Comment : framing, hello negotiation, shared memory responses
+
+import base64
+import os
+
+import pytest
+
+from pptrc.connection import Connection
+from pptrc.protocol import HEAD_LEN, pack, unpack, body_size, hello, load_file
+
+
+def _roundtrip(message, binary):
+    frame = pack(message, binary)
+    head, body = frame[:HEAD_LEN], frame[HEAD_LEN:]
+    assert body_size(head, binary) == len(body)
+    return unpack(head, body, binary)
+
+
+def test_ascii_frame_carries_bytes_as_base64():
+    jd = _roundtrip({'id': 'b', 'ctx': {'script': b'\x00\xff'}}, binary=False)
+    assert jd == {'id': 'b', 'ctx': {'script': 'AP8='}}
+
+
+def test_binary_frame_keeps_bytes():
+    message = {'id': 'b', 'ctx': {'steps': [{'value': b'\x00\xff'}, {'value': 'text'}], 'body': b'x' * 100}}
+    assert _roundtrip(message, binary=True) == message
+
+
+def test_bad_head():
+    with pytest.raises(Exception):
+        body_size(b'1234', binary=False)
+
+
+def test_load_file_removes_it(tmp_path):
+    path = str(tmp_path / 'frame')
+    with open(path, 'wb') as f:
+        f.write(pack({'retCode': 1, 'data': {'html': b'<p>'}}, True))
+    assert load_file(path, True) == {'retCode': 1, 'data': {'html': b'<p>'}}
+    assert not os.path.exists(path)
+
+
+def test_hello():
+    assert hello(True, 4096)['ctx'] == {'framing': 'binary', 'shm': 4096}
+    assert hello(False)['ctx'] == {'framing': 'ascii'}
+
+
+@pytest.mark.parametrize('binary', [False, True])
+def test_connection_framing(server, binary):
+    conn = Connection('127.0.0.1', server.port, binary=binary)
+    try:
+        assert conn.binary is binary
+        sizes = {}
+        jd = conn.request({'id': 'b', 'action': 'html', 'ctx': {}}, sizes)
+        assert jd['retCode'] == 1
+        html = jd['data']['html']
+        assert html == (b'x' * 1024 if binary else base64.b64encode(b'x' * 1024).decode('ascii'))
+        assert sizes['sent'] > 0 and sizes['recv'] > 1024
+    finally:
+        conn.close()
+
+
+def test_shm_response(server):
+    conn = Connection('127.0.0.1', server.port, binary=True, shm_threshold=256)
+    try:
+        jd = conn.request({'id': 'b', 'action': 'html', 'ctx': {}})
+        assert jd['data']['html'] == b'x' * 1024
+        # below the threshold frames still come through the socket.
+        assert conn.request({'id': 'b', 'action': 'url', 'ctx': {}})['data']['url'] == 'http://standin/'
+    finally:
+        conn.close()
@@ -0,0 +1,109 @@
+# -*- coding: utf-8 -*-
+# @Time    : 2026/10/18 下午11:55
+# @Author  : Zr
+# @Comment : stub.js itself, on fake browsers
+
+import os
+import shutil
+import subprocess
+import time
+
+import pytest
+
+import pptrc
+from pptrc import Browser, BrowserPool, ConnectionPool, WorkerRouter
+from conftest import LAUNCH
+
+
+def _browser(port, **kwargs):
+    return Browser(port=port, log_level='warning', **kwargs).launch(**LAUNCH)
+
+
+def test_sync_actions(stub):
+    # quit, disposeHandles and unsubscribe are plain methods, not async ones.
+    b = _browser(stub, multiplex=True)
+    page = b.newPage()
+    elem = page.querySelector('#a', silent=False)
+    elem.dispose()
+    with page.querySelector('#b'):
+        pass
+    with page.subscribe(['console']):
+        pass
+    b.quit()
+
+
+def test_handle_event():
+    # handleEvent itself, driven by tests/js/handle_event.js without a socket.
+    node = shutil.which('node')
+    if node is None:
+        pytest.skip('node is not installed')
+    js = os.path.join(os.path.dirname(__file__), 'js')
+    proc = subprocess.run([node, '-r', os.path.join(js, 'fake_puppeteer.js'),
+                           os.path.join(js, 'handle_event.js')],
+                          capture_output=True, text=True, timeout=30)
+    assert proc.returncode == 0, proc.stderr
+
+
+def test_quit_leaves_load(stub):
+    router = WorkerRouter([('127.0.0.1', stub)])
+    kept = _browser(stub)
+    gone = _browser(stub, multiplex=True)
+    gone.newPage().subscribe(['console'])
+    gone.quit()
+    # routed by live browsers only, not ones waiting for the idle timer.
+    assert router.loads()[('127.0.0.1', stub)]['browsers'] == [kept.wsEndpoint()]
+
+
+def test_health_counts_live_browsers(stub):
+    b = _browser(stub)
+    crashed = _browser(stub)
+    assert b.health()['browsers'] == 2
+
+    with pytest.raises(Exception):
+        crashed.getPage().goto('crash:')
+    assert b.health()['browsers'] == 1
+
+    b.quit()
+    assert b.health()['browsers'] == 0
+
+
+def test_browser_pool_replaces_crashed(stub):
+    with BrowserPool(size=1, port=stub, browser_options={'log_level': 'warning'},
+                     **LAUNCH) as bp:
+        with bp.lease(timeout=2) as first:
+            assert first.ping()
+            with pytest.raises(Exception):
+                first.getPage().goto('crash:')
+        # pagesCount would still answer for it, ping does not.
+        with bp.lease(timeout=2) as second:
+            assert second is not first
+            assert second.ping()
+
+
+
+def test_reaper_keeps_subscriptions(stub):
+    pool = ConnectionPool(idle_timeout=0)
+    b = Browser(port=stub, pool=pool, multiplex=True, log_level='warning').launch(**LAUNCH)
+    sub = b.newPage().subscribe(['console'])
+    pool.reap()
+    assert sub._conn.alive()
+
+    sub.close()
+    pool.reap()
+    assert pool.size() == 0
+    pool.close()
+
+
+@pytest.mark.parametrize('multiplex', [False, True])
+def test_deadline_stops_navigation(stub, multiplex):
+    b = _browser(stub, multiplex=multiplex)
+    page = b.newPage()
+    with pytest.raises(TimeoutError):
+        with pptrc.deadline(0.1):
+            page.goto('slow:page')
+    # the load was stopped, it does not finish after the deadline.
+    time.sleep(0.6)
+    assert page.getUrl() == 'about:blank'
+
+    page.goto('fast:page')
+    assert page.getUrl() == 'fast:page'